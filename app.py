@@ -1,64 +1,668 @@
 import logging
-from datetime import datetime
-from typing import Tuple
+import os
+import random
+from datetime import datetime, date, timedelta
+from typing import Tuple, Optional, TYPE_CHECKING
 
 import click
 
-from backtest import backtest_strategy
-from broker import BrokerSimulator, KlineDataRange
-from config import configs
+from config import get_configs, load_yaml
 
-from strategy.ordermanager import OrderManager
-from strategy.emitter import SignalEmitter
+# commands import heavy modules themselves, so the app starts fast and loads only what the command needs
+if TYPE_CHECKING:
+    from backtest import BacktestResult
 
 logging.basicConfig(level=logging.INFO)
 
 
 logger = logging.getLogger(__name__)
 
+PATH_TEMPLATE = 'market_data/{symbol}-{timeframe}-%Y-%m-%d.csv'
+CATALOG_PATH = 'market_data/catalog.db'
+
+
+def get_path_template(symbol: str, broker_config: dict) -> str:
+    path_template = PATH_TEMPLATE.format(symbol=symbol, timeframe=broker_config.get('timeframe', '5m'))
+    if broker_config.get('compressed'):
+        path_template = os.path.splitext(path_template)[0] + '.klz'
+    return path_template
+
+
+def get_broker_config(symbol: str, **kwargs) -> dict:
+    broker_config = {**get_configs().get('broker', {}).get('simulator', {}), **kwargs}
+
+    if broker_config.get('fine_klines_path_template'):
+        path_template = broker_config['fine_klines_path_template']
+        broker_config['fine_klines_path_template'] = path_template.format(symbol=symbol)
+
+    return broker_config
+
+
+def get_feature_dataset(symbol: str, broker_config: dict) -> str:
+    return f"{symbol}-{broker_config.get('resample_timeframe') or broker_config.get('timeframe', '5m')}"
+
+
+def get_datetime_range(date_from: datetime, date_to: datetime) -> Tuple[datetime, datetime]:
+    """
+    :return: UTC range, the end is excluded. Date without time means the whole day, as for data range of days.
+    """
+    import pytz
+
+    if date_to.time() == datetime.min.time():
+        date_to += timedelta(days=1)
+    return pytz.UTC.localize(date_from), pytz.UTC.localize(date_to)
+
+
+def get_kline_files(kline_data_range, catalog_path: Optional[str]) -> dict[str, Optional[str]]:
+    """
+    :return: content hash by path of kline files read from the range, see `runcache.hash_files`
+    """
+    from runcache import hash_files
+
+    if not catalog_path:
+        return hash_files(kline_data_range.path_iter())
+
+    # checksums are calculated once by catalog scan, the range may start and end within a day
+    res = {file.path: file.checksum for file in kline_data_range.files()}
+    res['range'] = str(kline_data_range.datetime_range())
+    return res
+
+
+def get_results_db() -> str:
+    return get_configs().get('results', {}).get('path', 'results.db')
+
 
 @click.group()
 def cli():
     pass
 
 
-def init_strategy_context(strategy_name) -> Tuple[OrderManager, SignalEmitter]:
-    pkg = {
-        'buy-and-hold': 'strategy.buy_and_hold',
-        'sell-and-hold': 'strategy.sell_and_hold',
-        'levels-v1': 'strategy.levels_v1',
-    }[strategy_name]
-    imp = __import__(pkg, globals(), locals(), ['init_context'])
-    return imp.init_context()
+def save_run(
+        results_db: str, strategy: str, symbol: str, date_from: date, date_to: date,
+        config: dict, result: 'BacktestResult'
+):
+    from results import ResultsStore, RunRecord
+    from strategy.context import load_strategy_config
+
+    store = ResultsStore(results_db)
+    run_id = store.save_run(RunRecord(
+        strategy=strategy,
+        symbol=symbol,
+        date_from=date_from,
+        date_to=date_to,
+        config={'strategy': load_strategy_config(strategy), **config},
+        metrics=result.metrics(),
+        orders=list(result.order_list.all())
+    ))
+    store.close()
+
+    logger.info('run id=%s saved to %s', run_id, results_db)
 
 
 @cli.command()
 @click.option('--strategy', required=True, help='strategy name')
+@click.option('--symbol', default='BTCBUSD', help='symbol')
 @click.option('--from', 'date_from', type=click.DateTime(), required=True, help='date from')
 @click.option('--to', 'date_to', type=click.DateTime(), required=True, help='date to')
 @click.option('--window', 'window_size', type=int, default=1, help='kline window size')
-def backtest(strategy: str, date_from: datetime, date_to: datetime, window_size: int):
+@click.option('--resample', 'resample_timeframe', default=None, help='run on klines resampled to timeframe, e.g. 1h')
+@click.option('--results-db', default=get_results_db, help='results database')
+@click.option('--save/--no-save', default=True, help='save run to results database')
+@click.option('--workers', type=int, default=None, help='calculate signals by worker processes before order loop')
+@click.option('--signal-cache-dir', default=None, help='reuse emitter signals of runs with the same emitter configs')
+@click.option('--feature-store', default=None, help='dir of precalculated trend and levels, levels-v1 only')
+@click.option('--catalog', 'catalog_path', default=None, help='read files found by market data catalog, '
+              '--from and --to may contain time then')
+@click.option('--profile-memory', is_flag=True, help='trace allocations and report memory growth, run is not cached')
+@click.option('--profile-memory-interval', type=click.IntRange(min=1), default=1000,
+              help='klines between memory snapshots')
+@click.option('--profile-memory-top', type=click.IntRange(min=0), default=10,
+              help='count of top growth sites to report')
+@click.option('--profile-memory-frames', type=click.IntRange(min=1), default=1,
+              help='traceback frames of allocations, slower if more')
+@click.option('--cache/--no-cache', 'use_run_cache', default=True, help='reuse result of the same run')
+@click.option('--cache-dir', 'run_cache_dir', default='cache/runs', help='dir of cached run results')
+@click.option('--cache-size', 'run_cache_size', type=int, default=500, help='max size of cached runs, MB')
+def backtest(
+        strategy: str, symbol: str, date_from: datetime, date_to: datetime, window_size: int,
+        resample_timeframe: str, results_db: str, save: bool, workers: Optional[int], signal_cache_dir: Optional[str],
+        feature_store: Optional[str], catalog_path: Optional[str], profile_memory: bool, profile_memory_interval: int,
+        profile_memory_top: int, profile_memory_frames: int, use_run_cache: bool, run_cache_dir: str,
+        run_cache_size: int
+):
+    from backtest import backtest_strategy
+    from broker import BrokerSimulator, KlineDataRange, date_iter
+    from runcache import RunCache, get_run_key, hash_files, get_source_version
+    from signalcache import SignalCache, get_signals_key, backtest_with_signal_cache
+    from strategy.context import init_strategy_context, load_strategy_config
+
+    broker_config = get_broker_config(symbol)
+    if resample_timeframe:
+        broker_config['resample_timeframe'] = resample_timeframe
+
     # path = 'market_data/BTCBUSD-5m-2022-02-18.csv'
-    path_template = 'market_data/BTCBUSD-5m-%Y-%m-%d.csv'
+    path_template = get_path_template(symbol, broker_config)
+    dt_from, dt_to = date_from, date_to
     date_from = date_from.date()
     date_to = date_to.date()
 
     logger.info('date_from %s', date_from)
     logger.info('date_to %s', date_to)
 
-    kline_data_range = KlineDataRange(
-        path_template=path_template,
-        date_from=date_from,
-        date_to=date_to
-    )
+    if catalog_path:
+        from catalog import MarketDataCatalog, CatalogDataRange
+
+        kline_data_range = CatalogDataRange(
+            MarketDataCatalog(catalog_path), symbol, broker_config.get('timeframe', '5m'),
+            *get_datetime_range(dt_from, dt_to)
+        )
+    else:
+        kline_data_range = KlineDataRange(
+            path_template=path_template,
+            date_from=date_from,
+            date_to=date_to
+        )
 
     broker = BrokerSimulator(
         kline_data_range=kline_data_range,
-        config=configs.get('broker', {}).get('simulator', {})
+        config=broker_config
+    )
+
+    configs = load_strategy_config(strategy)
+    order_manager, emitter = init_strategy_context(strategy, configs)
+
+    profiler = None
+    if profile_memory:
+        from memprofile import MemoryProfiler
+
+        profiler = MemoryProfiler(
+            interval=profile_memory_interval, top=profile_memory_top, frames=profile_memory_frames
+        )
+
+    run_cache = None
+    run_key = None
+    result = None
+    kline_files = None
+    if (use_run_cache and not profiler) or signal_cache_dir:
+        kline_files = get_kline_files(kline_data_range, catalog_path)
+
+    if use_run_cache and not profiler:
+        input_files = dict(kline_files)
+        if broker_config.get('fine_klines_path_template'):
+            fine_path_template = broker_config['fine_klines_path_template']
+            input_files.update(hash_files(d.strftime(fine_path_template) for d in date_iter(date_from, date_to)))
+
+        run_cache = RunCache(run_cache_dir, max_size=run_cache_size * 2 ** 20)
+        run_key = get_run_key(strategy, configs, input_files, broker_config, window_size, get_source_version())
+        result = run_cache.get(run_key)
+        logger.info('run %s %s', run_key[:12], 'found in cache' if result is not None else 'not cached')
+        if result is not None:
+            result.log_summary()
+
+    if result is None:
+        if feature_store:
+            from featurestore import FeatureStore
+            from strategy.levels_v1.features import update_level_features
+
+            if strategy != 'levels-v1':
+                raise click.UsageError('Feature store supports levels-v1 strategy only')
+
+            emitter.features = update_level_features(
+                FeatureStore(feature_store), get_feature_dataset(symbol, broker_config), configs['emitter'],
+                path_template, broker_config, window_size, date_from, date_to
+            )
+
+        if profiler:
+            profiler.start()
+
+        if signal_cache_dir:
+            key = get_signals_key(
+                strategy, configs.get('emitter'), kline_files, broker_config, window_size, get_source_version()
+            )
+            result = backtest_with_signal_cache(
+                SignalCache(signal_cache_dir), key, order_manager, emitter, broker, window_size, workers=workers,
+                profiler=profiler
+            )
+        else:
+            result = backtest_strategy(order_manager, emitter, broker, window_size, workers=workers, profiler=profiler)
+
+        if profiler:
+            profiler.stop().log()
+
+        if run_cache is not None:
+            run_cache.set(run_key, result)
+
+    if save:
+        config = {'broker': broker_config, 'window_size': window_size}
+        save_run(results_db, strategy, symbol, date_from, date_to, config, result)
+
+
+@cli.command()
+@click.option('--strategy', required=True, help='strategy name')
+@click.option('--symbol', 'symbols', required=True, multiple=True, help='symbol, may be repeated')
+@click.option('--from', 'date_from', type=click.DateTime(), required=True, help='date from')
+@click.option('--to', 'date_to', type=click.DateTime(), required=True, help='date to')
+@click.option('--window', 'window_size', type=int, default=1, help='kline window size')
+@click.option('--max-orders-open', type=int, default=None, help='max open orders for whole portfolio')
+@click.option('--max-orders-open-per-symbol', type=int, default=None, help='max open orders per symbol')
+@click.option('--results-db', default=get_results_db, help='results database')
+@click.option('--save/--no-save', default=True, help='save run to results database')
+def portfolio(
+        strategy: str, symbols: Tuple[str], date_from: datetime, date_to: datetime, window_size: int,
+        max_orders_open: int, max_orders_open_per_symbol: int, results_db: str, save: bool
+):
+    from backtest import backtest_portfolio
+    from broker import BrokerSimulator, KlineDataRange
+    from portfolio import PortfolioBrokerSimulator, PortfolioOrderManager
+    from strategy.context import init_strategy_context
+
+    date_from = date_from.date()
+    date_to = date_to.date()
+
+    logger.info('symbols %s', ', '.join(symbols))
+    logger.info('date_from %s', date_from)
+    logger.info('date_to %s', date_to)
+
+    brokers = {}
+    emitters = {}
+    order_manager = None
+
+    for symbol in symbols:
+        broker_config = get_broker_config(symbol)
+        kline_data_range = KlineDataRange(
+            path_template=get_path_template(symbol, broker_config),
+            date_from=date_from,
+            date_to=date_to
+        )
+        brokers[symbol] = BrokerSimulator(
+            kline_data_range=kline_data_range,
+            config=broker_config
+        )
+
+        # every symbol gets its own emitter state, order manager is shared
+        symbol_order_manager, emitters[symbol] = init_strategy_context(strategy)
+        order_manager = order_manager or symbol_order_manager
+
+    order_manager = PortfolioOrderManager(
+        order_manager,
+        max_orders_open=max_orders_open,
+        max_orders_open_per_symbol=max_orders_open_per_symbol
+    )
+    result = backtest_portfolio(order_manager, emitters, PortfolioBrokerSimulator(brokers), window_size)
+
+    if save:
+        config = {
+            'broker': broker_config,
+            'window_size': window_size,
+            'max_orders_open': max_orders_open,
+            'max_orders_open_per_symbol': max_orders_open_per_symbol,
+        }
+        save_run(results_db, strategy, ','.join(symbols), date_from, date_to, config, result)
+
+
+@cli.command()
+@click.option('--symbol', default='BTCBUSD', help='symbol')
+@click.option('--timeframe', default=None, help='kline timeframe, broker timeframe by default')
+@click.option('--from', 'date_from', type=click.DateTime(), required=True, help='date from')
+@click.option('--to', 'date_to', type=click.DateTime(), required=True, help='date to')
+@click.option('--dir', 'data_dir', default='market_data', help='dir of market data files')
+@click.option('--workers', type=int, default=4, help='concurrent downloads')
+@click.option('--catalog', 'catalog_path', default=CATALOG_PATH, help='catalog database')
+def download(
+        symbol: str, timeframe: Optional[str], date_from: datetime, date_to: datetime, data_dir: str, workers: int,
+        catalog_path: str
+):
+    """
+    Downloads daily kline files from Binance, which are missing in data dir, and indexes them in the catalog.
+    """
+    from catalog import MarketDataCatalog
+    from downloader import download_klines
+
+    broker_config = get_broker_config(symbol)
+    try:
+        download_klines(
+            symbol, timeframe or broker_config.get('timeframe', '5m'), date_from.date(), date_to.date(), data_dir,
+            workers=workers
+        )
+    finally:
+        # files downloaded before a failure are indexed too
+        market_data_catalog = MarketDataCatalog(catalog_path)
+        market_data_catalog.scan(data_dir)
+        market_data_catalog.close()
+
+
+@cli.command()
+@click.option('--dir', 'data_dir', default='market_data', help='dir of market data files')
+@click.option('--catalog', 'catalog_path', default=CATALOG_PATH, help='catalog database')
+def catalog(data_dir: str, catalog_path: str):
+    """
+    Indexes market data files which are new or changed since the last run.
+    """
+    from catalog import MarketDataCatalog
+
+    market_data_catalog = MarketDataCatalog(catalog_path)
+    for file in market_data_catalog.scan(data_dir):
+        if file.gaps:
+            logger.warning('%s: %s klines missing', file.path, file.gaps)
+    market_data_catalog.close()
+
+
+@cli.command()
+@click.option('--dir', 'data_dir', default='market_data', help='dir of market data files')
+@click.option('--catalog', 'catalog_path', default=CATALOG_PATH, help='catalog database')
+@click.option('--repair', is_flag=True, help='sort rows, drop duplicate and invalid rows of invalid files')
+@click.option('--fill-gaps', is_flag=True, help='add flat klines for missing ones while repairing')
+def validate(data_dir: str, catalog_path: str, repair: bool, fill_gaps: bool):
+    """
+    Shows market data files with gaps, duplicate, unordered or inconsistent rows. Files are validated by catalog scan.
+    """
+    from catalog import MarketDataCatalog, repair_file
+
+    # catalog keeps paths joined with normalized dir
+    data_dir = os.path.normpath(data_dir)
+    market_data_catalog = MarketDataCatalog(catalog_path)
+    market_data_catalog.scan(data_dir)
+
+    for path, report in market_data_catalog.get_invalid_files():
+        click.echo(f"{path}: {', '.join(f'{name} {value}' for name, value in report.issues().items())}")
+        if repair and os.path.dirname(path) == data_dir:
+            repair_file(path, market_data_catalog.get_file(path).timeframe, fill_gaps=fill_gaps)
+
+    if repair:
+        market_data_catalog.scan(data_dir)
+    market_data_catalog.close()
+
+
+@cli.command()
+@click.option('--dir', 'data_dir', default='market_data', help='dir of market data files')
+def compress(data_dir: str):
+    """
+    Writes compressed copy of every csv market data file, which is new or changed since the last run.
+    """
+    from broker import read_klines_from_csv
+    from klinestore import write_klines_compressed, get_compressed_path
+
+    skip_header = get_configs().get('broker', {}).get('simulator', {}).get('skip_header', True)
+    count = 0
+    for name in sorted(os.listdir(data_dir)):
+        if not name.endswith('.csv'):
+            continue
+
+        path = os.path.join(data_dir, name)
+        compressed_path = get_compressed_path(path)
+        if os.path.exists(compressed_path) and os.path.getmtime(compressed_path) >= os.path.getmtime(path):
+            continue
+
+        write_klines_compressed(compressed_path, read_klines_from_csv(path, skip_header=skip_header))
+        count += 1
+
+    logger.info('%s files compressed', count)
+
+
+@cli.command()
+@click.option('--symbol', default='BTCBUSD', help='symbol')
+@click.option('--from', 'date_from', type=click.DateTime(), required=True, help='date from')
+@click.option('--to', 'date_to', type=click.DateTime(), required=True, help='date to')
+@click.option('--window', 'window_size', type=int, default=1, help='kline window size')
+@click.option('--feature-store', default='cache/features', help='dir of precalculated features')
+def features(symbol: str, date_from: datetime, date_to: datetime, window_size: int, feature_store: str):
+    """
+    Calculates trend and levels of levels-v1 strategy for days missing in feature store or which market data changed.
+    """
+    from featurestore import FeatureStore
+    from strategy.context import load_strategy_config
+    from strategy.levels_v1.features import update_level_features
+
+    broker_config = get_broker_config(symbol)
+    update_level_features(
+        FeatureStore(feature_store), get_feature_dataset(symbol, broker_config),
+        load_strategy_config('levels-v1')['emitter'], get_path_template(symbol, broker_config), broker_config,
+        window_size, date_from.date(), date_to.date()
+    )
+
+
+@cli.command()
+@click.option('--results-db', default=get_results_db, help='results database')
+@click.option('--strategy', default=None, help='strategy name')
+@click.option('--param', 'params', multiple=True, help='param filter, e.g. emitter.medium_window_size=100')
+@click.option('--from', 'date_from', type=click.DateTime(), default=None, help='runs started at date or later')
+@click.option('--to', 'date_to', type=click.DateTime(), default=None, help='runs finished at date or earlier')
+@click.option('--order-by', default='profit', help='metric to sort runs by')
+@click.option('--limit', type=int, default=20, help='max runs to show')
+@click.option('--run-id', type=int, default=None, help='show trades of the run')
+def results(
+        results_db: str, strategy: str, params: Tuple[str], date_from: datetime, date_to: datetime,
+        order_by: str, limit: int, run_id: int
+):
+    from results import ResultsStore
+
+    store = ResultsStore(results_db)
+
+    if run_id is not None:
+        for trade in store.get_trades(run_id):
+            click.echo(
+                f"{trade['order_id']} {trade['order_type']} {trade['opened_at']} {trade['price_open']} -> "
+                f"{trade['closed_at']} {trade['price_close']} profit/loss {trade['profit']}"
+            )
+        return
+
+    runs = store.query_runs(
+        strategy=strategy,
+        params=dict(param.split('=', 1) for param in params),
+        date_from=date_from.date() if date_from else None,
+        date_to=date_to.date() if date_to else None,
+        order_by=order_by,
+        limit=limit
+    )
+
+    for run in runs:
+        metrics = ' '.join(f'{name}={value:g}' for name, value in sorted(run['metrics'].items()))
+        click.echo(
+            f"{run['id']} {run['strategy']} {run['symbol']} {run['date_from']} - {run['date_to']} "
+            f"{run['config_hash'][:8]} {metrics}"
+        )
+
+
+@cli.command()
+@click.option('--strategy', required=True, help='strategy name')
+@click.option('--symbol', default='BTCBUSD', help='symbol')
+@click.option('--from', 'date_from', type=click.DateTime(), required=True, help='date from')
+@click.option('--to', 'date_to', type=click.DateTime(), required=True, help='date to')
+@click.option('--window', 'window_size', type=int, default=1, help='kline window size')
+@click.option('--grid', 'grid_path', required=True, help='yml file with lists of strategy param values')
+@click.option('--metric', default='profit', help='metric to sort configs by')
+def fanout(
+        strategy: str, symbol: str, date_from: datetime, date_to: datetime, window_size: int, grid_path: str,
+        metric: str
+):
+    """
+    Runs every config of the grid in one pass over klines.
+    """
+    from broker import BrokerSimulator, KlineDataRange
+    from fanout import backtest_fanout
+    from strategy.context import init_strategy_context, load_strategy_config
+    from walkforward import iter_param_grid, apply_params, format_params
+
+    broker_config = get_broker_config(symbol)
+    kline_data_range = KlineDataRange(
+        path_template=get_path_template(symbol, broker_config),
+        date_from=date_from.date(),
+        date_to=date_to.date()
+    )
+
+    config = load_strategy_config(strategy)
+    params_list = iter_param_grid(load_yaml(grid_path))
+    contexts = [init_strategy_context(strategy, apply_params(config, params)) for params in params_list]
+
+    # brokers keep orders of their contexts, klines are read by another one
+    brokers = [BrokerSimulator(kline_data_range=kline_data_range, config=broker_config) for _ in contexts]
+    klines = BrokerSimulator(kline_data_range=kline_data_range, config=broker_config).klines()
+
+    results = backtest_fanout(contexts, brokers, klines, window_size)
+
+    rows = sorted(zip(params_list, results), key=lambda t: t[1].metrics()[metric], reverse=True)
+    for params, result in rows:
+        click.echo(f'{metric}={result.metrics()[metric]:g}, {format_params(params)}')
+
+
+@cli.command()
+@click.option('--strategy', required=True, help='strategy name')
+@click.option('--symbol', default='BTCBUSD', help='symbol')
+@click.option('--from', 'date_from', type=click.DateTime(), required=True, help='date from')
+@click.option('--to', 'date_to', type=click.DateTime(), required=True, help='date to')
+@click.option('--window', 'window_size', type=int, default=1, help='kline window size')
+@click.option('--grid', 'grid_path', required=True, help='yml file with lists of strategy param values')
+@click.option('--in-sample-days', type=int, required=True, help='in-sample period of fold')
+@click.option('--out-of-sample-days', type=int, required=True, help='out-of-sample period of fold')
+@click.option('--metric', default='profit', help='in-sample metric to maximize')
+@click.option('--workers', type=int, default=None, help='number of worker processes, cpu count by default')
+@click.option('--cache-dir', default='cache/evaluations', help='dir for cached evaluations')
+@click.option('--signal-cache-dir', default=None, help='reuse emitter signals of runs with the same emitter configs')
+def walkforward(
+        strategy: str, symbol: str, date_from: datetime, date_to: datetime, window_size: int, grid_path: str,
+        in_sample_days: int, out_of_sample_days: int, metric: str, workers: int, cache_dir: str,
+        signal_cache_dir: Optional[str]
+):
+    from strategy.context import load_strategy_config
+    from strategy.utils import parse_timedelta
+    from walkforward import split_folds, walk_forward, EvaluationCache, calc_stitched_metrics, format_params
+
+    broker_config = get_broker_config(symbol)
+
+    grid = load_yaml(grid_path)
+
+    folds = split_folds(date_from.date(), date_to.date(), in_sample_days, out_of_sample_days)
+    logger.info('%s folds', len(folds))
+
+    fold_results = walk_forward(
+        strategy,
+        load_strategy_config(strategy),
+        grid,
+        folds,
+        broker_config=broker_config,
+        path_template=get_path_template(symbol, broker_config),
+        window_size=window_size,
+        cache=EvaluationCache(cache_dir),
+        metric=metric,
+        workers=workers,
+        signal_cache_dir=signal_cache_dir
     )
 
-    order_manager, emitter = init_strategy_context(strategy)
-    backtest_strategy(order_manager, emitter, broker, window_size)
+    for r in fold_results:
+        click.echo(
+            f'in-sample {r.fold.in_sample_from} - {r.fold.in_sample_to} '
+            f'{metric}={r.in_sample_metrics.get(metric, float("nan")):g}, '
+            f'out-of-sample {r.fold.out_of_sample_from} - {r.fold.out_of_sample_to} '
+            f'{metric}={r.out_of_sample_metrics.get(metric, float("nan")):g}, {format_params(r.params)}'
+        )
+
+    timeframe = parse_timedelta(broker_config.get('timeframe', '5m'))
+    metrics = calc_stitched_metrics(fold_results, timeframe)
+    click.echo('out-of-sample total: ' + ' '.join(f'{name}={value:g}' for name, value in metrics.items()))
+
+
+@cli.command()
+@click.option('--strategy', required=True, help='strategy name')
+@click.option('--symbol', default='BTCBUSD', help='symbol')
+@click.option('--from', 'date_from', type=click.DateTime(), required=True, help='date from')
+@click.option('--to', 'date_to', type=click.DateTime(), required=True, help='date to')
+@click.option('--window', 'window_size', type=int, default=1, help='kline window size')
+@click.option('--space', 'space_path', required=True, help='yml file with param ranges {min, max} or lists of values')
+@click.option('--min-days', type=int, default=1, help='date range of the first rung')
+@click.option('--eta', type=int, default=3, help='1/eta of candidates is promoted to eta times longer range')
+@click.option('--configs', 'configs_count', type=int, default=None,
+              help='run single successive halving with this number of configs instead of hyperband')
+@click.option('--seed', type=int, default=None, help='random seed')
+@click.option('--metric', default='profit', help='metric to maximize')
+@click.option('--workers', type=int, default=None, help='number of worker processes, cpu count by default')
+@click.option('--cache-dir', default='cache/evaluations', help='dir for cached evaluations')
+@click.option('--signal-cache-dir', default=None, help='reuse emitter signals of runs with the same emitter configs')
+@click.option('--top', type=int, default=10, help='number of best configs to print')
+def search(
+        strategy: str, symbol: str, date_from: datetime, date_to: datetime, window_size: int, space_path: str,
+        min_days: int, eta: int, configs_count: int, seed: int, metric: str, workers: int, cache_dir: str,
+        signal_cache_dir: Optional[str], top: int
+):
+    from search import hyperband, successive_halving, get_rung_days, sample_params, Candidate
+    from strategy.context import load_strategy_config
+    from walkforward import Evaluation, EvaluationCache, EvaluationPool, format_params
+
+    broker_config = get_broker_config(symbol)
+
+    space = load_yaml(space_path)
+
+    kwargs = dict(
+        broker_config=broker_config,
+        path_template=get_path_template(symbol, broker_config),
+        window_size=window_size,
+        cache=EvaluationCache(cache_dir),
+        eta=eta,
+        metric=metric,
+        workers=workers
+    )
+
+    if configs_count:
+        rng = random.Random(seed)
+        candidates = [Candidate(params=sample_params(space, rng)) for _ in range(configs_count)]
+        max_days = (date_to - date_from).days + 1
+
+        # rungs run in one pool, the whole range evaluation is enough to load klines
+        whole_range_evaluation = Evaluation(
+            strategy=strategy,
+            config=load_strategy_config(strategy),
+            broker_config=broker_config,
+            path_template=kwargs['path_template'],
+            date_from=date_from.date(),
+            date_to=date_to.date(),
+            window_size=window_size
+        )
+        with EvaluationPool([whole_range_evaluation], workers=workers, signal_cache_dir=signal_cache_dir) as pool:
+            candidates = successive_halving(
+                strategy, load_strategy_config(strategy), candidates, get_rung_days(min_days, max_days, eta),
+                date_from.date(), pool=pool, **kwargs
+            )
+    else:
+        candidates = hyperband(
+            strategy, load_strategy_config(strategy), space, date_from.date(), date_to.date(), min_days,
+            seed=seed, signal_cache_dir=signal_cache_dir, **kwargs
+        )
+
+    for candidate in candidates[:top]:
+        click.echo(f'{metric}={candidate.score:g} on {candidate.days} days, {format_params(candidate.params)}')
+
+
+@cli.command()
+@click.option('--run-id', type=int, required=True, help='run id from results database')
+@click.option('--results-db', default=get_results_db, help='results database')
+@click.option('--paths', type=click.IntRange(min=1), default=100000, help='number of resampled trade sequences')
+@click.option('--method', type=click.Choice(['bootstrap', 'permutation']), default='bootstrap',
+              help='trades resampling method')
+@click.option('--slippage', type=float, default=0.0, help='max slippage as a share of trade turnover')
+@click.option('--seed', type=int, default=None, help='random seed')
+@click.option('--chunk-size', type=click.IntRange(min=1), default=10000, help='paths per worker task')
+@click.option('--workers', type=int, default=None, help='number of worker processes, cpu count by default')
+def montecarlo(
+        run_id: int, results_db: str, paths: int, method: str, slippage: float, seed: int, chunk_size: int,
+        workers: int
+):
+    from montecarlo import get_trade_arrays_from_rows, simulate_paths, summarize
+    from results import ResultsStore
+
+    store = ResultsStore(results_db)
+    profits, turnovers = get_trade_arrays_from_rows(store.get_trades(run_id))
+    store.close()
+
+    final_profits, drawdowns = simulate_paths(
+        profits, turnovers, paths, method=method, slippage=slippage, seed=seed, chunk_size=chunk_size, workers=workers
+    )
+
+    def format_summary(values) -> str:
+        return ' '.join(f'{name}={value:g}' for name, value in summarize(values).items())
+
+    click.echo(f'trades {len(profits)}, profit {profits.sum():g}')
+    click.echo(f'profit: {format_summary(final_profits)}')
+    click.echo(f'max drawdown: {format_summary(drawdowns)}')
+    click.echo(f'probability of loss: {(final_profits < 0).mean():g}')
 
 
 if __name__ == '__main__':
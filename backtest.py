@@ -1,33 +1,309 @@
+import copy
 import logging
+import math
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import timedelta
+from decimal import Decimal
+from typing import Optional
 
 from broker import Broker
-from emergency import EmergencyDetector
-from kline import get_moving_window_iterator
+from emergency import EmergencyDetector, is_emergency
+from equity import EquityCurve
+from kline import Kline, get_moving_window_iterator
 from localbroker import LocalBroker
+from memprofile import MemoryProfiler
+from order import Order
+from orderlist import OrderList
+from resample import TimeframeWindows
 from strategy.ordermanager import OrderManager
 from strategy.emitter import SignalEmitter
 
 logger = logging.getLogger(__name__)
 
+# emergency flag and order request of kline window
+Signal = tuple[bool, Optional[Order]]
+
+
+@dataclass
+class BacktestResult:
+    order_list: OrderList
+    profit_unrealized: Decimal
+    equity_curve: Optional[EquityCurve] = None
+    timeframe: timedelta = timedelta(minutes=5)
+    # signals of every kline window, if they were calculated before the order loop
+    signals: Optional[list[Signal]] = None
+
+    def metrics(self) -> dict[str, float]:
+        orders_closed = self.order_list.orders_closed.values()
+
+        res = {
+            'orders_open': len(self.order_list.orders_open),
+            'orders_closed': len(orders_closed),
+            'orders_profitable': len([o for o in orders_closed if o.is_profit()]),
+            'profit': float(self.order_list.profit()),
+            'profit_unrealized': float(self.profit_unrealized),
+        }
+
+        if self.equity_curve:
+            res.update(self.equity_curve.metrics(self.timeframe))
+
+        return res
+
+    def log_summary(self):
+        logger.info(f'total orders open: {len(self.order_list.orders_open)}')
+        logger.info(f'total orders closed: {len(self.order_list.orders_closed)}')
+
+        logger.info(f'profit/loss on closed orders: {self.order_list.profit()}')
+        logger.info(f'profit/loss on open orders: {self.profit_unrealized}')
+
+        if self.equity_curve:
+            metrics = self.equity_curve.metrics(self.timeframe)
+            logger.info(f'max drawdown: {metrics["max_drawdown"]:.2f}, '
+                        f'sharpe: {metrics["sharpe"]:.2f}, sortino: {metrics["sortino"]:.2f}, '
+                        f'exposure time: {metrics["exposure_time"]:.2%}, win rate: {metrics["win_rate"]:.2%}')
+
+
+@dataclass
+class SignalChunk:
+    emitter: SignalEmitter
+    # warm-up klines followed by klines of the chunk
+    klines: list[Kline]
+    # index of the first current kline of the chunk
+    start: int
+    window_size: int
+
+
+def calc_signals(chunk: SignalChunk) -> list[Signal]:
+    """
+    Signals of windows with current kline `chunk.klines[i]` for every `i >= chunk.start`.
+    """
+    emitter = chunk.emitter
+    timeframe_windows = TimeframeWindows(emitter.timeframes)
+
+    res = []
+    for i, kline_window in enumerate(get_moving_window_iterator(chunk.klines, chunk.window_size + 1)):
+        timeframe_windows.update_until(kline_window[:-1])
+        if i + chunk.window_size < chunk.start:
+            continue
+
+        order = emitter.get_order_request(kline_window[:-1], timeframe_windows=timeframe_windows.windows())
+        res.append((is_emergency(kline_window), order))
+
+    return res
+
+
+def get_warm_up_size(emitter: SignalEmitter, klines: list[Kline], window_size: int) -> int:
+    """
+    Number of klines preceding a chunk, which make its signals the same as in sequential run:
+    kline window itself and enough base klines to fill higher timeframe windows with completed klines.
+    """
+    res = window_size
+    if emitter.timeframes and klines:
+        timeframe = klines[0].close_time - klines[0].open_time
+        # one more higher timeframe kline pushes out a partial one built from the first base klines
+        res += max(math.ceil(t / timeframe) * (size + 1) for t, size in emitter.timeframes.items())
+    return res
+
+
+def calc_signals_parallel(emitter: SignalEmitter, klines: list[Kline], window_size: int, workers: int) -> list[Signal]:
+    """
+    Splits klines into chunks, each worker process calculates signals of its chunk with its own copy of emitter.
+    Chunks overlap by warm-up klines, so emitter must depend on klines passed to it rather than on call history.
+
+    :return: signals of every window with current kline `klines[i]`, `i >= window_size`
+    """
+    count = len(klines) - window_size
+    if count <= 0:
+        return []
+
+    if workers == 1:
+        return calc_signals(SignalChunk(emitter, klines, start=window_size, window_size=window_size))
+
+    chunk_size = math.ceil(count / workers)
+    warm_up_size = get_warm_up_size(emitter, klines, window_size)
+
+    chunks = []
+    for start in range(window_size, len(klines), chunk_size):
+        first = max(start - warm_up_size, 0)
+        chunks.append(SignalChunk(
+            emitter=emitter,
+            klines=klines[first:start + chunk_size],
+            start=start - first,
+            window_size=window_size
+        ))
+
+    res = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for signals in executor.map(calc_signals, chunks):
+            res.extend(signals)
+
+    logger.info('%s signals calculated in %s chunks', len(res), len(chunks))
+    return res
+
+
+class OrderLoop:
+    """
+    Order state of one strategy run: broker orders, local order list and equity curve.
+    """
+    def __init__(self, order_manager: OrderManager, broker: Broker):
+        self.order_manager = order_manager
+        self.broker = broker
+        self.order_list = order_manager.order_list
+        self.equity_curve = EquityCurve()
+        self.local_broker = LocalBroker(self.order_list, equity_curve=self.equity_curve)
+
+    def update(self, kline: Kline):
+        """
+        Applies broker events of the current kline.
+        """
+        for order_id in self.local_broker.find_orders_for_auto_close(kline.open_time):
+            logger.info('Order id=%s will be auto closed', order_id)
+
+            event = self.broker.close_order(order_id, kline)
+            self.local_broker.handle_remote_event(event)
+
+        for event in self.broker.events(kline):
+            self.local_broker.handle_remote_event(event)
+
+        self.equity_curve.record(kline)
+
+    def add_order(self, order: Order):
+        if self.order_manager.is_order_acceptable(order):
+            event = self.broker.add_order(order)
+            self.local_broker.add_order(event.order_id, order)
+
+    def get_result(self, last_kline: Kline, signals: Optional[list[Signal]] = None) -> BacktestResult:
+        result = BacktestResult(
+            self.order_list,
+            self.order_list.profit_unrealized(last_kline.close),
+            equity_curve=self.equity_curve,
+            timeframe=last_kline.close_time - last_kline.open_time,
+            signals=signals
+        )
+        result.log_summary()
+        return result
+
 
 def backtest_strategy(
         order_manager: OrderManager,
         emitter: SignalEmitter,
         broker: Broker,
-        window_size: int
-):
-    order_list = order_manager.order_list
-    local_broker = LocalBroker(order_list)
+        window_size: int,
+        workers: Optional[int] = None,
+        signals: Optional[list[Signal]] = None,
+        profiler: Optional[MemoryProfiler] = None
+) -> BacktestResult:
+    """
+    :param workers: if set, emergency flags and order requests are calculated by worker processes
+        before the order loop, see `calc_signals_parallel`. The loop only replays them with broker and order manager.
+    :param signals: signals calculated by previous run with the same klines and emitter, emitter is not called
+    :param profiler: samples memory while klines are iterated, caller stops it and gets the report
+    """
+    order_loop = OrderLoop(order_manager, broker)
 
     kline_window = []
     detector = EmergencyDetector()
+    timeframe_windows = TimeframeWindows(emitter.timeframes)
+
+    klines = broker.klines()
+    if profiler:
+        klines = profiler.track(klines)
+
+    if signals is None and workers:
+        klines = list(klines)
+        signals = calc_signals_parallel(emitter, klines, window_size, workers)
+
+    signals_iter = iter(signals) if signals is not None else None
 
     # window consists of `window_size` historical klines and one current kline
-    for kline_window in get_moving_window_iterator(broker.klines(), window_size + 1):
+    for kline_window in get_moving_window_iterator(klines, window_size + 1):
         # current kline
         kline = kline_window[-1]
 
+        if signals_iter:
+            signal = next(signals_iter, None)
+            assert signal is not None, 'Less signals than kline windows'
+            emergency, order = signal
+        else:
+            emergency, order = is_emergency(kline_window), None
+            # higher timeframe windows are built from historical klines only
+            timeframe_windows.update_until(kline_window[:-1])
+
+        order_loop.update(kline)
+
+        if detector.update(emergency):
+            logger.warning('Emergency detected')
+            continue
+
+        if detector.cooldown:
+            logger.warning('Emergency detector cooling down')
+            continue
+
+        if not signals_iter:
+            # pass historical klines
+            order = emitter.get_order_request(kline_window[:-1], timeframe_windows=timeframe_windows.windows())
+        if not order:
+            continue
+
+        if signals_iter:
+            # broker and order list change orders, signals stay reusable by other runs
+            order = copy.deepcopy(order)
+
+        order_loop.add_order(order)
+
+    assert kline_window, 'Not enough klines'
+    assert not signals_iter or next(signals_iter, None) is None, 'More signals than kline windows'
+    return order_loop.get_result(kline_window[-1], signals=signals)
+
+
+def backtest_portfolio(
+        order_manager: OrderManager,
+        emitters: dict[str, SignalEmitter],
+        broker: Broker,
+        window_size: int
+) -> BacktestResult:
+    """
+    Runs strategy on several symbols at once.
+
+    `broker.klines()` must yield klines of all symbols ordered by open time, each kline tagged with its symbol.
+    Every symbol keeps its own kline window, emergency detector and emitter.
+    Orders of all symbols share one order list, so `order_manager` can apply portfolio-level limits.
+    """
+    order_list = order_manager.order_list
+    equity_curve = EquityCurve()
+    local_broker = LocalBroker(order_list, equity_curve=equity_curve)
+
+    kline_windows = {symbol: deque(maxlen=window_size + 1) for symbol in emitters}
+    detectors = {symbol: EmergencyDetector() for symbol in emitters}
+    timeframe_windows = {symbol: TimeframeWindows(emitter.timeframes) for symbol, emitter in emitters.items()}
+    last_prices = {}
+
+    kline = None
+    # open time of klines applied since the last equity sample
+    sample_time = None
+    for kline in broker.klines():
+        if sample_time is not None and kline.open_time != sample_time:
+            # one sample per open time, after klines of all symbols are applied
+            equity_curve.record_sample(sample_time)
+            sample_time = None
+
+        symbol = kline.symbol
+        emitter = emitters[symbol]
+        detector = detectors[symbol]
+
+        kline_window = kline_windows[symbol]
+        kline_window.append(kline)
+        last_prices[symbol] = kline.close
+
+        if len(kline_window) < window_size + 1:
+            continue
+
         for order_id in local_broker.find_orders_for_auto_close(kline.open_time):
+            if order_list.get(order_id).symbol != symbol:
+                continue
+
             logger.info('Order id=%s will be auto closed', order_id)
 
             event = broker.close_order(order_id, kline)
@@ -36,28 +312,46 @@ def backtest_strategy(
         for event in broker.events(kline):
             local_broker.handle_remote_event(event)
 
-        if detector.detect(kline_window):
-            logger.warning('Emergency detected')
+        equity_curve.update_price(kline)
+        sample_time = kline.open_time
+
+        # window consists of `window_size` historical klines and one current kline
+        klines = list(kline_window)
+        timeframe_windows[symbol].update_until(klines[:-1])
+
+        if detector.detect(klines):
+            logger.warning('%s emergency detected', symbol)
             continue
 
         if detector.cooldown:
-            logger.warning('Emergency detector cooling down')
+            logger.warning('%s emergency detector cooling down', symbol)
             continue
 
         # pass historical klines
-        order = emitter.get_order_request(kline_window[:-1])
+        order = emitter.get_order_request(klines[:-1], timeframe_windows=timeframe_windows[symbol].windows())
         if not order:
             continue
 
+        order.symbol = symbol
+
         if order_manager.is_order_acceptable(order):
             event = broker.add_order(order)
             local_broker.add_order(event.order_id, order)
 
-    assert kline_window, 'Not enough klines'
-    last_price = kline_window[-1].close
+    assert last_prices, 'Not enough klines'
+    if sample_time is not None:
+        equity_curve.record_sample(sample_time)
 
-    logger.info(f'total orders open: {len(order_list.orders_open)}')
-    logger.info(f'total orders closed: {len(order_list.orders_closed)}')
+    profit_unrealized = sum(
+        (o.get_profit_unrealized(last_prices[o.symbol]) for o in order_list.orders_open.values()),
+        Decimal()
+    )
 
-    logger.info(f'profit/loss on closed orders: {order_list.profit()}')
-    logger.info(f'profit/loss on open orders: {order_list.profit_unrealized(last_price)}')
+    result = BacktestResult(
+        order_list,
+        profit_unrealized,
+        equity_curve=equity_curve,
+        timeframe=kline.close_time - kline.open_time
+    )
+    result.log_summary()
+    return result
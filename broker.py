@@ -1,15 +1,20 @@
 import csv
 import enum
 import logging
+import os
 from dataclasses import dataclass
 from datetime import date, timedelta, datetime
 from decimal import Decimal
-from typing import Iterator, Optional
+from typing import Iterator, Optional, BinaryIO
 
 import pytz
 
 from kline import Kline
+from klinestore import is_compressed, read_klines_compressed, seek_klines_compressed
 from order import Order, OrderId
+from resample import resample_klines_iter, format_timeframe, write_klines_to_csv
+from sharedklines import SharedKlines
+from strategy.utils import parse_timedelta
 
 logger = logging.getLogger(__name__)
 
@@ -48,22 +53,54 @@ class BrokerSimulator(Broker):
         self,
         klines_csv_path: Optional[str] = None,
         kline_data_range: Optional['KlineDataRange'] = None,
-        config=None
+        config=None,
+        shared_klines: Optional[SharedKlines] = None
     ):
+        """
+        :param shared_klines: klines loaded to shared memory, used instead of reading files of `kline_data_range`
+        """
         assert klines_csv_path or kline_data_range
         path_iter = (klines_csv_path,) if klines_csv_path else kline_data_range.path_iter()
 
         self.config = config or {}
 
-        self._klines = get_klines_iter(
-            path_iter,
-            skip_header=self.config.get('skip_header', True),
-            timeframe=timedelta(minutes=5)
-        )
+        timeframe = parse_timedelta(self.config.get('timeframe', '5m'))
+        resample_timeframe = self.config.get('resample_timeframe')
+
+        if shared_klines:
+            assert kline_data_range and not resample_timeframe
+            self._klines = shared_klines.klines(*kline_data_range.datetime_range())
+        elif resample_timeframe:
+            self._klines = get_resampled_klines_iter(
+                path_iter,
+                parse_timedelta(resample_timeframe),
+                cache_dir=self.config.get('resample_cache_dir', 'market_data/resampled'),
+                skip_header=self.config.get('skip_header', True),
+                base_timeframe=timeframe
+            )
+        elif kline_data_range:
+            self._klines = kline_data_range.klines_iter(
+                skip_header=self.config.get('skip_header', True),
+                timeframe=timeframe
+            )
+        else:
+            self._klines = get_klines_iter(
+                path_iter,
+                skip_header=self.config.get('skip_header', True),
+                timeframe=timeframe
+            )
 
         self.order_count = 0
         self.orders: dict[OrderId, Order] = {}
 
+        self.intrabar_resolver = None
+        if self.config.get('fine_klines_path_template'):
+            self.intrabar_resolver = IntrabarResolver(
+                self.config['fine_klines_path_template'],
+                timeframe=parse_timedelta(self.config.get('fine_klines_timeframe', '1m')),
+                skip_header=self.config.get('skip_header', True)
+            )
+
     def klines(self) -> Iterator[Kline]:
         return self._klines
 
@@ -99,6 +136,10 @@ class BrokerSimulator(Broker):
         order = self.orders[order_id]
 
         if is_take_profit_achieved(kline, order) and is_stop_loss_achieved(kline, order):
+            if self.intrabar_resolver and (event := self.intrabar_resolver.resolve(kline, order_id, order)):
+                logger.info('Order %s: %s resolved by fine klines', order_id, event.type)
+                return event
+
             logger.warning('Undefined behaviour for order %s. Take profit and stop loss both achieved.', order_id)
             logger.info('take_profit_stop_loss_both_achieved strategy: %s',
                         self.config.get('take_profit_stop_loss_both_achieved'))
@@ -139,6 +180,73 @@ class BrokerSimulator(Broker):
         )
 
 
+class IntrabarResolver:
+    """
+    Finds out which of take profit and stop loss was achieved first inside a kline.
+
+    Klines of smaller timeframe are read only for klines where both prices were achieved.
+    """
+    def __init__(self, path_template: str, timeframe: timedelta, skip_header: bool = False):
+        """
+        :param path_template: path to fine klines, formatted by kline open time
+        :param timeframe: timeframe of fine klines
+        """
+        self.path_template = path_template
+        self.timeframe = timeframe
+        self.skip_header = skip_header
+
+        # several orders are often resolved on the same kline
+        self._cache_key = None
+        self._cache_klines: list[Kline] = []
+
+    def get_fine_klines(self, kline: Kline) -> list[Kline]:
+        if self._cache_key != kline.open_time:
+            path = kline.open_time.strftime(self.path_template)
+            if not os.path.exists(path):
+                logger.warning('Fine klines file %s not found', path)
+                return []
+
+            self._cache_key = kline.open_time
+            self._cache_klines = seek_klines_file(
+                path,
+                kline.open_time,
+                kline.close_time,
+                skip_header=self.skip_header,
+                timeframe=self.timeframe
+            )
+
+        return self._cache_klines
+
+    def resolve(self, kline: Kline, order_id: OrderId, order: Order) -> Optional[BrokerEvent]:
+        """
+        :return: close event, or None if fine klines do not resolve the order
+        """
+        for fine_kline in self.get_fine_klines(kline):
+            take_profit_achieved = is_take_profit_achieved(fine_kline, order)
+            stop_loss_achieved = is_stop_loss_achieved(fine_kline, order)
+
+            if take_profit_achieved and stop_loss_achieved:
+                return None
+
+            if take_profit_achieved:
+                return BrokerEvent(
+                    order_id=order_id,
+                    type=BrokerEventType.order_close_by_take_profit,
+                    created_at=fine_kline.open_time,
+                    price=order.price_take_profit
+                )
+
+            if stop_loss_achieved:
+                return BrokerEvent(
+                    order_id=order_id,
+                    type=BrokerEventType.order_close_by_stop_loss,
+                    created_at=fine_kline.open_time,
+                    price=order.price_stop_loss
+                )
+
+        return None
+
+
 @dataclass
 class KlineDataRange:
     path_template: str
@@ -149,6 +257,16 @@ class KlineDataRange:
         for d in date_iter(self.date_from, self.date_to):
             yield d.strftime(self.path_template)
 
+    def datetime_range(self) -> tuple[datetime, datetime]:
+        """
+        :return: UTC datetime range covered by files, the end is excluded
+        """
+        dt_from = pytz.UTC.localize(datetime.combine(self.date_from, datetime.min.time()))
+        return dt_from, dt_from + timedelta(days=(self.date_to - self.date_from).days + 1)
+
+    def klines_iter(self, skip_header: bool = False, timeframe: timedelta = timedelta()) -> Iterator[Kline]:
+        return get_klines_iter(self.path_iter(), skip_header=skip_header, timeframe=timeframe)
+
 
 def get_klines_iter(
         path_iter: Iterator[str],
@@ -156,7 +274,40 @@ def get_klines_iter(
         timeframe: timedelta = timedelta()
 ) -> Iterator[Kline]:
     for path in path_iter:
-        yield from read_klines_from_csv(path, skip_header=skip_header, timeframe=timeframe)
+        yield from read_klines_file(path, skip_header=skip_header, timeframe=timeframe)
+
+
+def get_resampled_klines_iter(
+        path_iter: Iterator[str],
+        timeframe: timedelta,
+        cache_dir: str,
+        skip_header: bool = False,
+        base_timeframe: timedelta = timedelta()
+) -> Iterator[Kline]:
+    """
+    Same as `get_klines_iter`, but yields klines of higher `timeframe`.
+
+    Resampled files are cached in `cache_dir`, so next runs read them directly.
+    Every file is resampled separately, so `timeframe` must divide one day.
+    """
+    assert timedelta(days=1) % timeframe == timedelta(), 'Timeframe must divide one day'
+    os.makedirs(cache_dir, exist_ok=True)
+
+    for path in path_iter:
+        # resampled klines are cached in csv files, whatever the format of source file is
+        name = os.path.splitext(os.path.basename(path))[0]
+        cache_path = os.path.join(cache_dir, f'{name}-{format_timeframe(timeframe)}.csv')
+
+        if os.path.exists(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(path):
+            yield from read_klines_from_csv(cache_path, timeframe=timeframe)
+            continue
+
+        logger.info('Resampling %s to %s', path, format_timeframe(timeframe))
+        klines = read_klines_file(path, skip_header=skip_header, timeframe=base_timeframe)
+        klines = list(resample_klines_iter(klines, timeframe))
+        write_klines_to_csv(cache_path, klines)
+
+        yield from klines
 
 
 def date_iter(date_from: date, date_to: date) -> Iterator[date]:
@@ -166,43 +317,133 @@ def date_iter(date_from: date, date_to: date) -> Iterator[date]:
         d += timedelta(days=1)
 
 
+KLINE_FIELD_NAMES = ['open_time', 'open', 'high', 'low', 'close', 'volume']
+
+
+def read_klines_file(path: str, skip_header: bool = False, timeframe: timedelta = timedelta()) -> list[Kline]:
+    """
+    Reads csv or compressed klines file, format is chosen by extension.
+    """
+    if is_compressed(path):
+        return read_klines_compressed(path, timeframe=timeframe)
+    return read_klines_from_csv(path, skip_header=skip_header, timeframe=timeframe)
+
+
+def seek_klines_file(
+        path: str,
+        dt_from: datetime,
+        dt_to: datetime,
+        skip_header: bool = False,
+        timeframe: timedelta = timedelta()
+) -> list[Kline]:
+    if is_compressed(path):
+        return seek_klines_compressed(path, dt_from, dt_to, timeframe=timeframe)
+    return seek_klines_csv(path, dt_from, dt_to, skip_header=skip_header, timeframe=timeframe)
+
+
 def read_klines_from_csv(
         path: str,
         skip_header: bool = False,
         timeframe: timedelta = timedelta()
         ) -> list[Kline]:
-    res = []
-    field_names = ['open_time', 'open', 'high', 'low', 'close', 'volume']
-
     with open(path) as f:
         if skip_header:
             next(f)
-        reader = csv.DictReader(f, fieldnames=field_names)
-        for row in reader:
-            open_time = datetime.fromtimestamp(int(row['open_time']) / 1000, tz=pytz.UTC)
-
-            # close_time in Binance market data looks like 1642637099999, which is next kline open time minus 1ms.
-            # This is not nice time for logging.
-            # Better to construct close_time manually
-            close_time = open_time + timeframe
-
-            open_price = Decimal(row['open'])  # do not clash with `open` python keyword
-            high = Decimal(row['high'])
-            low = Decimal(row['low'])
-            close = Decimal(row['close'])
-            volume = Decimal(row['volume'])
-
-            res.append(Kline(
-                open_time=open_time,
-                close_time=close_time,
-                open=open_price,
-                high=high,
-                low=low,
-                close=close,
-                volume=volume
-            ))
-
-    return res
+        reader = csv.DictReader(f, fieldnames=KLINE_FIELD_NAMES)
+        return [kline_from_row(row, timeframe) for row in reader]
+
+
+def kline_from_row(row: dict, timeframe: timedelta) -> Kline:
+    open_time = datetime.fromtimestamp(int(row['open_time']) / 1000, tz=pytz.UTC)
+
+    # close_time in Binance market data looks like 1642637099999, which is next kline open time minus 1ms.
+    # This is not nice time for logging.
+    # Better to construct close_time manually
+    close_time = open_time + timeframe
+
+    open_price = Decimal(row['open'])  # do not clash with `open` python keyword
+    high = Decimal(row['high'])
+    low = Decimal(row['low'])
+    close = Decimal(row['close'])
+    volume = Decimal(row['volume'])
+
+    return Kline(
+        open_time=open_time,
+        close_time=close_time,
+        open=open_price,
+        high=high,
+        low=low,
+        close=close,
+        volume=volume
+    )
+
+
+def to_timestamp_ms(dt: datetime) -> int:
+    return int(dt.timestamp() * 1000)
+
+
+def seek_klines_csv(
+        path: str,
+        dt_from: datetime,
+        dt_to: datetime,
+        skip_header: bool = False,
+        timeframe: timedelta = timedelta()
+) -> list[Kline]:
+    """
+    Reads klines with `dt_from <= open_time < dt_to`.
+
+    Rows in market data files are ordered by open time,
+    so the first row is found by binary search over file offsets.
+    Only rows of requested time range are read and parsed.
+    """
+    ts_from = to_timestamp_ms(dt_from)
+    ts_to = to_timestamp_ms(dt_to)
+
+    with open(path, 'rb') as f:
+        data_start = len(f.readline()) if skip_header else 0
+        f.seek(0, os.SEEK_END)
+        offset = find_csv_offset(f, ts_from, data_start, f.tell())
+
+        f.seek(offset)
+        lines = []
+        for line in f:
+            # blank lines, e.g. the trailing one, are skipped as by `find_csv_offset` and catalog
+            if not line.strip():
+                continue
+            if int(line.split(b',', 1)[0]) >= ts_to:
+                break
+            lines.append(line.decode())
+
+    reader = csv.DictReader(lines, fieldnames=KLINE_FIELD_NAMES)
+    return [kline_from_row(row, timeframe) for row in reader]
+
+
+def find_csv_offset(f: BinaryIO, ts: int, start: int, end: int) -> int:
+    """
+    :return: offset of the first row with open time >= `ts`, or `end` if there is no such row
+    """
+    def next_row_offset(offset: int) -> int:
+        if offset == 0:
+            return 0
+        # skip the rest of row containing `offset - 1`
+        f.seek(offset - 1)
+        f.readline()
+        return f.tell()
+
+    def is_row_late(offset: int) -> bool:
+        f.seek(next_row_offset(offset))
+        line = f.readline()
+        return not line.strip() or int(line.split(b',', 1)[0]) >= ts
+
+    lo, hi = start, end
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if is_row_late(mid):
+            hi = mid
+        else:
+            lo = mid + 1
+
+    return next_row_offset(lo)
 
 
 def is_price_achieved(kline: Kline, price: Decimal) -> bool:
@@ -0,0 +1,317 @@
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Iterator, Optional
+
+import numpy as np
+
+from broker import read_klines_from_csv, seek_klines_csv, to_timestamp_ms
+from kline import Kline
+from strategy.utils import parse_timedelta
+from validation import ValidationReport, parse_rows, validate_rows, repair_lines, OPEN_TIME
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    symbol TEXT NOT NULL,
+    timeframe TEXT NOT NULL,
+    has_header INTEGER NOT NULL,
+    first_open_time INTEGER,
+    last_open_time INTEGER,
+    rows INTEGER NOT NULL,
+    gaps INTEGER NOT NULL,
+    checksum TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS files_symbol_timeframe ON files (symbol, timeframe, first_open_time);
+
+CREATE TABLE IF NOT EXISTS validations (
+    path TEXT PRIMARY KEY REFERENCES files (path),
+    rows INTEGER NOT NULL,
+    duplicates INTEGER NOT NULL,
+    unordered INTEGER NOT NULL,
+    gaps INTEGER NOT NULL,
+    invalid_ohlc INTEGER NOT NULL,
+    non_positive INTEGER NOT NULL,
+    valid INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS validations_valid ON validations (valid);
+"""
+
+# market data files are named like BTCBUSD-5m-2022-02-18.csv
+FILE_NAME_PATTERN = re.compile(r'^(?P<symbol>[A-Z0-9]+)-(?P<timeframe>\d+[smhdw])-\d{4}-\d{2}-\d{2}\.csv$')
+
+
+@dataclass
+class CatalogFile:
+    path: str
+    symbol: str
+    timeframe: str
+    has_header: bool
+    # open time of the first and the last kline in ms, None for empty file
+    first_open_time: Optional[int]
+    last_open_time: Optional[int]
+    rows: int
+    # count of missing klines between the first and the last one
+    gaps: int
+    checksum: str
+    size: int
+    mtime: float
+
+    def covers(self, ts_from: int, ts_to: int) -> bool:
+        """
+        :return: True if all klines of the file are within `ts_from <= open_time < ts_to`
+        """
+        return self.first_open_time >= ts_from and self.last_open_time < ts_to
+
+
+def read_lines(path: str) -> tuple[bytes, list[bytes], Optional[bytes]]:
+    """
+    Blank lines are dropped.
+
+    :return: file content, data lines and header line, None if the file has no header
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    lines = [line for line in data.splitlines() if line.strip()]
+    if lines and not lines[0].split(b',', 1)[0].strip().isdigit():
+        return data, lines[1:], lines[0]
+    return data, lines, None
+
+
+def index_file(path: str, timeframe: str) -> tuple[CatalogFile, ValidationReport]:
+    """
+    File is parsed by numpy at once, which is much cheaper than parsing klines, and validated.
+    """
+    data, lines, header = read_lines(path)
+    rows = parse_rows(lines)
+    report = validate_rows(rows, parse_timedelta(timeframe) // timedelta(milliseconds=1))
+
+    stat = os.stat(path)
+    match = FILE_NAME_PATTERN.match(os.path.basename(path))
+    open_times = rows[:, OPEN_TIME].astype(np.int64)
+
+    file = CatalogFile(
+        path=path,
+        symbol=match['symbol'] if match else '',
+        timeframe=timeframe,
+        has_header=header is not None,
+        first_open_time=int(open_times.min()) if len(rows) else None,
+        last_open_time=int(open_times.max()) if len(rows) else None,
+        rows=len(rows),
+        gaps=report.gaps,
+        checksum=hashlib.sha256(data).hexdigest(),
+        size=stat.st_size,
+        mtime=stat.st_mtime
+    )
+    return file, report
+
+
+def repair_file(path: str, timeframe: str, fill_gaps: bool = False):
+    """
+    Rewrites file with rows sorted by open time, without duplicate and invalid rows, see `repair_lines`.
+    """
+    _, lines, header = read_lines(path)
+    lines = repair_lines(lines, parse_timedelta(timeframe) // timedelta(milliseconds=1), fill_gaps=fill_gaps)
+    if header is not None:
+        lines.insert(0, header)
+
+    path_tmp = f'{path}.{os.getpid()}.tmp'
+    with open(path_tmp, 'wb') as f:
+        f.writelines(line + b'\n' for line in lines)
+    os.replace(path_tmp, path)
+
+
+class MarketDataCatalog:
+    """
+    Index of market data files in SQLite database: symbol, timeframe, time range, row count, gaps and checksum.
+    Files are validated when they are indexed, results are stored in validations table.
+    Loaders take files of requested time range from the catalog instead of formatting a path per day.
+    """
+    def __init__(self, path: str):
+        self.connection = sqlite3.connect(path)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def get_file(self, path: str) -> Optional[CatalogFile]:
+        row = self.connection.execute('SELECT * FROM files WHERE path = ?', (path,)).fetchone()
+        return file_from_row(row) if row else None
+
+    def get_validation(self, path: str) -> Optional[ValidationReport]:
+        row = self.connection.execute('SELECT * FROM validations WHERE path = ?', (path,)).fetchone()
+        return report_from_row(row) if row else None
+
+    def get_invalid_files(self) -> list[tuple[str, ValidationReport]]:
+        rows = self.connection.execute('SELECT * FROM validations WHERE valid = 0 ORDER BY path')
+        return [(row['path'], report_from_row(row)) for row in rows]
+
+    def add_file(self, file: CatalogFile, report: ValidationReport):
+        with self.connection:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO validations (path, rows, duplicates, unordered, gaps, invalid_ohlc, '
+                'non_positive, valid) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (
+                    file.path, report.rows, report.duplicates, report.unordered, report.gaps, report.invalid_ohlc,
+                    report.non_positive, int(report.valid)
+                )
+            )
+            self.connection.execute(
+                'INSERT OR REPLACE INTO files (path, symbol, timeframe, has_header, first_open_time, last_open_time, '
+                'rows, gaps, checksum, size, mtime) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (
+                    file.path, file.symbol, file.timeframe, int(file.has_header), file.first_open_time,
+                    file.last_open_time, file.rows, file.gaps, file.checksum, file.size, file.mtime
+                )
+            )
+
+    def remove_files(self, paths: list[str]):
+        with self.connection:
+            self.connection.executemany('DELETE FROM files WHERE path = ?', [(path,) for path in paths])
+            self.connection.executemany('DELETE FROM validations WHERE path = ?', [(path,) for path in paths])
+
+    def refresh_file(self, file: CatalogFile) -> Optional[CatalogFile]:
+        """
+        Indexes file again if it changed since it was indexed, removes it if it does not exist anymore.
+
+        :return: indexed file, None if it is removed
+        """
+        try:
+            stat = os.stat(file.path)
+        except FileNotFoundError:
+            logger.warning('%s removed since it was indexed', file.path)
+            self.remove_files([file.path])
+            return None
+
+        if file.size == stat.st_size and file.mtime == stat.st_mtime:
+            return file
+
+        logger.warning('%s changed since it was indexed', file.path)
+        file, report = index_file(file.path, file.timeframe)
+        self.add_file(file, report)
+        return file
+
+    def scan(self, data_dir: str) -> list[CatalogFile]:
+        """
+        Indexes market data files of `data_dir` which are new or changed since the last scan,
+        and removes files which do not exist anymore.
+
+        :return: indexed files
+        """
+        res = []
+        paths = set()
+        # paths of files are compared with their dir, e.g. `market_data/` would not match `market_data`
+        data_dir = os.path.normpath(data_dir)
+
+        for name in sorted(os.listdir(data_dir)):
+            match = FILE_NAME_PATTERN.match(name)
+            if not match:
+                continue
+
+            path = os.path.join(data_dir, name)
+            paths.add(path)
+            stat = os.stat(path)
+            file = self.get_file(path)
+            if file and file.size == stat.st_size and file.mtime == stat.st_mtime and self.get_validation(path):
+                continue
+
+            file, report = index_file(path, match['timeframe'])
+            if not report.valid:
+                logger.warning('%s: %s', path, ', '.join(f'{k} {v}' for k, v in report.issues().items()))
+            self.add_file(file, report)
+            res.append(file)
+
+        rows = self.connection.execute('SELECT path FROM files').fetchall()
+        removed = [row['path'] for row in rows if os.path.dirname(row['path']) == data_dir
+                   and row['path'] not in paths]
+        self.remove_files(removed)
+
+        logger.info('%s: %s files indexed, %s removed', data_dir, len(res), len(removed))
+        return res
+
+    def find_files(self, symbol: str, timeframe: str, dt_from: datetime, dt_to: datetime) -> list[CatalogFile]:
+        """
+        :return: files with klines within `dt_from <= open_time < dt_to`, ordered by time
+        """
+        rows = self.connection.execute(
+            'SELECT * FROM files WHERE symbol = ? AND timeframe = ? AND rows > 0 '
+            'AND first_open_time < ? AND last_open_time >= ? ORDER BY first_open_time',
+            (symbol, timeframe, to_timestamp_ms(dt_to), to_timestamp_ms(dt_from))
+        )
+        return [file_from_row(row) for row in rows]
+
+
+def file_from_row(row: sqlite3.Row) -> CatalogFile:
+    return CatalogFile(**{**dict(row), 'has_header': bool(row['has_header'])})
+
+
+def report_from_row(row: sqlite3.Row) -> ValidationReport:
+    return ValidationReport(**{key: row[key] for key in row.keys() if key not in ('path', 'valid')})
+
+
+@dataclass
+class CatalogDataRange:
+    """
+    Same as `KlineDataRange`, but files are taken from the catalog, so missing days are skipped,
+    and the range may start and end within a day.
+    """
+    catalog: MarketDataCatalog
+    symbol: str
+    timeframe: str
+    dt_from: datetime
+    dt_to: datetime
+
+    def files(self) -> list[CatalogFile]:
+        """
+        Files changed since the last scan are indexed again, so their checksums and time ranges are current.
+        """
+        files = self.catalog.find_files(self.symbol, self.timeframe, self.dt_from, self.dt_to)
+        if [file for file in files if self.catalog.refresh_file(file) != file]:
+            files = self.catalog.find_files(self.symbol, self.timeframe, self.dt_from, self.dt_to)
+
+        step = parse_timedelta(self.timeframe) // timedelta(milliseconds=1)
+        for prev, file in zip(files, files[1:]):
+            if file.first_open_time - prev.last_open_time > step:
+                logger.warning('Klines missing between %s and %s', prev.path, file.path)
+
+        # files are validated on ingest, so klines are not checked while reading
+        for file in files:
+            report = self.catalog.get_validation(file.path)
+            if report and not report.valid:
+                logger.warning('%s is not valid: %s', file.path, report.issues())
+
+        return files
+
+    def path_iter(self) -> Iterator[str]:
+        for file in self.files():
+            yield file.path
+
+    def datetime_range(self) -> tuple[datetime, datetime]:
+        return self.dt_from, self.dt_to
+
+    def klines_iter(self, skip_header: bool = False, timeframe: timedelta = timedelta()) -> Iterator[Kline]:
+        """
+        Files within the range are read in full, the first row of edge files is found by binary search.
+
+        :param skip_header: ignored, catalog knows which files have a header
+        """
+        ts_from = to_timestamp_ms(self.dt_from)
+        ts_to = to_timestamp_ms(self.dt_to)
+
+        for file in self.files():
+            if file.covers(ts_from, ts_to):
+                yield from read_klines_from_csv(file.path, skip_header=file.has_header, timeframe=timeframe)
+            else:
+                yield from seek_klines_csv(
+                    file.path, self.dt_from, self.dt_to, skip_header=file.has_header, timeframe=timeframe
+                )
@@ -1,4 +1,31 @@
-from yaml import load, Loader
+import copy
+import os
+from functools import lru_cache
 
-with open('config.yml') as f:
-    configs = load(f, Loader=Loader)
+CONFIG_PATH = 'config.yml'
+
+
+@lru_cache(maxsize=None)
+def parse_yaml(path: str, mtime: float):
+    # yaml is imported on the first parse, it is slow to import and is not needed by every command
+    import yaml
+
+    # libyaml parser is several times faster than pure python one, CLoader exists only if libyaml is installed
+    loader = getattr(yaml, 'CLoader', yaml.Loader)
+    with open(path) as f:
+        return yaml.load(f, Loader=loader)
+
+
+def load_yaml(path: str):
+    """
+    Parsed files are cached until modified. Returns a copy, so callers may change it.
+    """
+    return copy.deepcopy(parse_yaml(path, os.path.getmtime(path)))
+
+
+@lru_cache(maxsize=None)
+def get_configs() -> dict:
+    """
+    App config is read on the first use rather than on import. Do not change returned dict.
+    """
+    return load_yaml(CONFIG_PATH)
@@ -0,0 +1,229 @@
+import hashlib
+import http.client
+import logging
+import os
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import date
+from typing import Optional
+from urllib.parse import urlsplit
+
+from broker import date_iter
+
+logger = logging.getLogger(__name__)
+
+BASE_URL = 'https://data.binance.vision'
+ARCHIVE_PATH_TEMPLATE = '/data/futures/um/daily/klines/{symbol}/{timeframe}/{name}.zip'
+CHUNK_SIZE = 1 << 16
+
+
+class DownloadError(Exception):
+    pass
+
+
+class NotFound(DownloadError):
+    pass
+
+
+@dataclass(frozen=True)
+class DownloadTask:
+    symbol: str
+    timeframe: str
+    day: date
+
+    @property
+    def name(self) -> str:
+        return f'{self.symbol}-{self.timeframe}-{self.day.isoformat()}'
+
+    @property
+    def archive_path(self) -> str:
+        return ARCHIVE_PATH_TEMPLATE.format(symbol=self.symbol, timeframe=self.timeframe, name=self.name)
+
+
+class HttpClient:
+    """
+    Keeps one connection per thread, so requests of a thread reuse it.
+    """
+    def __init__(self, base_url: str, timeout: float = 30):
+        url = urlsplit(base_url)
+        self.connection_class = http.client.HTTPSConnection if url.scheme == 'https' else http.client.HTTPConnection
+        self.netloc = url.netloc
+        self.timeout = timeout
+        self.local = threading.local()
+
+    def connection(self) -> http.client.HTTPConnection:
+        if getattr(self.local, 'connection', None) is None:
+            self.local.connection = self.connection_class(self.netloc, timeout=self.timeout)
+        return self.local.connection
+
+    def reset(self):
+        if getattr(self.local, 'connection', None) is not None:
+            self.local.connection.close()
+            self.local.connection = None
+
+    def request(self, path: str, headers: Optional[dict] = None) -> http.client.HTTPResponse:
+        """
+        Response must be read to the end before the next request.
+        """
+        connection = self.connection()
+        try:
+            connection.request('GET', path, headers=headers or {})
+            return connection.getresponse()
+        except (http.client.HTTPException, OSError):
+            self.reset()
+            raise
+
+    def get(self, path: str) -> bytes:
+        response = self.request(path)
+        body = response.read()
+        if response.status == 404:
+            raise NotFound(path)
+        if response.status != 200:
+            raise DownloadError(f'{path}: HTTP {response.status}')
+        return body
+
+    def download(self, path: str, dest: str):
+        """
+        Downloads to `dest`, resuming from the end of partially downloaded file if it exists.
+        """
+        offset = os.path.getsize(dest) if os.path.exists(dest) else 0
+        headers = {'Range': f'bytes={offset}-'} if offset else {}
+        response = self.request(path, headers)
+
+        if response.status == 416:
+            # partial file is complete already
+            response.read()
+            return
+        if response.status not in (200, 206):
+            response.read()
+            if response.status == 404:
+                raise NotFound(path)
+            raise DownloadError(f'{path}: HTTP {response.status}')
+
+        # server may ignore range and send the whole file
+        mode = 'ab' if response.status == 206 else 'wb'
+        try:
+            with open(dest, mode) as f:
+                while chunk := response.read(CHUNK_SIZE):
+                    f.write(chunk)
+
+            # reading by chunks does not raise if connection is closed before the end of response
+            if response.length:
+                raise http.client.IncompleteRead(b'', response.length)
+        except (http.client.HTTPException, OSError):
+            self.reset()
+            raise
+
+
+def parse_checksum(data: bytes) -> str:
+    """
+    Checksum files look like `<sha256>  BTCBUSD-5m-2022-02-18.zip`.
+    """
+    return data.split()[0].decode().lower()
+
+
+def hash_file(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def extract_csv(archive_path: str, data_dir: str) -> list[str]:
+    res = []
+    with zipfile.ZipFile(archive_path) as archive:
+        for name in archive.namelist():
+            if not name.endswith('.csv'):
+                continue
+
+            path = os.path.join(data_dir, os.path.basename(name))
+            path_tmp = f'{path}.{os.getpid()}.tmp'
+            with archive.open(name) as src, open(path_tmp, 'wb') as dst:
+                while chunk := src.read(CHUNK_SIZE):
+                    dst.write(chunk)
+            os.replace(path_tmp, path)
+            res.append(path)
+    return res
+
+
+def download_task(
+        client: HttpClient, task: DownloadTask, data_dir: str, retries: int = 3, retry_delay: float = 1
+) -> list[str]:
+    """
+    Downloads archive of the task, verifies its checksum and extracts csv file to `data_dir`.
+    Partial archive is kept on failure, so the next attempt or run resumes it.
+
+    :return: extracted files, empty if the archive does not exist
+    """
+    part_path = os.path.join(data_dir, f'{task.name}.zip.part')
+
+    for attempt in range(retries + 1):
+        try:
+            checksum = parse_checksum(client.get(f'{task.archive_path}.CHECKSUM'))
+            client.download(task.archive_path, part_path)
+
+            if hash_file(part_path) != checksum:
+                os.remove(part_path)
+                raise DownloadError('checksum mismatch')
+
+            res = extract_csv(part_path, data_dir)
+            os.remove(part_path)
+            logger.info('%s downloaded', task.name)
+            return res
+        except NotFound:
+            logger.warning('%s not found', task.name)
+            return []
+        except (DownloadError, http.client.HTTPException, OSError) as e:
+            if attempt == retries:
+                raise DownloadError(f'{task.name}: {e}') from e
+
+            logger.warning('%s: %s, retrying', task.name, e)
+            time.sleep(retry_delay * 2 ** attempt)
+
+    return []
+
+
+def download_klines(
+        symbol: str,
+        timeframe: str,
+        date_from: date,
+        date_to: date,
+        data_dir: str,
+        base_url: str = BASE_URL,
+        workers: int = 4,
+        retries: int = 3,
+        retry_delay: float = 1
+) -> list[str]:
+    """
+    Downloads daily kline files missing in `data_dir` by a pool of threads.
+
+    :return: downloaded files
+    """
+    os.makedirs(data_dir, exist_ok=True)
+    client = HttpClient(base_url)
+
+    tasks = [
+        task for task in (DownloadTask(symbol, timeframe, day) for day in date_iter(date_from, date_to))
+        if not os.path.exists(os.path.join(data_dir, f'{task.name}.csv'))
+    ]
+    logger.info('%s files to download', len(tasks))
+
+    res = []
+    errors = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(download_task, client, task, data_dir, retries, retry_delay) for task in tasks]
+        for future in futures:
+            try:
+                res += future.result()
+            except DownloadError as e:
+                logger.error('%s', e)
+                errors.append(e)
+
+    if errors:
+        raise DownloadError(f'{len(errors)} files failed, run again to resume')
+
+    return res
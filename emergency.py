@@ -21,17 +21,13 @@ class EmergencyDetector:
         self.cooldown = 0
 
     def detect(self, klines: List[Kline]) -> bool:
-        amplitudes = [abs(k.high - k.low) for k in klines]
+        return self.update(is_emergency(klines))
 
-        if amplitudes[-1] > 8 * median(amplitudes[-10:]):
-            self.cooldown = self.cooldown_max
-            return True
-
-        if mean(amplitudes[-3:]) > 5 * median(amplitudes[-20:]):
-            self.cooldown = self.cooldown_max
-            return True
-
-        if mean(amplitudes[-5:]) > 5 * median(amplitudes[-50:]):
+    def update(self, emergency: bool) -> bool:
+        """
+        Updates cooldown by emergency flag of the next window, see `is_emergency`.
+        """
+        if emergency:
             self.cooldown = self.cooldown_max
             return True
 
@@ -39,3 +35,21 @@ class EmergencyDetector:
             self.cooldown -= 1
 
         return False
+
+
+def is_emergency(klines: List[Kline]) -> bool:
+    """
+    Depends on kline window only, unlike `EmergencyDetector.detect`, so windows may be checked in any order.
+    """
+    amplitudes = [abs(k.high - k.low) for k in klines]
+
+    if amplitudes[-1] > 8 * median(amplitudes[-10:]):
+        return True
+
+    if mean(amplitudes[-3:]) > 5 * median(amplitudes[-20:]):
+        return True
+
+    if mean(amplitudes[-5:]) > 5 * median(amplitudes[-50:]):
+        return True
+
+    return False
@@ -0,0 +1,160 @@
+import math
+from datetime import datetime, timedelta
+from typing import Optional
+
+import numpy as np
+
+from kline import Kline
+from order import Order, OrderType
+
+
+def get_position_sign(order: Order) -> int:
+    return {
+        OrderType.LONG: 1,
+        OrderType.SHORT: -1,
+    }[order.order_type]
+
+
+class EquityCurve:
+    """
+    EquityCurve records realized plus mark-to-market profit/loss on every kline.
+
+    Open positions are aggregated per symbol, so recording a kline costs O(1)
+    regardless of the number of open orders.
+    Values are written into preallocated arrays, which grow twice when full.
+    """
+    def __init__(self, capacity: int = 1024):
+        self.size = 0
+        self.times = np.empty(capacity, dtype=np.int64)
+        self.equity = np.empty(capacity, dtype=np.float64)
+        self.orders_open = np.empty(capacity, dtype=np.int32)
+
+        self.profit_realized = 0.0
+        self.trade_profits: list[float] = []
+
+        # mark-to-market value and cost of open positions, both signed, short positions are negative
+        self.position_value = 0.0
+        self.position_cost = 0.0
+        self.position_amounts: dict[Optional[str], float] = {}
+        self.last_prices: dict[Optional[str], float] = {}
+        self.orders_open_count = 0
+
+    def update_position(self, order: Order, amount: float):
+        price_open = float(order.trade_open.price)
+        last_price = self.last_prices.setdefault(order.symbol, price_open)
+
+        self.position_amounts[order.symbol] = self.position_amounts.get(order.symbol, 0.0) + amount
+        self.position_value += amount * last_price
+        self.position_cost += amount * price_open
+
+    def on_order_opened(self, order: Order):
+        self.orders_open_count += 1
+        self.update_position(order, get_position_sign(order) * float(order.trade_open.amount))
+
+    def on_order_closed(self, order: Order):
+        profit = float(order.get_profit())
+        self.profit_realized += profit
+        self.trade_profits.append(profit)
+
+        self.orders_open_count -= 1
+        self.update_position(order, -get_position_sign(order) * float(order.trade_open.amount))
+
+    def record(self, kline: Kline):
+        self.update_price(kline)
+        self.record_sample(kline.open_time)
+
+    def update_price(self, kline: Kline):
+        """
+        Marks open positions of kline symbol to its close price, no sample is recorded.
+        """
+        price = float(kline.close)
+        symbol = kline.symbol
+
+        if symbol in self.last_prices:
+            self.position_value += self.position_amounts.get(symbol, 0.0) * (price - self.last_prices[symbol])
+        self.last_prices[symbol] = price
+
+    def record_sample(self, open_time: datetime):
+        """
+        Records equity once per open time, e.g. after klines of all symbols of a portfolio are applied.
+        """
+        if self.size == len(self.equity):
+            self.grow()
+
+        i = self.size
+        self.times[i] = int(open_time.timestamp())
+        self.equity[i] = self.profit_realized + self.position_value - self.position_cost
+        self.orders_open[i] = self.orders_open_count
+        self.size += 1
+
+    def grow(self):
+        capacity = 2 * len(self.equity)
+        self.times = np.resize(self.times, capacity)
+        self.equity = np.resize(self.equity, capacity)
+        self.orders_open = np.resize(self.orders_open, capacity)
+
+    def metrics(self, timeframe: timedelta) -> dict[str, float]:
+        """
+        :param timeframe: kline timeframe, used to annualize Sharpe and Sortino ratios
+        """
+        periods_per_year = timedelta(days=365) / timeframe
+
+        res = calc_equity_metrics(self.equity[:self.size], periods_per_year)
+        res['exposure_time'] = calc_exposure_time(self.orders_open[:self.size])
+        res.update(calc_trade_metrics(np.array(self.trade_profits, dtype=np.float64)))
+        return res
+
+
+def calc_drawdowns(equity: np.ndarray) -> np.ndarray:
+    """
+    :param equity: single curve, or 2D array with a curve per row
+    """
+    # profit/loss starts from zero, so zero is the first peak
+    peaks = np.maximum.accumulate(np.maximum(equity, 0.0), axis=-1)
+    return peaks - equity
+
+
+def calc_equity_metrics(equity: np.ndarray, periods_per_year: float) -> dict[str, float]:
+    """
+    There is no initial capital, so ratios are calculated on profit/loss changes per kline rather than on returns.
+    """
+    if not len(equity):
+        return {'max_drawdown': 0.0, 'sharpe': 0.0, 'sortino': 0.0}
+
+    changes = np.diff(equity, prepend=0.0)
+    mean = changes.mean()
+    std = changes.std()
+    downside_std = math.sqrt(np.mean(np.minimum(changes, 0.0) ** 2))
+    annualization = math.sqrt(periods_per_year)
+
+    return {
+        'max_drawdown': float(calc_drawdowns(equity).max()),
+        'sharpe': float(mean / std * annualization) if std else 0.0,
+        'sortino': float(mean / downside_std * annualization) if downside_std else 0.0,
+    }
+
+
+def calc_exposure_time(orders_open: np.ndarray) -> float:
+    """
+    :return: share of klines with at least one open order
+    """
+    if not len(orders_open):
+        return 0.0
+    return float(np.count_nonzero(orders_open) / len(orders_open))
+
+
+def calc_trade_metrics(profits: np.ndarray) -> dict[str, float]:
+    wins = profits[profits > 0]
+    losses = profits[profits < 0]
+
+    gross_profit = wins.sum()
+    gross_loss = -losses.sum()
+
+    return {
+        'trades': len(profits),
+        'win_rate': len(wins) / len(profits) if len(profits) else 0.0,
+        'avg_win': float(wins.mean()) if len(wins) else 0.0,
+        'avg_loss': float(losses.mean()) if len(losses) else 0.0,
+        'profit_factor': float(gross_profit / gross_loss) if gross_loss else 0.0,
+        'expectancy': float(profits.mean()) if len(profits) else 0.0,
+    }
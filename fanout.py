@@ -0,0 +1,129 @@
+import logging
+from collections import defaultdict
+from datetime import timedelta, datetime
+from typing import Iterable, Optional, Any, Sequence
+
+from backtest import BacktestResult, OrderLoop
+from broker import Broker
+from emergency import EmergencyDetector
+from kline import Kline, get_moving_window_iterator
+from resample import TimeframeWindows
+from results import hash_config
+from strategy.emitter import SignalEmitter
+from strategy.ordermanager import OrderManager
+
+logger = logging.getLogger(__name__)
+
+
+class SharedFeatures:
+    """
+    Features of the current kline window calculated by one emitter of a group and taken by the rest of them.
+    Emitters share features if they provide `get_features_params` and `calc_features`, see `JumpLevelEmitter`.
+    """
+    def __init__(self, emitter: SignalEmitter):
+        self.emitter = emitter
+        self.klines: list[Kline] = []
+        self.timeframe_windows: Optional[dict[timedelta, Sequence[Kline]]] = None
+        self.open_time: Optional[datetime] = None
+        self.features: Any = None
+
+    def set_window(self, klines: list[Kline], timeframe_windows: dict[timedelta, Sequence[Kline]]):
+        self.klines = klines
+        self.timeframe_windows = timeframe_windows
+
+    def get(self, open_time: datetime) -> Any:
+        """
+        Features are calculated by the first emitter asking for them.
+        """
+        if self.open_time != open_time:
+            assert self.klines[-1].open_time == open_time
+            self.emitter.update_trackers(self.klines)
+            self.features = self.emitter.calc_features(self.klines, self.timeframe_windows)
+            self.open_time = open_time
+        return self.features
+
+
+def get_timeframes_key(emitter: SignalEmitter) -> tuple:
+    return tuple(sorted(emitter.timeframes.items()))
+
+
+def backtest_fanout(
+        contexts: list[tuple[OrderManager, SignalEmitter]],
+        brokers: list[Broker],
+        klines: Iterable[Kline],
+        window_size: int
+) -> list[BacktestResult]:
+    """
+    Runs several strategy contexts in lockstep over one kline stream, which is read and windowed once.
+
+    Every context has its own broker with order state, brokers are not asked for klines.
+    Emergency detection depends on klines only, so it is shared by all contexts, as well as higher timeframe windows
+    of equal timeframes and features of emitters with equal features params.
+
+    :return: results in order of contexts
+    """
+    assert len(contexts) == len(brokers)
+
+    order_loops = [OrderLoop(order_manager, broker) for (order_manager, _), broker in zip(contexts, brokers)]
+    emitters = [emitter for _, emitter in contexts]
+
+    timeframe_windows = {}
+    for emitter in emitters:
+        key = get_timeframes_key(emitter)
+        if key not in timeframe_windows:
+            timeframe_windows[key] = TimeframeWindows(emitter.timeframes)
+
+    groups = defaultdict(list)
+    for emitter in emitters:
+        if hasattr(emitter, 'get_features_params') and hasattr(emitter, 'calc_features'):
+            groups[hash_config(emitter.get_features_params())].append(emitter)
+
+    shared_features = []
+    for group in groups.values():
+        if len(group) < 2:
+            continue
+
+        # the first emitter of the group calculates features for all of them, including itself
+        features = SharedFeatures(group[0])
+        for emitter in group:
+            emitter.features = features
+        shared_features.append(features)
+
+    logger.info('%s contexts, %s groups share features', len(contexts), len(shared_features))
+
+    kline_window = []
+    detector = EmergencyDetector()
+
+    # window consists of `window_size` historical klines and one current kline
+    for kline_window in get_moving_window_iterator(klines, window_size + 1):
+        kline = kline_window[-1]
+        historical_klines = kline_window[:-1]
+
+        for windows in timeframe_windows.values():
+            # higher timeframe windows are built from historical klines only
+            windows.update_until(historical_klines)
+
+        for order_loop in order_loops:
+            order_loop.update(kline)
+
+        if detector.detect(kline_window):
+            logger.warning('Emergency detected')
+            continue
+
+        if detector.cooldown:
+            logger.warning('Emergency detector cooling down')
+            continue
+
+        windows_by_key = {key: windows.windows() for key, windows in timeframe_windows.items()}
+        for features in shared_features:
+            features.set_window(historical_klines, windows_by_key[get_timeframes_key(features.emitter)])
+
+        for emitter, order_loop in zip(emitters, order_loops):
+            order = emitter.get_order_request(
+                historical_klines, timeframe_windows=windows_by_key[get_timeframes_key(emitter)]
+            )
+            if order:
+                order_loop.add_order(order)
+
+    assert kline_window, 'Not enough klines'
+    return [order_loop.get_result(kline_window[-1]) for order_loop in order_loops]
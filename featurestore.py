@@ -0,0 +1,165 @@
+import json
+import logging
+import os
+import shutil
+from datetime import date, datetime, timedelta
+from typing import Callable, Optional, Any
+
+import numpy as np
+import pytz
+
+from broker import date_iter
+
+logger = logging.getLogger(__name__)
+
+# every partition has open time column, rows are sorted by it
+OPEN_TIME_COLUMN = 'open_time'
+
+# calculates feature columns of klines opened within the day
+CalcDayFeatures = Callable[[date], dict[str, np.ndarray]]
+# version of source data which features of the day are calculated from, e.g. hash of market data files,
+# None if there is no data of the day
+GetDayVersion = Callable[[date], Optional[str]]
+
+VERSION_FILE = 'version'
+
+
+def to_timestamp_ms(dt: datetime) -> int:
+    return int(dt.timestamp() * 1000)
+
+
+class FeatureStore:
+    """
+    Per-kline features calculated once and stored on disk in columnar format:
+    `{root}/{dataset}/{key}/{YYYY-MM-DD}/{column}.npy`, where dataset is e.g. symbol and timeframe,
+    and key identifies feature params. Day partitions are the block index by time,
+    columns are memory-mapped on read, so a lookup touches only pages it needs.
+    Every partition keeps version of source data it is calculated from.
+    """
+    def __init__(self, root: str):
+        self.root = root
+
+    def key_dir(self, dataset: str, key: str) -> str:
+        return os.path.join(self.root, dataset, key)
+
+    def partition_dir(self, dataset: str, key: str, day: date) -> str:
+        return os.path.join(self.key_dir(dataset, key), day.isoformat())
+
+    def get_day_version(self, dataset: str, key: str, day: date) -> Optional[str]:
+        """
+        :return: version of source data of stored day, None if the day is not stored
+        """
+        try:
+            with open(os.path.join(self.partition_dir(dataset, key, day), VERSION_FILE)) as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def write_day(self, dataset: str, key: str, day: date, columns: dict[str, np.ndarray], version: str):
+        assert OPEN_TIME_COLUMN in columns
+        path = self.partition_dir(dataset, key, day)
+        path_tmp = f'{path}.{os.getpid()}.tmp'
+        os.makedirs(path_tmp, exist_ok=True)
+
+        for name, values in columns.items():
+            np.save(os.path.join(path_tmp, f'{name}.npy'), values)
+        with open(os.path.join(path_tmp, VERSION_FILE), 'w') as f:
+            f.write(version)
+
+        # readers never see partially written partition
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        os.replace(path_tmp, path)
+
+    def read_day(self, dataset: str, key: str, day: date) -> Optional[dict[str, np.ndarray]]:
+        path = self.partition_dir(dataset, key, day)
+        if not os.path.isdir(path):
+            return None
+
+        return {
+            name[:-len('.npy')]: np.load(os.path.join(path, name), mmap_mode='r')
+            for name in os.listdir(path) if name.endswith('.npy')
+        }
+
+    def write_params(self, dataset: str, key: str, params: dict):
+        """
+        Params are not read back, they only describe stored features for humans.
+        """
+        path = self.key_dir(dataset, key)
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, 'params.json'), 'w') as f:
+            json.dump(params, f, indent=2, sort_keys=True, default=str)
+
+    def update(
+            self,
+            dataset: str,
+            key: str,
+            date_from: date,
+            date_to: date,
+            calc_day_features: CalcDayFeatures,
+            get_day_version: GetDayVersion
+    ) -> list[date]:
+        """
+        Calculates features of days not stored yet, e.g. days added to market data since the last update,
+        and of days which source data changed, e.g. a day stored while its data was partial.
+        Days without source data are skipped.
+
+        :return: days calculated
+        """
+        res = []
+        for day in date_iter(date_from, date_to):
+            version = get_day_version(day)
+            if version is None or version == self.get_day_version(dataset, key, day):
+                continue
+
+            self.write_day(dataset, key, day, calc_day_features(day), version)
+            res.append(day)
+
+        logger.info('%s features: %s days calculated', dataset, len(res))
+        return res
+
+    def lookup(self, dataset: str, key: str) -> 'FeatureLookup':
+        return FeatureLookup(self, dataset, key)
+
+
+class FeatureLookup:
+    """
+    Serves rows of stored features by kline open time. Day partitions are opened on first use.
+    """
+    def __init__(self, store: FeatureStore, dataset: str, key: str):
+        self.store = store
+        self.dataset = dataset
+        self.key = key
+        self.partitions: dict[date, Optional[dict[str, np.ndarray]]] = {}
+
+    def get(self, open_time: datetime) -> Optional[dict[str, Any]]:
+        """
+        :return: feature values by column, None if features of the kline are not stored
+        """
+        day = open_time.astimezone(pytz.UTC).date()
+        if day not in self.partitions:
+            self.partitions[day] = self.store.read_day(self.dataset, self.key, day)
+
+        columns = self.partitions[day]
+        if columns is None:
+            return None
+
+        open_times = columns[OPEN_TIME_COLUMN]
+        timestamp = to_timestamp_ms(open_time)
+        i = int(np.searchsorted(open_times, timestamp))
+        if i == len(open_times) or open_times[i] != timestamp:
+            return None
+
+        return {name: values[i].item() for name, values in columns.items()}
+
+
+def get_warm_up_days(window: timedelta) -> int:
+    """
+    Number of days preceding a day, which contain klines of windows ending within the day.
+    """
+    return -(-window // timedelta(days=1))
+
+
+def day_range(day: date) -> tuple[datetime, datetime]:
+    dt_from = pytz.UTC.localize(datetime.combine(day, datetime.min.time()))
+    return dt_from, dt_from + timedelta(days=1)
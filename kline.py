@@ -1,7 +1,7 @@
 from dataclasses import dataclass
 from datetime import datetime
 from decimal import Decimal
-from typing import Iterator
+from typing import Iterator, Optional
 
 
 @dataclass
@@ -13,6 +13,7 @@ class Kline:
     low: Decimal
     close: Decimal
     volume: Decimal = Decimal(0)
+    symbol: Optional[str] = None
 
 
 def get_moving_window_iterator(values: Iterator, size) -> Iterator[list]:
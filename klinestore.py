@@ -0,0 +1,211 @@
+import logging
+import os
+import struct
+import zlib
+from bisect import bisect_left
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Iterable, Optional
+
+import numpy as np
+import pytz
+
+from kline import Kline
+
+logger = logging.getLogger(__name__)
+
+# compressed kline files have .klz extension, loaders choose format by it
+EXTENSION = '.klz'
+MAGIC = b'KLZ1'
+BLOCK_SIZE = 1024
+# zlib level 1 is the fastest one, delta encoded and shuffled columns compress well anyway
+COMPRESS_LEVEL = 1
+
+COLUMNS = ['open_time', 'open', 'high', 'low', 'close', 'volume']
+PRICE_COLUMNS = COLUMNS[1:]
+
+# magic, rows, blocks, decimal places of price columns
+HEADER = struct.Struct('<4sqq5b')
+# first and last open time, offset and size of compressed block, rows
+BLOCK_INDEX_ENTRY = struct.Struct('<qqqqq')
+
+
+@dataclass
+class Block:
+    first_open_time: int
+    last_open_time: int
+    offset: int
+    size: int
+    rows: int
+
+
+def get_decimal_places(values: Iterable[Decimal]) -> int:
+    return max((-value.as_tuple().exponent for value in values), default=0)
+
+
+def encode_block(rows: np.ndarray) -> bytes:
+    """
+    Every column is delta encoded, then bytes of int64 values are shuffled,
+    so high bytes of small deltas, which are mostly zeros, go together.
+    """
+    deltas = np.diff(rows, axis=0, prepend=np.zeros((1, rows.shape[1]), dtype=np.int64))
+    shuffled = deltas.T.copy().view(np.uint8).reshape(-1, 8).T
+    return zlib.compress(shuffled.tobytes(), COMPRESS_LEVEL)
+
+
+def decode_block(data: bytes, rows: int) -> np.ndarray:
+    shuffled = np.frombuffer(zlib.decompress(data), dtype=np.uint8).reshape(8, -1)
+    deltas = shuffled.T.copy().view(np.int64).reshape(len(COLUMNS), rows).T
+    return np.cumsum(deltas, axis=0)
+
+
+def write_klines_compressed(path: str, klines: Iterable[Kline], block_size: int = BLOCK_SIZE):
+    """
+    Writes klines ordered by open time. Prices are stored as integers scaled by decimal places of the column,
+    so read klines equal written ones, and trailing zeros are kept if all values of the column have them.
+    """
+    klines = list(klines)
+    places = [get_decimal_places(getattr(k, name) for k in klines) for name in PRICE_COLUMNS]
+
+    rows = np.array([
+        (
+            int(k.open_time.timestamp() * 1000),
+            *(int(getattr(k, name).scaleb(p)) for name, p in zip(PRICE_COLUMNS, places))
+        )
+        for k in klines
+    ], dtype=np.int64).reshape(-1, len(COLUMNS))
+
+    blocks = []
+    data = []
+    offset = 0
+    for start in range(0, len(rows), block_size):
+        block_rows = rows[start:start + block_size]
+        block_data = encode_block(block_rows)
+        blocks.append(Block(int(block_rows[0, 0]), int(block_rows[-1, 0]), offset, len(block_data), len(block_rows)))
+        data.append(block_data)
+        offset += len(block_data)
+
+    path_tmp = f'{path}.{os.getpid()}.tmp'
+    with open(path_tmp, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, len(rows), len(blocks), *places))
+        for block in blocks:
+            f.write(BLOCK_INDEX_ENTRY.pack(block.first_open_time, block.last_open_time, block.offset, block.size,
+                                           block.rows))
+        f.writelines(data)
+
+    # readers never see partially written file
+    os.replace(path_tmp, path)
+
+
+class CompressedKlinesFile:
+    """
+    Reads header and block index on open, blocks are read and decompressed only if requested range touches them.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            magic, self.rows, blocks_count, *self.places = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC:
+                raise ValueError(f'{path} is not a compressed klines file')
+
+            self.blocks = [
+                Block(*BLOCK_INDEX_ENTRY.unpack(f.read(BLOCK_INDEX_ENTRY.size))) for _ in range(blocks_count)
+            ]
+        self.data_offset = HEADER.size + BLOCK_INDEX_ENTRY.size * blocks_count
+
+    def read_rows(self, ts_from: Optional[int] = None, ts_to: Optional[int] = None) -> np.ndarray:
+        """
+        :return: rows with `ts_from <= open_time < ts_to`
+        """
+        start = bisect_left([b.last_open_time for b in self.blocks], ts_from) if ts_from is not None else 0
+        end = bisect_left([b.first_open_time for b in self.blocks], ts_to) if ts_to is not None else len(self.blocks)
+        if start >= end:
+            return np.zeros((0, len(COLUMNS)), dtype=np.int64)
+
+        with open(self.path, 'rb') as f:
+            parts = []
+            for block in self.blocks[start:end]:
+                f.seek(self.data_offset + block.offset)
+                parts.append(decode_block(f.read(block.size), block.rows))
+
+        rows = np.concatenate(parts)
+        open_times = rows[:, 0]
+        row_from = np.searchsorted(open_times, ts_from) if ts_from is not None else 0
+        row_to = np.searchsorted(open_times, ts_to) if ts_to is not None else len(rows)
+        return rows[row_from:row_to]
+
+    def klines(
+            self,
+            timeframe: timedelta = timedelta(),
+            dt_from: Optional[datetime] = None,
+            dt_to: Optional[datetime] = None
+    ) -> list[Kline]:
+        """
+        Same as `seek_klines_csv`, klines with `dt_from <= open_time < dt_to`, all klines by default.
+        """
+        rows = self.read_rows(
+            int(dt_from.timestamp() * 1000) if dt_from else None,
+            int(dt_to.timestamp() * 1000) if dt_to else None
+        )
+
+        if not len(rows):
+            return []
+
+        # fromtimestamp is slow, open times mostly differ by timeframe, so they are built by adding deltas
+        open_time = datetime.fromtimestamp(int(rows[0, 0]) / 1000, tz=pytz.UTC)
+        open_time_ms_prev = int(rows[0, 0])
+        deltas: dict[int, timedelta] = {}
+
+        # open price is equal to previous close price and so on, decimals are immutable and shared
+        decimals: list[dict[int, Decimal]] = [{} for _ in PRICE_COLUMNS]
+        exponents = [-p for p in self.places]
+
+        def to_decimal(value: int, i: int) -> Decimal:
+            cache = decimals[i]
+            res = cache.get(value)
+            if res is None:
+                res = cache[value] = Decimal(value).scaleb(exponents[i])
+            return res
+
+        res = []
+        for open_time_ms, open_price, high, low, close, volume in rows.tolist():
+            delta_ms = open_time_ms - open_time_ms_prev
+            if delta_ms:
+                if delta_ms not in deltas:
+                    deltas[delta_ms] = timedelta(milliseconds=delta_ms)
+                open_time += deltas[delta_ms]
+                open_time_ms_prev = open_time_ms
+
+            res.append(Kline(
+                open_time=open_time,
+                close_time=open_time + timeframe,
+                open=to_decimal(open_price, 0),
+                high=to_decimal(high, 1),
+                low=to_decimal(low, 2),
+                close=to_decimal(close, 3),
+                volume=to_decimal(volume, 4)
+            ))
+        return res
+
+
+def read_klines_compressed(path: str, timeframe: timedelta = timedelta()) -> list[Kline]:
+    return CompressedKlinesFile(path).klines(timeframe)
+
+
+def seek_klines_compressed(
+        path: str, dt_from: datetime, dt_to: datetime, timeframe: timedelta = timedelta()
+) -> list[Kline]:
+    return CompressedKlinesFile(path).klines(timeframe, dt_from, dt_to)
+
+
+def is_compressed(path: str) -> bool:
+    return path.endswith(EXTENSION)
+
+
+def get_compressed_path(path: str, compressed_dir: Optional[str] = None) -> str:
+    """
+    Path of compressed copy of csv file, next to it or in `compressed_dir`.
+    """
+    name = os.path.splitext(os.path.basename(path))[0] + EXTENSION
+    return os.path.join(compressed_dir or os.path.dirname(path), name)
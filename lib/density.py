@@ -0,0 +1,139 @@
+import heapq
+from bisect import bisect_left, bisect_right
+from collections import deque, defaultdict
+from decimal import Decimal
+from typing import Iterable, Optional
+
+from lib.levels import Level, DENSITY_SECTORS_COUNT, DENSITY_LEVELS_COUNT, DENSITY_EPS
+
+
+class WindowDensity:
+    """
+    Sliding window version of `calc_levels_by_density` for the last `size` points.
+
+    With `sector_len` points are counted in fixed price sectors `[k * sector_len, (k + 1) * sector_len)`,
+    so an update only increments the sector of the new point and decrements the sector of the expired one.
+
+    Without `sector_len` sectors are relative to min and max of the window, as in `calc_levels_by_density`.
+    They move with min and max, so counts are not kept. Instead window points are kept sorted,
+    and every sector is found by binary search, which costs O(sectors_count * log(size)) per query
+    instead of a division per point.
+    """
+    def __init__(
+            self,
+            size: int,
+            sector_len: Optional[Decimal] = None,
+            sectors_count: int = DENSITY_SECTORS_COUNT,
+            levels_count: int = DENSITY_LEVELS_COUNT
+    ):
+        self.size = size
+        self.sector_len = sector_len
+        self.sectors_count = sectors_count
+        self.levels_count = levels_count
+        # number of points pushed
+        self.seq = 0
+        self.points: deque[Decimal] = deque()
+
+        # fixed sectors: sector index -> count of window points
+        self.counts: dict[Decimal, int] = defaultdict(int)
+
+        # relative sectors: window points sorted by (value, sequence number)
+        self.values: list[Decimal] = []
+        self.seqs: list[int] = []
+
+    def update(self, point: Decimal):
+        self.points.append(point)
+        self.add(point)
+        self.seq += 1
+
+        if len(self.points) > self.size:
+            self.remove(self.points.popleft())
+
+    def add(self, point: Decimal):
+        if self.sector_len:
+            self.counts[point // self.sector_len] += 1
+            return
+
+        # equal values are ordered by sequence number, the new point is the latest one
+        i = bisect_right(self.values, point)
+        self.values.insert(i, point)
+        self.seqs.insert(i, self.seq)
+
+    def remove(self, point: Decimal):
+        if self.sector_len:
+            index = point // self.sector_len
+            self.counts[index] -= 1
+            if not self.counts[index]:
+                del self.counts[index]
+            return
+
+        # expired point is the oldest one, so it goes first among equal values
+        i = bisect_left(self.values, point)
+        del self.values[i]
+        del self.seqs[i]
+
+    def levels(self) -> list[Level]:
+        if self.sector_len:
+            top_sectors = heapq.nlargest(self.levels_count, self.counts.items(), key=lambda t: t[1])
+            return [(index * self.sector_len, (index + 1) * self.sector_len) for index, _ in top_sectors]
+
+        return self.relative_levels()
+
+    def relative_levels(self) -> list[Level]:
+        values = self.values
+        value_min = values[0]
+        value_max = values[-1] + DENSITY_EPS
+        sector_len = (value_max - value_min) / self.sectors_count
+
+        def get_sector(point):
+            return (point - value_min) // sector_len
+
+        # (-count, sequence number of the first point) reproduces ordering of `calc_levels_by_density`:
+        # sectors are sorted by count, ties keep the order in which sectors appear in the window
+        sectors = []
+        start = 0
+        while start < len(values):
+            index = get_sector(values[start])
+            end = bisect_left(values, index + 1, lo=start, key=get_sector)
+            sectors.append((-(end - start), min(self.seqs[start:end]), index))
+            start = end
+
+        res = []
+        for _, _, index in heapq.nsmallest(self.levels_count, sectors):
+            level_bottom = value_min + index * sector_len
+            level_top = level_bottom + sector_len
+            res.append((round(level_bottom, 0), round(level_top, 0)))
+
+        return res
+
+
+class DensityTracker:
+    """
+    Density of the last points for several window sizes at once, e.g. all sizes tried
+    by `find_optimal_window_size`. Every window is updated by the same point.
+    """
+    def __init__(
+            self,
+            sizes: Iterable[int],
+            sector_len: Optional[Decimal] = None,
+            sectors_count: int = DENSITY_SECTORS_COUNT,
+            levels_count: int = DENSITY_LEVELS_COUNT
+    ):
+        self.windows = {
+            size: WindowDensity(size, sector_len=sector_len, sectors_count=sectors_count, levels_count=levels_count)
+            for size in sizes
+        }
+
+    @property
+    def sizes(self) -> list[int]:
+        return list(self.windows)
+
+    def update(self, point: Decimal):
+        for window in self.windows.values():
+            window.update(point)
+
+    def levels(self, size: int) -> list[Level]:
+        """
+        The same as `calc_levels_by_density` of the last `size` points in relative mode.
+        """
+        return self.windows[size].levels()
@@ -0,0 +1,189 @@
+from bisect import bisect_left, bisect_right
+from collections import deque
+from decimal import Decimal
+from typing import Optional
+
+from lib.indicators import calc_MA
+from lib.levels import calc_local_maximums, calc_local_minimums, deduplicate, calc_MA_extremums, MA_SIZE
+
+
+class ExtremumTracker:
+    """
+    Streaming version of `calc_local_maximums` and `calc_local_minimums`.
+
+    Point `i` is a local maximum if it is not less than any point of `[i - radius, i + radius]`.
+    This depends on neighbour points only, so the point is confirmed once point `i + radius` arrives
+    and stays an extremum of every window containing its neighbours.
+    Max and min of the last `2 * radius + 1` points are kept in monotonic deques, so update costs O(1) amortized.
+    """
+    def __init__(self, radius: int = 1, capacity: Optional[int] = None):
+        """
+        :param capacity: max size of windows queried, older extremums are dropped
+        """
+        self.radius = radius
+        self.capacity = capacity
+        # number of points pushed
+        self.size = 0
+
+        self.recent = deque(maxlen=2 * radius + 1)
+        # (index, value) of recent points, values decrease in max deque and increase in min deque
+        self.max_deque: deque[tuple[int, Decimal]] = deque()
+        self.min_deque: deque[tuple[int, Decimal]] = deque()
+
+        self.max_indices: list[int] = []
+        self.max_values: list[Decimal] = []
+        self.min_indices: list[int] = []
+        self.min_values: list[Decimal] = []
+
+    def update(self, value: Decimal):
+        index = self.size
+        self.size += 1
+        self.recent.append(value)
+
+        while self.max_deque and self.max_deque[-1][1] <= value:
+            self.max_deque.pop()
+        self.max_deque.append((index, value))
+
+        while self.min_deque and self.min_deque[-1][1] >= value:
+            self.min_deque.pop()
+        self.min_deque.append((index, value))
+
+        first_index = index - 2 * self.radius
+        for d in (self.max_deque, self.min_deque):
+            if d[0][0] < first_index:
+                d.popleft()
+
+        if first_index < 0:
+            return
+
+        center = self.recent[self.radius]
+        if center >= self.max_deque[0][1]:
+            self.max_indices.append(index - self.radius)
+            self.max_values.append(center)
+        if center <= self.min_deque[0][1]:
+            self.min_indices.append(index - self.radius)
+            self.min_values.append(center)
+
+        if self.capacity and self.size % self.capacity == 0:
+            self.prune()
+
+    def prune(self):
+        first_index = self.size - self.capacity
+        for indices, values in ((self.max_indices, self.max_values), (self.min_indices, self.min_values)):
+            count = bisect_left(indices, first_index)
+            del indices[:count]
+            del values[:count]
+
+    def maximums(self, size: int, start: int = 0) -> tuple[list[int], list[Decimal]]:
+        """
+        The same as `calc_local_maximums` of the last `size` points.
+
+        :param start: first index of extremums to return, relative to the window
+        """
+        return self.query(self.max_indices, self.max_values, size, start)
+
+    def minimums(self, size: int, start: int = 0) -> tuple[list[int], list[Decimal]]:
+        return self.query(self.min_indices, self.min_values, size, start)
+
+    def query(
+            self, indices: list[int], values: list[Decimal], size: int, start: int
+    ) -> tuple[list[int], list[Decimal]]:
+        assert size <= self.size and (not self.capacity or size <= self.capacity)
+
+        window_start = self.size - size
+        # endpoints of the window are excluded, as in `calc_local_extremums`
+        i = bisect_left(indices, window_start + max(self.radius, start))
+        return [index - window_start for index in indices[i:]], values[i:]
+
+
+class MAExtremumTracker:
+    """
+    Streaming version of extremums calculated by `calc_levels_by_MA_extremums`: extremums of rounded
+    moving average of close prices, where repeating values are treated as a single point.
+
+    Moving average of the first `MA_SIZE - 1` points of a window is padded with the first point,
+    so these points depend on the window start and are calculated on query.
+    The rest of moving average and its extremums are the same for every window and are tracked incrementally.
+    """
+    def __init__(self, capacity: int):
+        """
+        :param capacity: max size of windows queried
+        """
+        self.capacity = capacity
+        self.size = 0
+        # the last `capacity` points
+        self.points: deque[Decimal] = deque(maxlen=capacity)
+
+        # moving average deduplicated, every run of equal values is a single point
+        self.run_starts: list[int] = []
+        self.run_values: list[Decimal] = []
+        self.runs_pruned = 0
+        self.extremums = ExtremumTracker(radius=1)
+
+    def update(self, point: Decimal):
+        self.points.append(point)
+        self.size += 1
+
+        if len(self.points) < MA_SIZE:
+            return
+
+        value = round(calc_MA([self.points[i] for i in range(-MA_SIZE, 0)], MA_SIZE), 0)
+        if self.run_values and self.run_values[-1] == value:
+            return
+
+        self.run_starts.append(self.size - 1)
+        self.run_values.append(value)
+        self.extremums.update(value)
+
+        if self.size % self.capacity == 0:
+            self.prune()
+
+    def prune(self):
+        # the run containing the first point of the largest window is kept
+        count = bisect_right(self.run_starts, self.size - self.capacity) - 1
+        if count > 0:
+            del self.run_starts[:count]
+            del self.run_values[:count]
+            self.runs_pruned += count
+
+        first_run = self.runs_pruned
+        extremums = self.extremums
+        for indices, values in ((extremums.max_indices, extremums.max_values),
+                                (extremums.min_indices, extremums.min_values)):
+            i = bisect_left(indices, first_run)
+            del indices[:i]
+            del values[:i]
+
+    def query(self, size: int) -> tuple[list[Decimal], list[Decimal]]:
+        """
+        :return: maximums and minimums of the last `size` points
+        """
+        assert size <= min(self.size, self.capacity)
+
+        offset = len(self.points) - size
+        if size < MA_SIZE + 2:
+            return calc_MA_extremums([self.points[offset + i] for i in range(size)])
+
+        window_start = self.size - size
+        head_points = [self.points[offset + i] for i in range(MA_SIZE - 1)]
+        head = [round(calc_MA(head_points[:i], MA_SIZE), 0) for i in range(1, MA_SIZE)]
+
+        # runs intersecting the window after padded head
+        first_run = bisect_right(self.run_starts, window_start + MA_SIZE - 1) - 1
+        runs = self.run_values[first_run:]
+
+        # points near the window start have other neighbours than in the whole series,
+        # they are calculated directly, the rest of extremums are taken from the tracker
+        direct_runs = 3
+        prefix = deduplicate(head + runs[:direct_runs])
+        maximums = calc_local_maximums(prefix + runs[direct_runs:direct_runs + 1])[1]
+        minimums = calc_local_minimums(prefix + runs[direct_runs:direct_runs + 1])[1]
+
+        if len(runs) > direct_runs:
+            # index of the first tracked run relative to the extremum tracker
+            tracked_size = self.extremums.size - (self.runs_pruned + first_run)
+            maximums += self.extremums.maximums(tracked_size, start=direct_runs)[1]
+            minimums += self.extremums.minimums(tracked_size, start=direct_runs)[1]
+
+        return maximums, minimums
+
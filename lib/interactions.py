@@ -0,0 +1,69 @@
+from collections import deque
+from decimal import Decimal
+from typing import Iterable, Optional
+
+from lib.levels import Level, Location, Interaction, LevelEntry, LevelExit, calc_location, \
+    calc_transition_interactions
+
+
+class LevelInteractionTracker:
+    """
+    Streaming version of `calc_level_interactions` with `calc_touch_ups` and `calc_touch_downs`
+    on the trailing window of `window_size` points.
+
+    Interactions of the window are a suffix of interactions of the whole series,
+    so a touch stays in the window while its first interaction does. Touches are kept in deques
+    with index of the point which produced the first interaction, old ones are dropped from the left.
+    Update costs O(1) amortized.
+    """
+    def __init__(self, level: Level, window_size: int, points: Iterable[Decimal] = ()):
+        """
+        :param points: the last points of the series, tracker is seeded with them
+        """
+        self.level = level
+        self.window_size = window_size
+        # number of points consumed
+        self.size = 0
+        self.location: Optional[Location] = None
+
+        # (point index, interaction)
+        self.interactions: deque[tuple[int, Interaction]] = deque()
+        # point index of the first interaction of touch
+        self.touch_ups: deque[int] = deque()
+        self.touch_downs: deque[int] = deque()
+
+        for point in points:
+            self.update(point)
+
+    def update(self, point: Decimal):
+        index = self.size
+        self.size += 1
+        location = calc_location(point, self.level)
+
+        if self.location is not None:
+            for interaction in calc_transition_interactions(self.location, location):
+                if self.interactions:
+                    self.add_touch(self.interactions[-1], interaction)
+                self.interactions.append((index, interaction))
+        self.location = location
+
+        # interaction belongs to the window if both points of transition are in the window
+        first_index = self.size - self.window_size + 1
+        for d in (self.touch_ups, self.touch_downs):
+            while d and d[0] < first_index:
+                d.popleft()
+        while self.interactions and self.interactions[0][0] < first_index:
+            self.interactions.popleft()
+
+    def add_touch(self, prev: tuple[int, Interaction], interaction: Interaction):
+        prev_index, prev_interaction = prev
+        if prev_interaction == LevelEntry.UP_DOWN and interaction == LevelExit.DOWN_UP:
+            self.touch_ups.append(prev_index)
+        if prev_interaction == LevelEntry.DOWN_UP and interaction == LevelExit.UP_DOWN:
+            self.touch_downs.append(prev_index)
+
+    def calc_touch_ups(self) -> int:
+        return len(self.touch_ups)
+
+    def calc_touch_downs(self) -> int:
+        return len(self.touch_downs)
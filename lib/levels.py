@@ -42,12 +42,17 @@ def calc_local_minimums(window: List[Decimal], radius: int = 1) -> tuple[list[in
 Level = Tuple[Decimal, Decimal]
 
 
-def calc_levels_by_density(window: List[Decimal]) -> List[Level]:
-    eps = Decimal(1)  # depends on asset
-    value_max = max(window) + eps
+DENSITY_SECTORS_COUNT = 20
+DENSITY_LEVELS_COUNT = 5
+DENSITY_EPS = Decimal(1)  # depends on asset
+
+
+def calc_levels_by_density(
+        window: List[Decimal], sectors_count: int = DENSITY_SECTORS_COUNT, levels_count: int = DENSITY_LEVELS_COUNT
+) -> List[Level]:
+    value_max = max(window) + DENSITY_EPS
     value_min = min(window)
 
-    sectors_count = 20
     sector_len = (value_max - value_min) / sectors_count
     points_by_sector_count = defaultdict(lambda: 0)
 
@@ -56,7 +61,6 @@ def calc_levels_by_density(window: List[Decimal]) -> List[Level]:
         points_by_sector_count[sector_index] += 1
 
     points_by_sector_sorted = sorted(points_by_sector_count.items(), key=lambda t: t[1], reverse=True)
-    levels_count = 5
     top_sectors = points_by_sector_sorted[:levels_count]
 
     res = []
@@ -73,6 +77,10 @@ def calc_levels_by_density(window: List[Decimal]) -> List[Level]:
     return res
 
 
+def calc_levels_by_close_density(klines: List[Kline]) -> List[Level]:
+    return calc_levels_by_density([k.close for k in klines])
+
+
 def group_close_points(points: List[Decimal], eps: Decimal) -> List[List[int]]:
     points_indexed = enumerate(points)
 
@@ -118,10 +126,14 @@ def avg(x: List[Decimal]) -> Decimal:
     return round(sum(x) / len(x), 0)
 
 
-def calc_levels_by_MA_extremums(klines: List[Kline]) -> List[Level]:
-    ma_size = 3
-    window = [k.close for k in klines]
-    ma_list = calc_MA_list(window, ma_size)
+MA_SIZE = 3
+
+
+def calc_MA_extremums(window: List[Decimal]) -> tuple[list[Decimal], list[Decimal]]:
+    """
+    :return: local maximums and minimums of moving average of `window`
+    """
+    ma_list = calc_MA_list(window, MA_SIZE)
 
     # Too much precision makes no practical sense. Also numbers look less readable.
     # Required precision depends on asset.
@@ -132,10 +144,17 @@ def calc_levels_by_MA_extremums(klines: List[Kline]) -> List[Level]:
     # Treat repeating points as a single point.
     ma_list = deduplicate(ma_list)
 
-    indices_max, maximums = calc_local_maximums(ma_list)
-    indices_min, minimums = calc_local_minimums(ma_list)
-    extremums = maximums + minimums
+    _, maximums = calc_local_maximums(ma_list)
+    _, minimums = calc_local_minimums(ma_list)
+    return maximums, minimums
+
 
+def calc_levels_by_MA_extremums(klines: List[Kline]) -> List[Level]:
+    maximums, minimums = calc_MA_extremums([k.close for k in klines])
+    return calc_levels_by_extremums(maximums + minimums)
+
+
+def calc_levels_by_extremums(extremums: List[Decimal]) -> List[Level]:
     # eps should be mean_price * coef, where coef is configurable
     eps = Decimal('10')
 
@@ -196,27 +215,29 @@ def calc_level_interactions(window: List[Decimal], level: Level) -> List[Interac
 
     interactions = []
     for prev_location, next_location in zip(locations[:-1], locations[1:]):
-        if prev_location == next_location:
-            continue
+        interactions.extend(calc_transition_interactions(prev_location, next_location))
 
-        if prev_location == Location.DOWN and next_location == Location.INSIDE:
-            interactions.append(LevelEntry.DOWN_UP)
-        if prev_location == Location.UP and next_location == Location.INSIDE:
-            interactions.append(LevelEntry.UP_DOWN)
+    return interactions
 
-        if prev_location == Location.INSIDE and next_location == Location.DOWN:
-            interactions.append(LevelExit.UP_DOWN)
-        if prev_location == Location.INSIDE and next_location == Location.UP:
-            interactions.append(LevelExit.DOWN_UP)
 
-        if prev_location == Location.DOWN and next_location == Location.UP:
-            interactions.append(LevelEntry.DOWN_UP)
-            interactions.append(LevelExit.DOWN_UP)
-        if prev_location == Location.UP and next_location == Location.DOWN:
-            interactions.append(LevelEntry.UP_DOWN)
-            interactions.append(LevelExit.UP_DOWN)
+def calc_transition_interactions(prev_location: Location, next_location: Location) -> List[Interaction]:
+    if prev_location == next_location:
+        return []
 
-    return interactions
+    if prev_location == Location.DOWN and next_location == Location.INSIDE:
+        return [LevelEntry.DOWN_UP]
+    if prev_location == Location.UP and next_location == Location.INSIDE:
+        return [LevelEntry.UP_DOWN]
+
+    if prev_location == Location.INSIDE and next_location == Location.DOWN:
+        return [LevelExit.UP_DOWN]
+    if prev_location == Location.INSIDE and next_location == Location.UP:
+        return [LevelExit.DOWN_UP]
+
+    if prev_location == Location.DOWN and next_location == Location.UP:
+        return [LevelEntry.DOWN_UP, LevelExit.DOWN_UP]
+    if prev_location == Location.UP and next_location == Location.DOWN:
+        return [LevelEntry.UP_DOWN, LevelExit.UP_DOWN]
 
 
 def has_touch_up(interactions: List[Interaction]) -> bool:
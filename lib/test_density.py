@@ -0,0 +1,45 @@
+import random
+from decimal import Decimal
+
+from lib.density import WindowDensity, DensityTracker
+from lib.levels import calc_levels_by_density
+
+
+def get_random_walk(seed: int, size: int) -> list[Decimal]:
+    rng = random.Random(seed)
+    points = [Decimal('40000.5')]
+    for _ in range(size - 1):
+        points.append(points[-1] + Decimal(rng.choice([-30, -10, -5, 0, 0, 5, 10, 30])) / 2)
+    return points
+
+
+def test_same_as_calc_levels_by_density():
+    points = get_random_walk(1, 300)
+
+    tracker = DensityTracker([5, 20, 50])
+    for i, point in enumerate(points):
+        tracker.update(point)
+        for size in tracker.sizes:
+            # order of levels is the same too
+            assert tracker.levels(size) == calc_levels_by_density(points[max(i + 1 - size, 0):i + 1])
+
+
+def test_equal_counts_keep_window_order():
+    # all sectors have a single point, the first 5 points of the window win
+    points = [Decimal(x) for x in [100, 0, 90, 10, 80, 20, 70, 30]]
+    window = WindowDensity(size=7)
+    for point in points:
+        window.update(point)
+
+    assert window.levels() == calc_levels_by_density(points[1:])
+    assert window.levels()[0] == (Decimal(0), Decimal(5))
+
+
+def test_fixed_sectors():
+    window = WindowDensity(size=4, sector_len=Decimal(10), levels_count=2)
+    for point in [Decimal(x) for x in [1, 5, 12, 25, 27, 28]]:
+        window.update(point)
+
+    # 5 and 1 are expired
+    assert window.levels() == [(Decimal(20), Decimal(30)), (Decimal(10), Decimal(20))]
+    assert set(window.counts) == {Decimal(1), Decimal(2)}
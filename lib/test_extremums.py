@@ -0,0 +1,55 @@
+import random
+from decimal import Decimal
+
+from lib.extremums import ExtremumTracker, MAExtremumTracker
+from lib.levels import calc_local_maximums, calc_local_minimums, calc_MA_extremums
+
+
+def random_walk(count: int, seed: int) -> list[Decimal]:
+    rng = random.Random(seed)
+    res = [Decimal(1000)]
+    for _ in range(count - 1):
+        # small steps give plateaus and repeating moving average values
+        res.append(res[-1] + rng.choice([-2, -1, 0, 0, 1, 2]))
+    return res
+
+
+class TestExtremumTracker:
+    def test_basic(self):
+        tracker = ExtremumTracker()
+        for x in [1, 3, 2, 4, 5, 3]:
+            tracker.update(Decimal(x))
+
+        assert tracker.maximums(6) == ([1, 4], [3, 5])
+        assert tracker.minimums(6) == ([2], [2])
+        # the first point of a window is not an extremum
+        assert tracker.maximums(5) == ([3], [5])
+        assert tracker.maximums(2) == ([], [])
+
+    def test_same_as_calc_local_extremums(self):
+        capacity = 30
+        for radius in (1, 2):
+            points = random_walk(200, seed=radius)
+            tracker = ExtremumTracker(radius=radius, capacity=capacity)
+
+            for i, point in enumerate(points):
+                tracker.update(point)
+
+                for size in range(1, min(i + 1, capacity) + 1):
+                    window = points[i + 1 - size:i + 1]
+                    assert tracker.maximums(size) == calc_local_maximums(window, radius=radius)
+                    assert tracker.minimums(size) == calc_local_minimums(window, radius=radius)
+
+
+class TestMAExtremumTracker:
+    def test_same_as_calc_MA_extremums(self):
+        capacity = 30
+        for seed in range(2):
+            points = random_walk(150, seed=seed)
+            tracker = MAExtremumTracker(capacity=capacity)
+
+            for i, point in enumerate(points):
+                tracker.update(point)
+
+                for size in range(1, min(i + 1, capacity) + 1):
+                    assert tracker.query(size) == calc_MA_extremums(points[i + 1 - size:i + 1])
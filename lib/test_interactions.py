@@ -0,0 +1,37 @@
+import random
+from decimal import Decimal
+
+from lib.interactions import LevelInteractionTracker
+from lib.levels import calc_level_interactions, calc_touch_ups, calc_touch_downs
+
+
+def test_touch_up():
+    level = (Decimal(10), Decimal(12))
+    tracker = LevelInteractionTracker(level, window_size=4, points=[Decimal(x) for x in [15, 11, 11]])
+    assert tracker.calc_touch_ups() == 0
+
+    tracker.update(Decimal(14))
+    assert tracker.calc_touch_ups() == 1
+    assert tracker.calc_touch_downs() == 0
+
+    # entry to the level leaves the window
+    tracker.update(Decimal(14))
+    assert tracker.calc_touch_ups() == 0
+
+
+def test_same_as_calc_level_interactions():
+    rng = random.Random(1)
+    level = (Decimal(98), Decimal(102))
+    points = [Decimal(100)]
+    for _ in range(500):
+        points.append(points[-1] + rng.choice([-3, -2, -1, 0, 1, 2, 3]))
+
+    for window_size in (2, 5, 30):
+        tracker = LevelInteractionTracker(level, window_size)
+        for i, point in enumerate(points):
+            tracker.update(point)
+
+            interactions = calc_level_interactions(points[max(i + 1 - window_size, 0):i + 1], level)
+            assert [interaction for _, interaction in tracker.interactions] == interactions
+            assert tracker.calc_touch_ups() == calc_touch_ups(interactions)
+            assert tracker.calc_touch_downs() == calc_touch_downs(interactions)
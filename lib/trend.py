@@ -16,6 +16,10 @@ def calc_trend(window: List[Decimal]) -> Trend:
     `calc_trend` is supposed to run on relatively large window, where some waves are present.
     """
     _, maximums = calc_local_maximums(window)
+    return calc_trend_by_maximums(maximums)
+
+
+def calc_trend_by_maximums(maximums: List[Decimal]) -> Trend:
     if len(maximums) < 2:
         raise Exception('Lack of extremums. Probably window is too small.')
 
@@ -1,9 +1,10 @@
 import logging
 from datetime import datetime
 from decimal import Decimal
-from typing import List
+from typing import List, Optional
 
 from broker import BrokerEvent, BrokerEventType
+from equity import EquityCurve
 from order import OrderId, Order, get_trade_close_type, Trade
 from orderlist import OrderList
 from utils import format_datetime
@@ -16,13 +17,18 @@ class LocalBroker:
     LocalBroker:
     * handles remote broker events: closes orders
     * implements order auto close after given period of time
+    * reports opened and closed orders to equity curve, if given
     * does NOT make trading decisions
     """
-    def __init__(self, order_list: OrderList):
+    def __init__(self, order_list: OrderList, equity_curve: Optional[EquityCurve] = None):
         self.order_list = order_list
+        self.equity_curve = equity_curve
 
     def add_order(self, order_id: OrderId, order: Order):
-        self.order_list.add_order(order_id, order)\
+        self.order_list.add_order(order_id, order)
+
+        if self.equity_curve:
+            self.equity_curve.on_order_opened(order)
 
         self.log_order_opened(order_id)
 
@@ -36,6 +42,10 @@ class LocalBroker:
             amount=order.trade_open.amount,
             created_at=closed_at
         )
+
+        if self.equity_curve:
+            self.equity_curve.on_order_closed(order)
+
         self.log_order_closed(order_id)
 
     def close_order_by_take_profit(self, order_id: OrderId, closed_at: datetime):
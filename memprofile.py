@@ -0,0 +1,185 @@
+import logging
+import os
+import sys
+import tracemalloc
+from dataclasses import dataclass, field
+from typing import Iterator, Iterable, Optional
+
+from kline import Kline
+
+logger = logging.getLogger(__name__)
+
+SOURCE_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# allocations are attributed to the stage of the innermost module of this repo in their traceback,
+# the stage of a module is found by the innermost part of its dotted name listed here,
+# so `strategy.ordermanager` and order managers of strategies are orders, the rest of `strategy` is signals
+STAGES = {
+    'load klines': ('broker', 'klinestore', 'resample', 'catalog', 'sharedklines'),
+    'windows': ('kline',),
+    'signals': ('strategy', 'lib', 'emergency', 'fanout'),
+    'orders': ('backtest', 'orderlist', 'order', 'ordermanager', 'localbroker', 'equity', 'portfolio'),
+}
+OTHER_STAGE = 'other'
+
+MB = 2 ** 20
+
+
+def get_module(filename: str) -> Optional[str]:
+    """
+    :return: dotted module name of repo file, None for files out of repo
+    """
+    path = os.path.abspath(filename)
+    if not path.startswith(SOURCE_ROOT + os.sep) or f'{os.sep}site-packages{os.sep}' in path:
+        return None
+    return os.path.splitext(os.path.relpath(path, SOURCE_ROOT))[0].replace(os.sep, '.')
+
+
+def get_stage(module: Optional[str]) -> str:
+    if module is None:
+        return OTHER_STAGE
+
+    for name in reversed(module.split('.')):
+        for stage, names in STAGES.items():
+            if name in names:
+                return stage
+    return OTHER_STAGE
+
+
+def get_rss() -> Optional[int]:
+    """
+    :return: current resident set size in bytes, None if it is not available
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return None
+
+
+def get_peak_rss() -> Optional[int]:
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on linux, bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def get_stage_sizes(snapshot: tracemalloc.Snapshot) -> dict[str, int]:
+    res = dict.fromkeys([*STAGES, OTHER_STAGE], 0)
+    modules = {}
+
+    for stat in snapshot.statistics('traceback'):
+        stage = OTHER_STAGE
+        # frames of traceback go from the most recent one
+        for frame in stat.traceback:
+            if frame.filename not in modules:
+                modules[frame.filename] = get_module(frame.filename)
+            if modules[frame.filename] is not None:
+                stage = get_stage(modules[frame.filename])
+                break
+        res[stage] += stat.size
+
+    return res
+
+
+@dataclass
+class MemorySample:
+    kline_count: int
+    traced: int
+    rss: Optional[int]
+    stages: dict[str, int]
+
+
+@dataclass
+class MemoryReport:
+    samples: list[MemorySample] = field(default_factory=list)
+    traced_peak: int = 0
+    rss_peak: Optional[int] = None
+    # size difference and allocation count difference by source line, largest growth goes first
+    top_growth: list[tuple[str, int, int]] = field(default_factory=list)
+
+    def log(self):
+        logger.info('memory by kline count, traced MB and by stage, RSS MB:')
+        for sample in self.samples:
+            stages = ', '.join(f'{stage} {size / MB:.1f}' for stage, size in sample.stages.items())
+            rss = f'{sample.rss / MB:.1f}' if sample.rss is not None else '-'
+            logger.info(f'{sample.kline_count:>8} klines: traced {sample.traced / MB:.1f} ({stages}), RSS {rss}')
+
+        rss_peak = f'{self.rss_peak / MB:.1f}' if self.rss_peak is not None else '-'
+        logger.info(f'peak traced memory: {self.traced_peak / MB:.1f} MB, peak RSS: {rss_peak} MB')
+
+        logger.info('top growth sites:')
+        for site, size_diff, count_diff in self.top_growth:
+            logger.info(f'{size_diff / MB:+.2f} MB, {count_diff:+} blocks: {site}')
+
+
+class MemoryProfiler:
+    """
+    Traces allocations with tracemalloc while klines of a backtest are iterated,
+    and takes a snapshot every `interval` klines.
+
+    Tracing makes allocation heavy code about 5 times slower with one frame per traceback, and much slower
+    with deeper tracebacks. With one frame allocations made by libraries are attributed to other stage,
+    more frames attribute them to the repo module which called the library.
+    """
+    def __init__(self, interval: int = 1000, top: int = 10, frames: int = 1):
+        assert interval > 0, 'Interval must be positive'
+        self.interval = interval
+        self.top = top
+        self.frames = frames
+        self.baseline: Optional[tracemalloc.Snapshot] = None
+        self.snapshot: Optional[tracemalloc.Snapshot] = None
+        self.report = MemoryReport()
+        self.kline_count = 0
+
+    def start(self):
+        tracemalloc.start(self.frames)
+        self.baseline = self.take_snapshot()
+
+    def take_snapshot(self) -> tracemalloc.Snapshot:
+        # allocations of tracemalloc itself are not interesting
+        return tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+        ])
+
+    def sample(self):
+        self.snapshot = self.take_snapshot()
+        self.report.samples.append(MemorySample(
+            kline_count=self.kline_count,
+            traced=tracemalloc.get_traced_memory()[0],
+            rss=get_rss(),
+            stages=get_stage_sizes(self.snapshot)
+        ))
+
+    def track(self, klines: Iterable[Kline]) -> Iterator[Kline]:
+        """
+        Yields klines, samples memory between them.
+        """
+        if not tracemalloc.is_tracing():
+            self.start()
+
+        for kline in klines:
+            yield kline
+            self.kline_count += 1
+            if self.kline_count % self.interval == 0:
+                self.sample()
+
+    def stop(self) -> MemoryReport:
+        self.sample()
+        self.report.traced_peak = tracemalloc.get_traced_memory()[1]
+        # peak by rusage and current size by statm are counted a bit differently
+        rss_values = [value for value in [get_peak_rss(), *(sample.rss for sample in self.report.samples)] if value]
+        self.report.rss_peak = max(rss_values, default=None)
+
+        stats = self.snapshot.compare_to(self.baseline, 'lineno')
+        self.report.top_growth = [
+            (str(stat.traceback[0]), stat.size_diff, stat.count_diff) for stat in stats[:self.top]
+        ]
+
+        tracemalloc.stop()
+        return self.report
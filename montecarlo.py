@@ -0,0 +1,124 @@
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Iterable, Optional
+
+import numpy as np
+
+from equity import calc_drawdowns
+from order import Order
+
+logger = logging.getLogger(__name__)
+
+METHODS = ('bootstrap', 'permutation')
+PERCENTILES = (5, 25, 50, 75, 95)
+
+
+def get_trade_arrays(orders: Iterable[Order]) -> tuple[np.ndarray, np.ndarray]:
+    """
+    :return: profits and turnovers (open plus close value) of closed orders
+    """
+    orders = [order for order in orders if order.trade_close]
+    profits = np.array([float(order.get_profit()) for order in orders], dtype=np.float64)
+    turnovers = np.array(
+        [float(order.trade_open.value() + order.trade_close.value()) for order in orders], dtype=np.float64
+    )
+    return profits, turnovers
+
+
+def get_trade_arrays_from_rows(rows: Iterable[dict]) -> tuple[np.ndarray, np.ndarray]:
+    """
+    The same as `get_trade_arrays` for trades from results store.
+    """
+    rows = [row for row in rows if row['profit'] is not None]
+    profits = np.array([float(row['profit']) for row in rows], dtype=np.float64)
+    turnovers = np.array([
+        float(Decimal(row['amount']) * (Decimal(row['price_open']) + Decimal(row['price_close'])))
+        for row in rows
+    ], dtype=np.float64)
+    return profits, turnovers
+
+
+@dataclass
+class Chunk:
+    profits: np.ndarray
+    turnovers: np.ndarray
+    paths: int
+    method: str
+    slippage: float
+    seed: np.random.SeedSequence
+
+
+def simulate_chunk(chunk: Chunk) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Every path is a sequence of trades resampled from source trades.
+    Bootstrap draws trades with replacement, permutation shuffles source trades.
+    Slippage takes random share from 0 to `slippage` of trade turnover.
+
+    :return: final profits and max drawdowns of paths
+    """
+    rng = np.random.default_rng(chunk.seed)
+    count = len(chunk.profits)
+
+    if chunk.method == 'bootstrap':
+        indexes = rng.integers(0, count, size=(chunk.paths, count))
+    elif chunk.method == 'permutation':
+        indexes = rng.permuted(np.broadcast_to(np.arange(count), (chunk.paths, count)), axis=1)
+    else:
+        raise ValueError(f'Unknown method {chunk.method}')
+
+    profits = chunk.profits[indexes]
+    if chunk.slippage:
+        profits -= chunk.turnovers[indexes] * rng.uniform(0.0, chunk.slippage, size=profits.shape)
+
+    equity = np.cumsum(profits, axis=1)
+    return equity[:, -1], calc_drawdowns(equity).max(axis=1)
+
+
+def simulate_paths(
+        profits: np.ndarray,
+        turnovers: np.ndarray,
+        paths: int,
+        method: str = 'bootstrap',
+        slippage: float = 0.0,
+        seed: Optional[int] = None,
+        chunk_size: int = 10000,
+        workers: Optional[int] = None
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Splits paths into chunks, every chunk gets its own random seed spawned from `seed`,
+    so results do not depend on number of workers.
+
+    :param slippage: max slippage as a share of trade turnover
+    :param workers: number of worker processes, 1 runs chunks in current process
+    :return: final profits and max drawdowns of paths
+    """
+    if paths < 1:
+        raise ValueError(f'Number of paths must be positive, got {paths}')
+    if chunk_size < 1:
+        raise ValueError(f'Chunk size must be positive, got {chunk_size}')
+
+    if not len(profits):
+        return np.zeros(paths), np.zeros(paths)
+
+    sizes = [chunk_size] * (paths // chunk_size) + ([paths % chunk_size] if paths % chunk_size else [])
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    chunks = [Chunk(profits, turnovers, size, method, slippage, chunk_seed) for size, chunk_seed in zip(sizes, seeds)]
+
+    logger.info('%s paths of %s trades in %s chunks', paths, len(profits), len(chunks))
+
+    if workers == 1 or len(chunks) == 1:
+        results = list(map(simulate_chunk, chunks))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(simulate_chunk, chunks))
+
+    return np.concatenate([r[0] for r in results]), np.concatenate([r[1] for r in results])
+
+
+def summarize(values: np.ndarray, percentiles: tuple = PERCENTILES) -> dict[str, float]:
+    res = {'mean': float(values.mean())}
+    for percentile, value in zip(percentiles, np.percentile(values, percentiles)):
+        res[f'p{percentile}'] = float(value)
+    return res
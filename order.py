@@ -55,6 +55,7 @@ class Order:
     price_take_profit: Decimal
     price_stop_loss: Decimal
     auto_close_in: Optional[timedelta]
+    symbol: Optional[str] = None
 
     def get_profit(self, trade_close: Optional[Trade] = None):
         trade_close = trade_close or self.trade_close
@@ -0,0 +1,95 @@
+import heapq
+import logging
+from dataclasses import replace
+from typing import Iterator, Optional
+
+from broker import Broker, BrokerEvent, BrokerSimulator
+from kline import Kline
+from order import Order, OrderId
+from strategy.ordermanager import OrderManager
+
+logger = logging.getLogger(__name__)
+
+
+def tag_klines(klines: Iterator[Kline], symbol: str) -> Iterator[Kline]:
+    for kline in klines:
+        kline.symbol = symbol
+        yield kline
+
+
+def merge_klines_iters(klines_by_symbol: dict[str, Iterator[Kline]]) -> Iterator[Kline]:
+    """
+    Merges per-symbol kline streams into one stream ordered by open time.
+
+    Streams are consumed lazily with a heap-based k-way merge,
+    so only the current file of every symbol is kept in memory.
+    Klines with equal open time come in the order of `klines_by_symbol`.
+    """
+    streams = [tag_klines(klines, symbol) for symbol, klines in klines_by_symbol.items()]
+    return heapq.merge(*streams, key=lambda k: k.open_time)
+
+
+class PortfolioBrokerSimulator(Broker):
+    """
+    PortfolioBrokerSimulator:
+    * routes orders and klines to per-symbol `BrokerSimulator`
+    * gives orders portfolio-wide ids `<symbol>:<id>`
+    """
+    def __init__(self, brokers: dict[str, BrokerSimulator]):
+        self.brokers = brokers
+        self.order_ids: dict[OrderId, tuple[str, OrderId]] = {}
+
+    def klines(self) -> Iterator[Kline]:
+        return merge_klines_iters({symbol: broker.klines() for symbol, broker in self.brokers.items()})
+
+    def add_order(self, order: Order) -> BrokerEvent:
+        event = self.brokers[order.symbol].add_order(order)
+        order_id = f'{order.symbol}:{event.order_id}'
+        self.order_ids[order_id] = (order.symbol, event.order_id)
+
+        return replace(event, order_id=order_id)
+
+    def events(self, kline) -> list[BrokerEvent]:
+        symbol = kline.symbol
+        return [
+            replace(event, order_id=f'{symbol}:{event.order_id}')
+            for event in self.brokers[symbol].events(kline)
+        ]
+
+    def close_order(self, order_id: OrderId, kline: Kline) -> BrokerEvent:
+        symbol, broker_order_id = self.order_ids[order_id]
+        event = self.brokers[symbol].close_order(broker_order_id, kline)
+
+        return replace(event, order_id=order_id)
+
+
+class PortfolioOrderManager(OrderManager):
+    """
+    Applies portfolio-level limits on top of strategy order manager.
+    Both managers share one order list.
+    """
+    def __init__(
+        self,
+        order_manager: OrderManager,
+        max_orders_open: Optional[int] = None,
+        max_orders_open_per_symbol: Optional[int] = None
+    ):
+        super().__init__(order_manager.order_list)
+
+        self.order_manager = order_manager
+        self.max_orders_open = max_orders_open
+        self.max_orders_open_per_symbol = max_orders_open_per_symbol
+
+    def is_order_acceptable(self, order: Order) -> bool:
+        orders_open = self.order_list.orders_open
+
+        if self.max_orders_open is not None and len(orders_open) >= self.max_orders_open:
+            return False
+
+        if self.max_orders_open_per_symbol is not None:
+            symbol_orders_open = [o for o in orders_open.values() if o.symbol == order.symbol]
+            if len(symbol_orders_open) >= self.max_orders_open_per_symbol:
+                return False
+
+        return self.order_manager.is_order_acceptable(order)
+
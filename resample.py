@@ -0,0 +1,137 @@
+import csv
+import os
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Iterator, Optional, Iterable, Sequence
+
+import pytz
+
+from kline import Kline
+
+EPOCH = datetime(1970, 1, 1, tzinfo=pytz.UTC)
+
+
+def get_bucket_open_time(open_time: datetime, timeframe: timedelta) -> datetime:
+    # buckets are aligned to unix epoch, like exchange klines are
+    return open_time - (open_time - EPOCH) % timeframe
+
+
+def format_timeframe(timeframe: timedelta) -> str:
+    minutes = int(timeframe.total_seconds()) // 60
+    if minutes % 60 == 0:
+        return f'{minutes // 60}h'
+    return f'{minutes}m'
+
+
+class KlineResampler:
+    """
+    Builds higher timeframe klines from base klines incrementally.
+    Each base kline costs O(1).
+    """
+    def __init__(self, timeframe: timedelta):
+        self.timeframe = timeframe
+        self.current: Optional[Kline] = None
+
+    def update(self, kline: Kline) -> list[Kline]:
+        """
+        :return: higher timeframe klines completed by `kline`
+        """
+        res = []
+
+        # gap in base klines, bucket will never be completed
+        if self.current and kline.open_time >= self.current.close_time:
+            res.append(self.current)
+            self.current = None
+
+        if not self.current:
+            open_time = get_bucket_open_time(kline.open_time, self.timeframe)
+            self.current = Kline(
+                open_time=open_time,
+                close_time=open_time + self.timeframe,
+                open=kline.open,
+                high=kline.high,
+                low=kline.low,
+                close=kline.close,
+                volume=kline.volume,
+                symbol=kline.symbol
+            )
+        else:
+            current = self.current
+            current.high = max(current.high, kline.high)
+            current.low = min(current.low, kline.low)
+            current.close = kline.close
+            current.volume += kline.volume
+
+        if kline.close_time >= self.current.close_time:
+            res.append(self.current)
+            self.current = None
+
+        return res
+
+    def flush(self) -> list[Kline]:
+        res = [self.current] if self.current else []
+        self.current = None
+        return res
+
+
+def resample_klines_iter(klines: Iterable[Kline], timeframe: timedelta) -> Iterator[Kline]:
+    resampler = KlineResampler(timeframe)
+    for kline in klines:
+        yield from resampler.update(kline)
+    yield from resampler.flush()
+
+
+class TimeframeWindows:
+    """
+    Keeps moving windows of completed higher timeframe klines in sync with base kline stream.
+
+    Only completed klines get into windows, so there is no look-ahead:
+    kline of 1h timeframe appears right after its last base kline is fed.
+    """
+    def __init__(self, timeframes: dict[timedelta, int]):
+        """
+        :param timeframes: window size by timeframe
+        """
+        self.resamplers = {timeframe: KlineResampler(timeframe) for timeframe in timeframes}
+        self._windows = {timeframe: deque(maxlen=size) for timeframe, size in timeframes.items()}
+        self.last_open_time: Optional[datetime] = None
+
+    def update(self, kline: Kline):
+        for timeframe, resampler in self.resamplers.items():
+            self._windows[timeframe].extend(resampler.update(kline))
+        self.last_open_time = kline.open_time
+
+    def update_until(self, klines: list[Kline]):
+        """
+        Feeds klines which were not fed yet. Usually it's just the last kline of moving window.
+        """
+        start = len(klines)
+        while start > 0 and (self.last_open_time is None or klines[start - 1].open_time > self.last_open_time):
+            start -= 1
+
+        for kline in klines[start:]:
+            self.update(kline)
+
+    def windows(self) -> dict[timedelta, Sequence[Kline]]:
+        """
+        Windows are returned as they are, without copying, and change on next update.
+        Callers must not modify them and should copy a window to keep it.
+        """
+        return dict(self._windows)
+
+
+def write_klines_to_csv(path: str, klines: Iterable[Kline]):
+    """
+    Writes klines in Binance market data format, only columns read by `read_klines_from_csv` are written.
+    """
+    path_tmp = path + '.tmp'
+
+    with open(path_tmp, 'w', newline='') as f:
+        writer = csv.writer(f)
+        for k in klines:
+            open_time = (k.open_time - EPOCH) // timedelta(milliseconds=1)
+            writer.writerow([open_time, k.open, k.high, k.low, k.close, k.volume])
+
+    # other processes never see partially written file
+    os.replace(path_tmp, path)
+
@@ -0,0 +1,218 @@
+import hashlib
+import json
+import sqlite3
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import Optional, Any
+
+from order import OrderId, Order
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    created_at TEXT NOT NULL,
+    strategy TEXT NOT NULL,
+    config_hash TEXT NOT NULL,
+    config TEXT NOT NULL,
+    symbol TEXT NOT NULL,
+    date_from TEXT NOT NULL,
+    date_to TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_strategy ON runs (strategy, date_from, date_to);
+CREATE INDEX IF NOT EXISTS runs_config_hash ON runs (config_hash);
+CREATE INDEX IF NOT EXISTS runs_date ON runs (date_from, date_to);
+
+CREATE TABLE IF NOT EXISTS run_params (
+    run_id INTEGER NOT NULL REFERENCES runs (id),
+    name TEXT NOT NULL,
+    value TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS run_params_name_value ON run_params (name, value, run_id);
+
+CREATE TABLE IF NOT EXISTS run_metrics (
+    run_id INTEGER NOT NULL REFERENCES runs (id),
+    name TEXT NOT NULL,
+    value REAL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS run_metrics_run_id_name ON run_metrics (run_id, name);
+CREATE INDEX IF NOT EXISTS run_metrics_name_value ON run_metrics (name, value);
+
+CREATE TABLE IF NOT EXISTS trades (
+    run_id INTEGER NOT NULL REFERENCES runs (id),
+    order_id TEXT NOT NULL,
+    order_type TEXT NOT NULL,
+    symbol TEXT,
+    opened_at TEXT NOT NULL,
+    price_open TEXT NOT NULL,
+    closed_at TEXT,
+    price_close TEXT,
+    amount TEXT NOT NULL,
+    profit TEXT
+);
+CREATE INDEX IF NOT EXISTS trades_run_id ON trades (run_id);
+"""
+
+
+@dataclass
+class RunRecord:
+    strategy: str
+    symbol: str
+    date_from: date
+    date_to: date
+    # strategy, broker and backtest configs, everything that affects run result
+    config: dict
+    metrics: dict[str, float]
+    orders: list[tuple[OrderId, Order]] = field(default_factory=list)
+
+    @property
+    def config_hash(self) -> str:
+        return hash_config(self.config)
+
+
+def hash_config(config: dict) -> str:
+    data = json.dumps(config, sort_keys=True, default=str)
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+def flatten_config(config: dict, prefix: str = '') -> dict[str, str]:
+    """
+    flatten_config({'emitter': {'medium_window_size': 100}}) == {'emitter.medium_window_size': '100'}
+    """
+    res = {}
+    for key, value in config.items():
+        name = f'{prefix}{key}'
+        if isinstance(value, dict):
+            res.update(flatten_config(value, prefix=f'{name}.'))
+        else:
+            res[name] = str(value)
+    return res
+
+
+class ResultsStore:
+    """
+    Stores backtest runs in SQLite database.
+
+    Params and metrics are stored as rows, not columns,
+    so strategies with different configs share one table and any param or metric is indexed.
+    """
+    def __init__(self, path: str):
+        self.connection = sqlite3.connect(path)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def save_run(self, run: RunRecord) -> int:
+        with self.connection:
+            cursor = self.connection.execute(
+                'INSERT INTO runs (created_at, strategy, config_hash, config, symbol, date_from, date_to) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (
+                    datetime.utcnow().isoformat(),
+                    run.strategy,
+                    run.config_hash,
+                    json.dumps(run.config, sort_keys=True, default=str),
+                    run.symbol,
+                    run.date_from.isoformat(),
+                    run.date_to.isoformat(),
+                )
+            )
+            run_id = cursor.lastrowid
+
+            self.connection.executemany(
+                'INSERT INTO run_params (run_id, name, value) VALUES (?, ?, ?)',
+                [(run_id, name, value) for name, value in flatten_config(run.config).items()]
+            )
+            self.connection.executemany(
+                'INSERT INTO run_metrics (run_id, name, value) VALUES (?, ?, ?)',
+                [(run_id, name, value) for name, value in run.metrics.items()]
+            )
+            self.connection.executemany(
+                'INSERT INTO trades (run_id, order_id, order_type, symbol, opened_at, price_open, '
+                'closed_at, price_close, amount, profit) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                [(run_id, *trade_to_row(order_id, order)) for order_id, order in run.orders]
+            )
+
+        return run_id
+
+    def query_runs(
+            self,
+            strategy: Optional[str] = None,
+            params: Optional[dict[str, str]] = None,
+            date_from: Optional[date] = None,
+            date_to: Optional[date] = None,
+            order_by: str = 'profit',
+            limit: int = 20
+    ) -> list[dict[str, Any]]:
+        """
+        Finds runs which match all given conditions, best runs by `order_by` metric go first.
+
+        :param date_from: runs started at `date_from` or later
+        :param date_to: runs finished at `date_to` or earlier
+        """
+        conditions = []
+        args = []
+
+        if strategy:
+            conditions.append('runs.strategy = ?')
+            args.append(strategy)
+        if date_from:
+            conditions.append('runs.date_from >= ?')
+            args.append(date_from.isoformat())
+        if date_to:
+            conditions.append('runs.date_to <= ?')
+            args.append(date_to.isoformat())
+        for name, value in (params or {}).items():
+            conditions.append('runs.id IN (SELECT run_id FROM run_params WHERE name = ? AND value = ?)')
+            args.extend((name, value))
+
+        where = f'WHERE {" AND ".join(conditions)}' if conditions else ''
+        rows = self.connection.execute(
+            'SELECT runs.*, run_metrics.value AS order_value FROM runs '
+            'LEFT JOIN run_metrics ON run_metrics.run_id = runs.id AND run_metrics.name = ? '
+            f'{where} ORDER BY order_value DESC, runs.id DESC LIMIT ?',
+            (order_by, *args, limit)
+        ).fetchall()
+
+        runs = [dict(row) for row in rows]
+        metrics = self.get_metrics([run['id'] for run in runs])
+
+        for run in runs:
+            del run['order_value']
+            run['config'] = json.loads(run['config'])
+            run['metrics'] = metrics.get(run['id'], {})
+
+        return runs
+
+    def get_metrics(self, run_ids: list[int]) -> dict[int, dict[str, float]]:
+        res = {}
+        placeholders = ', '.join('?' * len(run_ids))
+        rows = self.connection.execute(
+            f'SELECT run_id, name, value FROM run_metrics WHERE run_id IN ({placeholders})',
+            run_ids
+        )
+        for row in rows:
+            res.setdefault(row['run_id'], {})[row['name']] = row['value']
+        return res
+
+    def get_trades(self, run_id: int) -> list[dict[str, Any]]:
+        rows = self.connection.execute('SELECT * FROM trades WHERE run_id = ? ORDER BY opened_at', (run_id,))
+        return [dict(row) for row in rows]
+
+
+def trade_to_row(order_id: OrderId, order: Order) -> tuple:
+    trade_close = order.trade_close
+
+    return (
+        str(order_id),
+        str(order.order_type),
+        order.symbol,
+        order.trade_open.created_at.isoformat(),
+        str(order.trade_open.price),
+        trade_close.created_at.isoformat() if trade_close else None,
+        str(trade_close.price) if trade_close else None,
+        str(order.trade_open.amount),
+        str(order.get_profit()) if trade_close else None,
+    )
+
@@ -0,0 +1,129 @@
+import hashlib
+import logging
+import os
+import pickle
+from typing import Optional, Iterable
+
+from backtest import BacktestResult
+from results import hash_config
+
+logger = logging.getLogger(__name__)
+
+SOURCE_ROOT = os.path.dirname(os.path.abspath(__file__))
+SOURCE_SKIP_DIRS = ('__pycache__', 'cache', 'market_data', 'test_data', 'venv')
+
+
+def hash_file(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def hash_files(paths: Iterable[str]) -> dict[str, Optional[str]]:
+    """
+    :return: content hash by path, None for missing files, as missing days are skipped by broker
+    """
+    return {path: hash_file(path) if os.path.exists(path) else None for path in paths}
+
+
+def get_source_version(root: str = SOURCE_ROOT) -> str:
+    """
+    Hash of python sources, except tests. Any code change invalidates cached runs.
+    """
+    h = hashlib.sha256()
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if d not in SOURCE_SKIP_DIRS and not d.startswith('.'))
+        for name in sorted(filenames):
+            if name.endswith('.py') and not name.startswith('test_'):
+                path = os.path.join(dirpath, name)
+                h.update(os.path.relpath(path, root).encode())
+                h.update(hash_file(path).encode())
+    return h.hexdigest()
+
+
+def get_run_key(
+        strategy: str,
+        configs: dict,
+        input_files: dict[str, Optional[str]],
+        broker_config: dict,
+        window_size: int,
+        source_version: str
+) -> str:
+    """
+    :param input_files: content hash by path of kline files read by the run, see `hash_files`
+    """
+    return hash_config({
+        'strategy': strategy,
+        'configs': configs,
+        'input_files': input_files,
+        'broker': broker_config,
+        'window_size': window_size,
+        'source_version': source_version,
+    })
+
+
+class RunCache:
+    """
+    Stores results of complete backtest runs on disk, one pickle file per run key.
+    When total size exceeds `max_size`, least recently used runs are evicted.
+    """
+    def __init__(self, cache_dir: str, max_size: int = 500 * 2 ** 20):
+        """
+        :param max_size: max total size of cached runs in bytes
+        """
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f'{key}.pickle')
+
+    def get(self, key: str) -> Optional[BacktestResult]:
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as f:
+                result = pickle.load(f)
+        except FileNotFoundError:
+            return None
+
+        # modification time is the last use of the run
+        os.utime(path)
+        return result
+
+    def set(self, key: str, result: BacktestResult):
+        path = self.path(key)
+        # several processes may run the same backtest, the file is replaced atomically
+        path_tmp = f'{path}.{os.getpid()}.tmp'
+        with open(path_tmp, 'wb') as f:
+            pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(path_tmp, path)
+
+        self.evict()
+
+    def evict(self) -> list[str]:
+        """
+        :return: keys of evicted runs
+        """
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith('.pickle'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.name))
+
+        size = sum(size for _, size, _ in entries)
+        res = []
+        for _, entry_size, name in sorted(entries):
+            if size <= self.max_size:
+                break
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except FileNotFoundError:
+                pass
+            size -= entry_size
+            res.append(name[:-len('.pickle')])
+
+        if res:
+            logger.info('%s runs evicted from cache', len(res))
+        return res
@@ -0,0 +1,180 @@
+import logging
+import math
+import random
+from dataclasses import dataclass
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import Any, Optional
+
+from walkforward import Evaluation, EvaluationCache, EvaluationPool, evaluate_all, apply_params, get_metric
+
+logger = logging.getLogger(__name__)
+
+
+def is_range(node: Any) -> bool:
+    return isinstance(node, dict) and set(node) == {'min', 'max'}
+
+
+def sample_value(node: Any, rng: random.Random) -> Any:
+    """
+    :param node: list of choices, {min, max} range or constant.
+        Range of ints gives int, range of strings gives decimal string rounded to the most precise bound.
+    """
+    if isinstance(node, list):
+        return rng.choice(node)
+
+    if not is_range(node):
+        return node
+
+    low, high = node['min'], node['max']
+    if isinstance(low, int) and isinstance(high, int):
+        return rng.randint(low, high)
+
+    low, high = Decimal(str(low)), Decimal(str(high))
+    exponent = min(low.as_tuple().exponent, high.as_tuple().exponent)
+    value = Decimal(rng.uniform(float(low), float(high))).quantize(Decimal(1).scaleb(exponent))
+    return str(min(max(value, low), high))
+
+
+def sample_params(space: dict, rng: random.Random, prefix: tuple = ()) -> dict[tuple, Any]:
+    """
+    sample_params({'emitter': {'a': {'min': 1, 'max': 3}}}, rng) == {('emitter', 'a'): 2}
+    """
+    res = {}
+    for key, node in space.items():
+        if isinstance(node, dict) and not is_range(node):
+            res.update(sample_params(node, rng, prefix + (key,)))
+        else:
+            res[prefix + (key,)] = sample_value(node, rng)
+    return res
+
+
+def get_rung_days(min_days: int, max_days: int, eta: int) -> list[int]:
+    """
+    get_rung_days(2, 20, 3) == [2, 6, 18]. Rungs grow by eta while they fit into max_days.
+    """
+    res = [min_days]
+    while res[-1] * eta <= max_days:
+        res.append(res[-1] * eta)
+    return res
+
+
+@dataclass
+class Candidate:
+    params: dict[tuple, Any]
+    days: int = 0
+    metrics: Optional[dict] = None
+    score: float = float('-inf')
+
+
+def successive_halving(
+        strategy: str,
+        config: dict,
+        candidates: list[Candidate],
+        rung_days: list[int],
+        date_from: date,
+        broker_config: dict,
+        path_template: str,
+        window_size: int,
+        cache: EvaluationCache,
+        eta: int = 3,
+        metric: str = 'profit',
+        workers: Optional[int] = None,
+        pool: Optional[EvaluationPool] = None
+) -> list[Candidate]:
+    """
+    Evaluates all candidates on the shortest date range, keeps the best 1/eta of them
+    and evaluates survivors on eta times longer range, until the last rung.
+    All ranges start at `date_from`, so longer ranges include shorter ones.
+
+    :param pool: pool reused by rungs, by default every rung starts its own pool
+    :return: candidates of the last rung, the best first
+    """
+    for i, days in enumerate(rung_days):
+        evaluations = [
+            Evaluation(
+                strategy=strategy,
+                config=apply_params(config, candidate.params),
+                broker_config=broker_config,
+                path_template=path_template,
+                date_from=date_from,
+                date_to=date_from + timedelta(days=days - 1),
+                window_size=window_size
+            )
+            for candidate in candidates
+        ]
+        for candidate, result in zip(candidates, evaluate_all(evaluations, cache, workers=workers, pool=pool)):
+            candidate.days = days
+            candidate.metrics = result.get('metrics')
+            candidate.score = get_metric(result, metric)
+
+        candidates = sorted(candidates, key=lambda c: c.score, reverse=True)
+        logger.info(
+            'rung %s: %s candidates on %s days, best %s=%s', i, len(candidates), days, metric, candidates[0].score
+        )
+
+        if i < len(rung_days) - 1:
+            candidates = candidates[:max(len(candidates) // eta, 1)]
+
+    return candidates
+
+
+def hyperband(
+        strategy: str,
+        config: dict,
+        space: dict,
+        date_from: date,
+        date_to: date,
+        min_days: int,
+        broker_config: dict,
+        path_template: str,
+        window_size: int,
+        cache: EvaluationCache,
+        eta: int = 3,
+        metric: str = 'profit',
+        workers: Optional[int] = None,
+        seed: Optional[int] = None,
+        signal_cache_dir: Optional[str] = None
+) -> list[Candidate]:
+    """
+    Runs brackets of successive halving: the first bracket starts many candidates on `min_days`,
+    the last one evaluates few candidates on the whole range only.
+
+    :return: candidates of all brackets evaluated on the whole range, the best first
+    """
+    rng = random.Random(seed)
+    max_days = (date_to - date_from).days + 1
+    s_max = len(get_rung_days(min_days, max_days, eta)) - 1
+
+    # all brackets run in one pool, the whole range evaluation is enough to load klines
+    whole_range_evaluation = Evaluation(
+        strategy=strategy,
+        config=config,
+        broker_config=broker_config,
+        path_template=path_template,
+        date_from=date_from,
+        date_to=date_to,
+        window_size=window_size
+    )
+
+    res = []
+    with EvaluationPool([whole_range_evaluation], workers=workers, signal_cache_dir=signal_cache_dir) as pool:
+        for s in range(s_max, -1, -1):
+            count = math.ceil((s_max + 1) / (s + 1) * eta ** s)
+            # rungs of the bracket end exactly at the whole range
+            rung_days = [max(max_days // eta ** (s - i), 1) for i in range(s + 1)]
+            logger.info('bracket %s: %s candidates, rungs %s days', s, count, rung_days)
+
+            candidates = [Candidate(params=sample_params(space, rng)) for _ in range(count)]
+            res.extend(successive_halving(
+                strategy, config, candidates, rung_days, date_from,
+                broker_config=broker_config,
+                path_template=path_template,
+                window_size=window_size,
+                cache=cache,
+                eta=eta,
+                metric=metric,
+                pool=pool
+            ))
+
+    return sorted(res, key=lambda c: c.score, reverse=True)
@@ -0,0 +1,123 @@
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from decimal import Decimal
+from multiprocessing.shared_memory import SharedMemory
+from typing import Iterable, Iterator, Optional
+
+import numpy as np
+import pytz
+
+from kline import Kline
+
+logger = logging.getLogger(__name__)
+
+# prices and volumes are stored as fixed point integers, Binance market data has at most 8 decimal places
+PRICE_DECIMAL_PLACES = 8
+COLUMNS = ['open_time', 'open', 'high', 'low', 'close', 'volume']
+
+
+@dataclass(frozen=True)
+class SharedKlinesHandle:
+    """
+    Picklable reference to shared klines, workers use it to attach.
+    """
+    name: str
+    size: int
+    timeframe: timedelta
+
+
+def encode_decimal(value: Decimal) -> int:
+    scaled = value.scaleb(PRICE_DECIMAL_PLACES)
+    if scaled != scaled.to_integral_value():
+        raise ValueError(f'{value} has more than {PRICE_DECIMAL_PLACES} decimal places')
+    return int(scaled)
+
+
+def decode_decimal(value: int) -> Decimal:
+    return Decimal(value).scaleb(-PRICE_DECIMAL_PLACES)
+
+
+def encode_kline(kline: Kline) -> tuple:
+    return (
+        int(kline.open_time.timestamp() * 1000),
+        encode_decimal(kline.open),
+        encode_decimal(kline.high),
+        encode_decimal(kline.low),
+        encode_decimal(kline.close),
+        encode_decimal(kline.volume),
+    )
+
+
+class SharedKlines:
+    """
+    Kline columns in a shared memory block, one int64 row per kline.
+
+    The process which loaded klines owns the block and unlinks it on close.
+    Other processes attach by handle without copying and decode klines lazily while iterating.
+    Prices are exact, but lose trailing zeros of source files, e.g. 40000.0 is read as 40000.00000000.
+    """
+    def __init__(self, shm: SharedMemory, size: int, timeframe: timedelta, owner: bool):
+        self.shm = shm
+        self.size = size
+        self.timeframe = timeframe
+        self.owner = owner
+        self.array = np.ndarray((size, len(COLUMNS)), dtype=np.int64, buffer=shm.buf)
+
+    @classmethod
+    def create(cls, klines: Iterable[Kline], timeframe: timedelta) -> 'SharedKlines':
+        rows = np.array([encode_kline(kline) for kline in klines], dtype=np.int64).reshape(-1, len(COLUMNS))
+
+        # zero sized shared memory is not allowed
+        shm = SharedMemory(create=True, size=max(rows.nbytes, 1))
+        res = cls(shm, len(rows), timeframe, owner=True)
+        res.array[:] = rows
+
+        logger.info('%s klines loaded to shared memory %s', len(rows), shm.name)
+        return res
+
+    @classmethod
+    def attach(cls, handle: SharedKlinesHandle) -> 'SharedKlines':
+        return cls(SharedMemory(name=handle.name), handle.size, handle.timeframe, owner=False)
+
+    @property
+    def handle(self) -> SharedKlinesHandle:
+        return SharedKlinesHandle(name=self.shm.name, size=self.size, timeframe=self.timeframe)
+
+    def klines(self, dt_from: Optional[datetime] = None, dt_to: Optional[datetime] = None) -> Iterator[Kline]:
+        """
+        Yields klines with `dt_from <= open_time < dt_to`.
+        """
+        open_times = self.array[:, 0]
+        start = np.searchsorted(open_times, int(dt_from.timestamp() * 1000)) if dt_from else 0
+        end = np.searchsorted(open_times, int(dt_to.timestamp() * 1000)) if dt_to else self.size
+
+        for i in range(start, end):
+            yield self.get_kline(i)
+
+    def get_kline(self, i: int) -> Kline:
+        open_time_ms, open_price, high, low, close, volume = self.array[i].tolist()
+        open_time = datetime.fromtimestamp(open_time_ms / 1000, tz=pytz.UTC)
+
+        return Kline(
+            open_time=open_time,
+            close_time=open_time + self.timeframe,
+            open=decode_decimal(open_price),
+            high=decode_decimal(high),
+            low=decode_decimal(low),
+            close=decode_decimal(close),
+            volume=decode_decimal(volume)
+        )
+
+    def close(self):
+        # array holds a reference to the buffer, it must be released before the block is closed
+        self.array = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,95 @@
+import logging
+import os
+import pickle
+from typing import Optional
+
+from backtest import Signal, BacktestResult, backtest_strategy
+from broker import Broker
+from memprofile import MemoryProfiler
+from results import hash_config
+from strategy.emitter import SignalEmitter
+from strategy.ordermanager import OrderManager
+
+logger = logging.getLogger(__name__)
+
+# broker configs which change klines passed to emitter, the rest of them affect orders only
+KLINE_CONFIG_KEYS = ('timeframe', 'skip_header', 'resample_timeframe')
+
+
+def get_signals_key(
+        strategy: str,
+        emitter_config: Optional[dict],
+        input_files: dict[str, Optional[str]],
+        broker_config: dict,
+        window_size: int,
+        source_version: str
+) -> str:
+    """
+    Signals do not depend on order manager configs, so runs which differ by them share signals.
+
+    :param input_files: content hash by path of kline files passed to emitter, see `runcache.hash_files`
+    :param source_version: hash of source code, see `runcache.get_source_version`
+    """
+    return hash_config({
+        'strategy': strategy,
+        'emitter': emitter_config,
+        'input_files': input_files,
+        'broker': {key: broker_config[key] for key in KLINE_CONFIG_KEYS if key in broker_config},
+        'window_size': window_size,
+        'source_version': source_version,
+    })
+
+
+class SignalCache:
+    """
+    Stores signals of backtests on disk, one pickle file per signals key.
+    """
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f'{key}.pickle')
+
+    def get(self, key: str) -> Optional[list[Signal]]:
+        try:
+            with open(self.path(key), 'rb') as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            return None
+
+    def set(self, key: str, signals: list[Signal]):
+        path = self.path(key)
+        # several processes may calculate the same signals, the file is replaced atomically
+        path_tmp = f'{path}.{os.getpid()}.tmp'
+        with open(path_tmp, 'wb') as f:
+            pickle.dump(signals, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(path_tmp, path)
+
+
+def backtest_with_signal_cache(
+        cache: SignalCache,
+        key: str,
+        order_manager: OrderManager,
+        emitter: SignalEmitter,
+        broker: Broker,
+        window_size: int,
+        workers: Optional[int] = None,
+        profiler: Optional[MemoryProfiler] = None
+) -> BacktestResult:
+    """
+    Replays cached signals with broker and order manager, or runs the backtest and caches its signals.
+
+    :param workers: processes calculating signals on cache miss
+    :param profiler: see `backtest_strategy`
+    """
+    signals = cache.get(key)
+    logger.info('signals %s %s', key[:12], 'found in cache' if signals is not None else 'not cached')
+
+    result = backtest_strategy(
+        order_manager, emitter, broker, window_size, workers=workers or 1, signals=signals, profiler=profiler
+    )
+    if signals is None:
+        cache.set(key, result.signals)
+
+    return result
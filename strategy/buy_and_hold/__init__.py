@@ -1,18 +1,15 @@
 from typing import Tuple
 
-from yaml import load, Loader
-
 from order import OrderType
 from .emitter import ConstantEmitter
 from .ordermanager import HoldOrderManager
+from ..context import register_strategy
 from ..emitter import SignalEmitter
 from ..ordermanager import OrderManager
 
 
-def init_context() -> Tuple[OrderManager, SignalEmitter]:
-    with open('strategy/buy_and_hold/config.yml') as f:
-        configs = load(f, Loader=Loader)
-
+@register_strategy('buy-and-hold')
+def init_context(configs: dict) -> Tuple[OrderManager, SignalEmitter]:
     order_type_str = configs['emitter']['order_type'].upper()
     order_type = OrderType[order_type_str]
 
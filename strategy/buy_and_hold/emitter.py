@@ -1,4 +1,5 @@
-from typing import List, Optional
+from datetime import timedelta
+from typing import List, Optional, Sequence
 
 from kline import Kline
 from order import Order, create_order, OrderType
@@ -9,9 +10,14 @@ class ConstantEmitter(SignalEmitter):
     def __init__(self, order_type: OrderType = None):
         self.order_type = order_type
 
-    def get_order_request(self, klines: List[Kline]) -> Optional[Order]:
+    def get_order_request(
+            self,
+            klines: List[Kline],
+            timeframe_windows: Optional[dict[timedelta, Sequence[Kline]]] = None
+    ) -> Optional[Order]:
         """
         :param klines: historical klines. Current kline open price equals to klines[-1].close
+        :param timeframe_windows: not used
         :return:
         """
         kline = klines[-1]
@@ -0,0 +1,83 @@
+import importlib
+import logging
+import os
+import pkgutil
+import sys
+from dataclasses import dataclass
+from importlib.metadata import entry_points
+from typing import Tuple, Optional, Callable
+
+from config import load_yaml
+from strategy.emitter import SignalEmitter
+from strategy.ordermanager import OrderManager
+
+logger = logging.getLogger(__name__)
+
+# third party packages register strategies by entry points of this group, e.g.
+# [project.entry-points."zvezdin.strategies"]
+# my-strategy = "my_package.strategy"
+ENTRY_POINT_GROUP = 'zvezdin.strategies'
+
+InitContext = Callable[[dict], Tuple[OrderManager, SignalEmitter]]
+
+
+@dataclass
+class StrategyPlugin:
+    name: str
+    init_context: InitContext
+    # default strategy configs
+    config_path: str
+
+
+STRATEGIES: dict[str, StrategyPlugin] = {}
+
+
+def register_strategy(name: str, config_path: Optional[str] = None) -> Callable[[InitContext], InitContext]:
+    """
+    Decorator of strategy `init_context(configs)` function.
+
+    :param config_path: default configs, by default config.yml next to the module of decorated function
+    """
+    def decorator(init_context: InitContext) -> InitContext:
+        path = config_path or os.path.join(os.path.dirname(sys.modules[init_context.__module__].__file__), 'config.yml')
+        STRATEGIES[name] = StrategyPlugin(name=name, init_context=init_context, config_path=path)
+        return init_context
+
+    return decorator
+
+
+def discover_strategies():
+    """
+    Imports strategy subpackages and modules of entry points, they register strategies on import.
+    Imported modules are cached by python, so repeated calls are cheap.
+    """
+    package_dir = os.path.dirname(__file__)
+    for module_info in pkgutil.iter_modules([package_dir]):
+        if module_info.ispkg:
+            importlib.import_module(f'strategy.{module_info.name}')
+
+    for entry_point in entry_points(group=ENTRY_POINT_GROUP):
+        entry_point.load()
+
+
+def get_strategy(strategy_name: str) -> StrategyPlugin:
+    if strategy_name not in STRATEGIES:
+        discover_strategies()
+
+    if strategy_name not in STRATEGIES:
+        raise ValueError(f'Unknown strategy {strategy_name}, available: {", ".join(sorted(STRATEGIES))}')
+
+    return STRATEGIES[strategy_name]
+
+
+def init_strategy_context(strategy_name, configs: Optional[dict] = None) -> Tuple[OrderManager, SignalEmitter]:
+    """
+    :param configs: strategy configs, by default they are read from strategy config.yml
+    """
+    if configs is None:
+        configs = load_strategy_config(strategy_name)
+    return get_strategy(strategy_name).init_context(configs)
+
+
+def load_strategy_config(strategy_name) -> dict:
+    return load_yaml(get_strategy(strategy_name).config_path)
@@ -1,13 +1,22 @@
-from typing import List, Optional
+from datetime import timedelta
+from typing import List, Optional, Sequence
 
 from kline import Kline
 from order import Order
 
 
 class SignalEmitter:
-    def get_order_request(self, klines: List[Kline]) -> Optional[Order]:
+    # window size by higher timeframe, windows are built from base klines on the fly
+    timeframes: dict[timedelta, int] = {}
+
+    def get_order_request(
+            self,
+            klines: List[Kline],
+            timeframe_windows: Optional[dict[timedelta, Sequence[Kline]]] = None
+    ) -> Optional[Order]:
         """
         :param klines: historical klines. Current kline open price equals to klines[-1].close
+        :param timeframe_windows: historical klines of higher timeframes listed in `timeframes`
         :return:
         """
         raise NotImplementedError
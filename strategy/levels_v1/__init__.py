@@ -1,22 +1,15 @@
 from typing import Tuple
 
-from yaml import load, Loader
-
 from orderlist import OrderList
-from strategy.levels_v1.emitter import JumpLevelEmitter
-from strategy.levels_v1.ordermanager import DeduplicateOrderManager
 from .emitter import JumpLevelEmitter
 from .ordermanager import DeduplicateOrderManager
+from ..context import register_strategy
 from ..emitter import SignalEmitter
 from ..ordermanager import OrderManager
 
 
-def init_context() -> Tuple[OrderManager, SignalEmitter]:
-    path = 'strategy/levels_v1/config.yml'
-
-    with open(path) as f:
-        configs = load(f, Loader=Loader)
-
+@register_strategy('levels-v1')
+def init_context(configs: dict) -> Tuple[OrderManager, SignalEmitter]:
     return (
         DeduplicateOrderManager(OrderList(), **configs['order_manager']),
         JumpLevelEmitter(**configs['emitter'])
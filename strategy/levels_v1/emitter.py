@@ -1,14 +1,17 @@
 import enum
 import logging
-from datetime import timedelta
+from dataclasses import dataclass
+from datetime import timedelta, datetime
 from decimal import Decimal
-from typing import List, Union, Optional, Tuple
+from typing import List, Union, Optional, Tuple, Protocol, Sequence
 
 from kline import Kline
-from lib.levels import calc_levels_by_density, calc_levels_by_MA_extremums, get_highest_level, \
-    get_lowest_level, calc_level_interactions, calc_location, calc_touch_ups, calc_touch_downs, Location, Level, \
-    calc_levels_variation
-from lib.trend import Trend, calc_trend
+from lib.density import DensityTracker
+from lib.extremums import ExtremumTracker, MAExtremumTracker
+from lib.interactions import LevelInteractionTracker
+from lib.levels import calc_levels_by_close_density, calc_levels_by_MA_extremums, get_highest_level, \
+    get_lowest_level, calc_location, Location, Level, calc_levels_variation, calc_levels_by_extremums
+from lib.trend import Trend, calc_trend, calc_trend_by_maximums
 from order import Order, create_order, OrderType
 from strategy.emitter import SignalEmitter
 from strategy.utils import parse_timedelta
@@ -22,6 +25,24 @@ class CalcLevelsStrategy(enum.Enum):
     by_MA_extremums = 2
 
 
+@dataclass
+class LevelFeatures:
+    """
+    Features of kline window which orders are based on, see `JumpLevelEmitter.calc_features`.
+    """
+    # None if there are not enough higher timeframe klines
+    trend: Optional[Trend]
+    # optimal window size, 0 if not found
+    window_size: int = 0
+    level_lowest: Optional[Level] = None
+    level_highest: Optional[Level] = None
+
+
+class FeatureSource(Protocol):
+    def get(self, open_time: datetime) -> Optional[LevelFeatures]:
+        ...
+
+
 class JumpLevelEmitter(SignalEmitter):
     def __init__(
             self,
@@ -35,7 +56,9 @@ class JumpLevelEmitter(SignalEmitter):
             levels_window_size_min: int = None,
             levels_window_size_max: int = None,
             min_levels_variation: Union[Decimal, str] = None,
-            calc_trend_on: bool = True
+            calc_trend_on: bool = True,
+            trend_timeframe: Union[timedelta, str] = None,
+            density_sector_len: Union[Decimal, str, None] = None
     ):
         if not isinstance(price_open_to_level_ratio_threshold, Decimal):
             price_open_to_level_ratio_threshold = Decimal(price_open_to_level_ratio_threshold)
@@ -49,6 +72,12 @@ class JumpLevelEmitter(SignalEmitter):
         if not isinstance(profit_loss_ratio, Decimal):
             profit_loss_ratio = Decimal(profit_loss_ratio)
 
+        if isinstance(trend_timeframe, str):
+            trend_timeframe = parse_timedelta(trend_timeframe)
+
+        if density_sector_len is not None and not isinstance(density_sector_len, Decimal):
+            density_sector_len = Decimal(density_sector_len)
+
         self.price_open_to_level_ratio_threshold = price_open_to_level_ratio_threshold
         self.auto_close_in = auto_close_in
         self.stop_loss_level_percent = stop_loss_level_percent
@@ -59,62 +88,82 @@ class JumpLevelEmitter(SignalEmitter):
         self.levels_window_size_max = levels_window_size_max
         self.min_levels_variation = Decimal(min_levels_variation)
         self.calc_trend_on = calc_trend_on
+        # by density strategy counts points in sectors of fixed length if set,
+        # otherwise sectors are relative to window min and max
+        self.density_sector_len = density_sector_len
+
+        # trend is calculated on medium window of higher timeframe klines
+        self.trend_timeframe = trend_timeframe
+        self.timeframes = {trend_timeframe: medium_window_size} if trend_timeframe else {}
 
         # Callable[[list[Kline]], list[Level]]
         self.calc_levels = {
-            CalcLevelsStrategy.by_density: calc_levels_by_density,
+            CalcLevelsStrategy.by_density: calc_levels_by_close_density,
             CalcLevelsStrategy.by_MA_extremums: calc_levels_by_MA_extremums,
         }[calc_levels_strategy]
-
-    def get_order_request(self, klines: List[Kline]) -> Optional[Order]:
+        self.calc_levels_strategy = calc_levels_strategy
+
+        # Trend and levels are calculated on every kline for windows which mostly overlap previous ones.
+        # Trackers keep extremums of close prices updated by new klines only.
+        self.trend_extremums: Optional[ExtremumTracker] = None
+        self.levels_extremums: Optional[MAExtremumTracker] = None
+        # density of every window size tried by find_optimal_window_size
+        self.levels_density: Optional[DensityTracker] = None
+        # interactions of the current highest and lowest levels with small window
+        self.level_interactions: dict[Level, LevelInteractionTracker] = {}
+        self.last_open_time = None
+
+        # precalculated features by open time of the last historical kline, e.g. from feature store
+        self.features: Optional[FeatureSource] = None
+
+    def get_order_request(
+            self,
+            klines: List[Kline],
+            timeframe_windows: Optional[dict[timedelta, Sequence[Kline]]] = None
+    ) -> Optional[Order]:
         """
         :param klines: historical klines. Current kline open price equals to klines[-1].close
+        :param timeframe_windows: historical klines of `trend_timeframe`, if configured
         :return:
         """
         kline = klines[-1]
+        self.update_trackers(klines)
 
         # close price of previous kline is current price
         price = kline.close
 
-        medium_window = klines[-self.medium_window_size:]
-        medium_window_points = [k.close for k in medium_window]
-
         small_window = klines[-self.small_window_size:]
         small_window_points = [k.close for k in small_window]
 
-        point = medium_window_points[-1]
+        point = kline.close
 
-        if self.calc_trend_on:
-            trend = calc_trend(medium_window_points)
-        else:
-            trend = Trend.FLAT
+        features = self.features.get(kline.open_time) if self.features else None
+        if features is None:
+            features = self.calc_features(klines, timeframe_windows)
 
-        logger.info('%s trend %s', kline.open_time, trend)
-
-        window_size = self.find_optimal_window_size(
-            klines,
-            self.levels_window_size_min,
-            self.levels_window_size_max
-        )
-
-        if not window_size:
-            logger.warning('Optimal window not found')
+        if features.trend is None or not features.window_size:
             return
 
-        window = klines[-window_size:]
-        levels = self.calc_levels(window)
+        trend = features.trend
+        level_highest = features.level_highest
+        level_lowest = features.level_lowest
 
-        level_highest = get_highest_level(levels)
-        level_lowest = get_lowest_level(levels)
+        # levels often stay the same on next kline, then their interactions are updated rather than recalculated
+        self.level_interactions = {
+            level: self.level_interactions.get(level) or LevelInteractionTracker(
+                level, self.small_window_size, small_window_points
+            )
+            for level in (level_lowest, level_highest)
+        }
 
         for level in (level_lowest, level_highest):
             # It's important that the price interacted with level right before the trading moment
             # It means the level is relevant
             # That's why I take small window to calc interactions
-            interactions = calc_level_interactions(small_window_points, level)
+            interactions = self.level_interactions[level]
 
             if trend in (Trend.UP, Trend.FLAT) and calc_location(point, level) == Location.UP \
-                    and calc_touch_ups(interactions) >= 1 \
+                    and interactions.calc_touch_ups() >= 1 \
                     and not self.is_order_late(level, price) \
                     and level == level_lowest:
                 return create_order_long(
@@ -125,7 +174,7 @@ class JumpLevelEmitter(SignalEmitter):
                 )
 
             if trend in (Trend.DOWN, Trend.FLAT) and calc_location(point, level) == Location.DOWN \
-                    and calc_touch_downs(interactions) >= 1 \
+                    and interactions.calc_touch_downs() >= 1 \
                     and not self.is_order_late(level, price) \
                     and level == level_highest:
                 return create_order_short(
@@ -135,7 +184,72 @@ class JumpLevelEmitter(SignalEmitter):
                     auto_close_in=self.auto_close_in
                 )
 
+    def calc_features(
+            self,
+            klines: List[Kline],
+            timeframe_windows: Optional[dict[timedelta, Sequence[Kline]]] = None
+    ) -> 'LevelFeatures':
+        """
+        Trend and levels of historical klines, they do not depend on the current price.
+        Trackers must be updated by `klines` before the call.
+        """
+        kline = klines[-1]
+        self.create_feature_trackers(klines)
+
+        if self.calc_trend_on and self.trend_timeframe:
+            trend_window = timeframe_windows[self.trend_timeframe]
+            if len(trend_window) < self.medium_window_size:
+                logger.warning('Not enough %s klines for trend', self.trend_timeframe)
+                return LevelFeatures(trend=None)
+            trend = calc_trend([k.close for k in trend_window])
+        elif self.calc_trend_on:
+            _, maximums = self.trend_extremums.maximums(min(self.medium_window_size, len(klines)))
+            trend = calc_trend_by_maximums(maximums)
+        else:
+            trend = Trend.FLAT
+
+        logger.info('%s trend %s', kline.open_time, trend)
+
+        optimal_window = self.find_optimal_window(
+            klines,
+            self.levels_window_size_min,
+            self.levels_window_size_max
+        )
+
+        if not optimal_window:
+            logger.warning('Optimal window not found')
+            return LevelFeatures(trend=trend)
+
+        window_size, levels = optimal_window
+        return LevelFeatures(
+            trend=trend,
+            window_size=window_size,
+            level_lowest=get_lowest_level(levels),
+            level_highest=get_highest_level(levels)
+        )
+
+    def get_features_params(self) -> dict:
+        """
+        Params which `calc_features` depends on, emitters with equal params calculate equal features.
+        """
+        return {
+            'medium_window_size': self.medium_window_size,
+            'levels_window_size_min': self.levels_window_size_min,
+            'levels_window_size_max': self.levels_window_size_max,
+            'min_levels_variation': self.min_levels_variation,
+            'calc_levels_strategy': self.calc_levels_strategy,
+            'density_sector_len': self.density_sector_len,
+            'calc_trend_on': self.calc_trend_on,
+            'trend_timeframe': self.trend_timeframe,
+        }
+
     def find_optimal_window_size(self, klines: List[Kline], start_size: int, max_size: int) -> Optional[int]:
+        optimal_window = self.find_optimal_window(klines, start_size, max_size)
+        return optimal_window[0] if optimal_window else None
+
+    def find_optimal_window(
+            self, klines: List[Kline], start_size: int, max_size: int
+    ) -> Optional[Tuple[int, List[Level]]]:
         """
         I need at least 2 levels which differ significally. This allows to find trade moment and trade direction.
 
@@ -148,37 +262,100 @@ class JumpLevelEmitter(SignalEmitter):
         :param klines: required `len(klines) >= max_size`
         :param start_size:
         :param max_size:
-        :return: optimal window size
+        :return: optimal window size and its levels
         """
         if len(klines) < max_size:
             logger.warning('Klines list is too small for finding optimal window')
 
-        size = 0
-        iteration = 0
         message = ''
-        window = []
-
-        while size <= max_size:
-            iteration += 1
-            size = start_size * iteration
+        size = 0
 
-            window = klines[-size:]
-            levels = self.calc_levels(window)
+        for size in get_window_sizes(start_size, max_size):
+            levels = self.calc_window_levels(klines, size)
 
             ok, message = self.contains_2_levels(levels)
             if ok:
-                return size
+                return size, levels
 
-        if message and window:
+        if message and klines:
             logger.warning(
                 '%s for window [%s - %s]',
                 message,
-                window[0].open_time,
-                window[-1].open_time
+                klines[-min(size, len(klines))].open_time,
+                klines[-1].open_time
             )
 
         return None
 
+    def update_trackers(self, klines: List[Kline]):
+        """
+        Feeds trackers with klines not seen yet.
+        If `klines` do not continue klines seen before, trackers are built from scratch.
+        Trackers of trend and levels are created by `calc_features`, they are not needed if features are precalculated.
+        """
+        new_klines = klines
+        if self.last_open_time is not None:
+            i = len(klines)
+            while i > 0 and klines[i - 1].open_time > self.last_open_time:
+                i -= 1
+
+            if i > 0 and klines[i - 1].open_time == self.last_open_time:
+                new_klines = klines[i:]
+            else:
+                self.trend_extremums = None
+                self.levels_extremums = None
+                self.levels_density = None
+                self.level_interactions = {}
+
+        for k in new_klines:
+            if self.trend_extremums:
+                self.trend_extremums.update(k.close)
+            if self.levels_extremums:
+                self.levels_extremums.update(k.close)
+            if self.levels_density:
+                self.levels_density.update(k.close)
+            for level_interactions in self.level_interactions.values():
+                level_interactions.update(k.close)
+
+        self.last_open_time = klines[-1].open_time
+
+    def create_feature_trackers(self, klines: List[Kline]):
+        """
+        Creates missing trackers of trend and levels from `klines` seen by `update_trackers`.
+        """
+        if self.trend_extremums is None:
+            self.trend_extremums = ExtremumTracker(capacity=self.medium_window_size)
+            for k in klines:
+                self.trend_extremums.update(k.close)
+
+        if self.levels_extremums is None and self.calc_levels_strategy == CalcLevelsStrategy.by_MA_extremums:
+            # find_optimal_window_size may overshoot max size by one step
+            self.levels_extremums = MAExtremumTracker(capacity=self.levels_window_size_max + self.levels_window_size_min)
+            for k in klines:
+                self.levels_extremums.update(k.close)
+
+        if self.calc_levels_strategy == CalcLevelsStrategy.by_density:
+            # windows larger than klines are the same as klines, as in `klines[-size:]`
+            window_sizes = get_window_sizes(self.levels_window_size_min, self.levels_window_size_max)
+            sizes = sorted({min(size, len(klines)) for size in window_sizes})
+            if self.levels_density is None or self.levels_density.sizes != sizes:
+                self.levels_density = DensityTracker(sizes, sector_len=self.density_sector_len)
+                for k in klines[-sizes[-1]:]:
+                    self.levels_density.update(k.close)
+
+    def calc_window_levels(self, klines: List[Kline], size: int) -> List[Level]:
+        """
+        The same as `self.calc_levels(klines[-size:])`, extremums and density are taken from trackers if possible.
+        """
+        if self.levels_extremums:
+            maximums, minimums = self.levels_extremums.query(min(size, len(klines)))
+            return calc_levels_by_extremums(maximums + minimums)
+
+        if self.levels_density:
+            return self.levels_density.levels(min(size, len(klines)))
+
+        return self.calc_levels(klines[-size:])
+
     def contains_2_levels(self, levels: List[Level]) -> Tuple[bool, str]:
         """
         Checks that `levels` contains at least 2 essentially different levels.
@@ -200,6 +377,17 @@ class JumpLevelEmitter(SignalEmitter):
         return price_open_to_level_ratio > self.price_open_to_level_ratio_threshold
 
 
+def get_window_sizes(start_size: int, max_size: int) -> list[int]:
+    """
+    Window sizes tried by `find_optimal_window_size`: multiples of `start_size`
+    up to the first one exceeding `max_size`, e.g. get_window_sizes(50, 120) == [50, 100, 150].
+    """
+    res = [start_size]
+    while res[-1] <= max_size:
+        res.append(res[-1] + start_size)
+    return res
+
+
 def add_percent(d: Decimal, percent: Union[int, Decimal]) -> Decimal:
     if not isinstance(percent, Decimal):
         percent = Decimal(percent)
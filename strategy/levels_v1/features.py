@@ -0,0 +1,173 @@
+import logging
+import os
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Optional
+
+import numpy as np
+
+from broker import BrokerSimulator, KlineDataRange, date_iter
+from featurestore import FeatureStore, FeatureLookup, OPEN_TIME_COLUMN, to_timestamp_ms, get_warm_up_days, \
+    day_range
+from kline import get_moving_window_iterator
+from lib.levels import Level
+from lib.trend import Trend
+from results import hash_config
+from runcache import hash_files, get_source_version
+from sharedklines import encode_decimal, decode_decimal
+from strategy.levels_v1.emitter import JumpLevelEmitter, LevelFeatures
+from strategy.utils import parse_timedelta
+
+logger = logging.getLogger(__name__)
+
+# emitter configs which features depend on, the rest of them affect orders only
+FEATURE_CONFIG_KEYS = (
+    'medium_window_size',
+    'levels_window_size_min',
+    'levels_window_size_max',
+    'min_levels_variation',
+    'calc_levels_strategy',
+    'density_sector_len',
+    'calc_trend_on',
+)
+LEVEL_COLUMNS = ('level_lowest_bottom', 'level_lowest_top', 'level_highest_bottom', 'level_highest_top')
+
+
+def get_feature_params(emitter_config: dict, window_size: int) -> dict:
+    if emitter_config.get('calc_trend_on', True) and emitter_config.get('trend_timeframe'):
+        raise ValueError('Features of trend on higher timeframe are not supported')
+
+    params = {key: emitter_config[key] for key in FEATURE_CONFIG_KEYS if key in emitter_config}
+    params['window_size'] = window_size
+    return params
+
+
+def get_features_key(emitter_config: dict, window_size: int, source_version: str) -> str:
+    """
+    :param source_version: hash of source code, see `runcache.get_source_version`
+    """
+    return hash_config({**get_feature_params(emitter_config, window_size), 'source_version': source_version})
+
+
+def get_warm_up_from(broker_config: dict, window_size: int, day: date) -> date:
+    """
+    :return: the first day of klines which windows ending within the day consist of
+    """
+    timeframe = parse_timedelta(broker_config.get('resample_timeframe') or broker_config.get('timeframe', '5m'))
+    return day - timedelta(days=get_warm_up_days(window_size * timeframe))
+
+
+def get_day_version(path_template: str, broker_config: dict, window_size: int, day: date) -> Optional[str]:
+    """
+    :return: hash of market data files which features of the day are calculated from,
+        None if there is no file of the day
+    """
+    if not os.path.exists(day.strftime(path_template)):
+        return None
+
+    date_from = get_warm_up_from(broker_config, window_size, day)
+    return hash_config(hash_files(d.strftime(path_template) for d in date_iter(date_from, day)))
+
+
+def decode_level_value(value: int) -> Decimal:
+    res = decode_decimal(value)
+    # levels are usually rounded to integers, keep them the same as calculated ones
+    return res.quantize(Decimal(1)) if res == res.to_integral_value() else res.normalize()
+
+
+def encode_features(open_time: datetime, features: LevelFeatures) -> tuple:
+    levels = (features.level_lowest or (0, 0)) + (features.level_highest or (0, 0))
+    return (
+        to_timestamp_ms(open_time),
+        features.trend.value,
+        features.window_size,
+        *(encode_decimal(Decimal(value)) for value in levels)
+    )
+
+
+def decode_features(row: dict) -> LevelFeatures:
+    if not row['window_size']:
+        return LevelFeatures(trend=Trend(row['trend']))
+
+    def decode_level(bottom: str, top: str) -> Level:
+        return decode_level_value(row[bottom]), decode_level_value(row[top])
+
+    return LevelFeatures(
+        trend=Trend(row['trend']),
+        window_size=row['window_size'],
+        level_lowest=decode_level('level_lowest_bottom', 'level_lowest_top'),
+        level_highest=decode_level('level_highest_bottom', 'level_highest_top')
+    )
+
+
+def calc_day_features(
+        emitter_config: dict,
+        path_template: str,
+        broker_config: dict,
+        window_size: int,
+        day: date
+) -> dict[str, np.ndarray]:
+    """
+    Features of every kline window of `window_size` klines, which ends with a kline of the day.
+    Windows ending with the first klines of the day take klines of previous days, if their files exist.
+    """
+    date_from = get_warm_up_from(broker_config, window_size, day)
+    while date_from < day and not os.path.exists(date_from.strftime(path_template)):
+        date_from += timedelta(days=1)
+
+    broker = BrokerSimulator(kline_data_range=KlineDataRange(path_template, date_from, day), config=broker_config)
+    emitter = JumpLevelEmitter(**emitter_config)
+    dt_from, _ = day_range(day)
+
+    rows = []
+    for window in get_moving_window_iterator(broker.klines(), window_size):
+        kline = window[-1]
+        if kline.open_time < dt_from:
+            continue
+
+        emitter.update_trackers(window)
+        rows.append(encode_features(kline.open_time, emitter.calc_features(window)))
+
+    columns = np.array(rows, dtype=np.int64).reshape(-1, 3 + len(LEVEL_COLUMNS))
+    names = (OPEN_TIME_COLUMN, 'trend', 'window_size') + LEVEL_COLUMNS
+    dtypes = (np.int64, np.int8, np.int32) + (np.int64,) * len(LEVEL_COLUMNS)
+    return {name: columns[:, i].astype(dtype) for i, (name, dtype) in enumerate(zip(names, dtypes))}
+
+
+class LevelFeatureLookup:
+    """
+    Serves stored features to `JumpLevelEmitter.features`.
+    """
+    def __init__(self, lookup: FeatureLookup):
+        self.lookup = lookup
+
+    def get(self, open_time: datetime) -> Optional[LevelFeatures]:
+        row = self.lookup.get(open_time)
+        return decode_features(row) if row is not None else None
+
+
+def update_level_features(
+        store: FeatureStore,
+        dataset: str,
+        emitter_config: dict,
+        path_template: str,
+        broker_config: dict,
+        window_size: int,
+        date_from: date,
+        date_to: date
+) -> LevelFeatureLookup:
+    """
+    Calculates features of days missing in the store or which market data changed,
+    and returns lookup of all stored days.
+    """
+    key = get_features_key(emitter_config, window_size, get_source_version())
+    store.write_params(dataset, key, get_feature_params(emitter_config, window_size))
+
+    def calc(day: date) -> dict[str, np.ndarray]:
+        return calc_day_features(emitter_config, path_template, broker_config, window_size, day)
+
+    def get_version(day: date) -> Optional[str]:
+        return get_day_version(path_template, broker_config, window_size, day)
+
+    store.update(dataset, key, date_from, date_to, calc, get_version)
+    return LevelFeatureLookup(store.lookup(dataset, key))
@@ -63,6 +63,10 @@ def is_duplicate_order(
     if order_a.order_type != order_b.order_type:
         return False
 
+    # Orders on different instruments never duplicate each other
+    if order_a.symbol != order_b.symbol:
+        return False
+
     if timeout:
         delta = order_a.trade_open.created_at - order_b.trade_open.created_at
         if abs(delta.total_seconds()) < timeout.total_seconds():
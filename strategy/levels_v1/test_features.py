@@ -0,0 +1,49 @@
+from datetime import date
+
+from backtest import SignalChunk, calc_signals
+from config import load_yaml
+from featurestore import FeatureStore
+from resample import write_klines_to_csv
+from strategy.levels_v1.emitter import JumpLevelEmitter
+from strategy.levels_v1.features import update_level_features
+from test_backtest import random_klines
+
+
+def test_emitter_with_stored_features(tmp_path):
+    configs = load_yaml('strategy/levels_v1/config.example.yml')['emitter']
+    configs.update(medium_window_size=20, small_window_size=10, levels_window_size_min=20, levels_window_size_max=60)
+    window_size = 80
+
+    klines = random_klines(600, seed=1)
+    path_template = str(tmp_path / 'BTCBUSD-5m-%Y-%m-%d.csv')
+    for day in (date(2022, 2, 18), date(2022, 2, 19)):
+        write_klines_to_csv(day.strftime(path_template), [k for k in klines if k.open_time.date() == day])
+
+    # the last day is downloaded partially, the next one is missing
+    last_day_path = date(2022, 2, 20).strftime(path_template)
+    last_day_klines = [k for k in klines if k.open_time.date() == date(2022, 2, 20)]
+    write_klines_to_csv(last_day_path, last_day_klines[:10])
+
+    broker_config = {'timeframe': '5m', 'skip_header': False}
+    store = FeatureStore(str(tmp_path / 'features'))
+    update_level_features(
+        store, 'BTCBUSD-5m', configs, path_template, broker_config, window_size, date(2022, 2, 18), date(2022, 2, 21)
+    )
+    # the last day is calculated again when its file is complete
+    write_klines_to_csv(last_day_path, last_day_klines)
+    features = update_level_features(
+        store, 'BTCBUSD-5m', configs, path_template, broker_config, window_size, date(2022, 2, 18), date(2022, 2, 21)
+    )
+
+    expected = calc_signals(SignalChunk(JumpLevelEmitter(**configs), klines, start=window_size, window_size=window_size))
+    assert any(order for _, order in expected)
+
+    emitter = JumpLevelEmitter(**configs)
+    emitter.features = features
+    assert calc_signals(SignalChunk(emitter, klines, start=window_size, window_size=window_size)) == expected
+
+    # windows of all klines but the first ones are stored
+    stored = [features.get(k.open_time) for k in klines]
+    assert stored[:window_size - 1] == [None] * (window_size - 1)
+    assert all(stored[window_size - 1:])
+    assert any(f.window_size for f in stored[window_size - 1:])
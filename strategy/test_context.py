@@ -0,0 +1,38 @@
+import pytest
+
+from config import load_yaml
+from strategy.context import register_strategy, get_strategy, init_strategy_context, STRATEGIES
+from strategy.levels_v1.emitter import JumpLevelEmitter
+from strategy.levels_v1.ordermanager import DeduplicateOrderManager
+
+
+def test_register_strategy():
+    @register_strategy('test-strategy', config_path='test.yml')
+    def init_context(configs: dict):
+        return configs['order_manager'], configs['emitter']
+
+    try:
+        plugin = get_strategy('test-strategy')
+        assert plugin.config_path == 'test.yml'
+        assert init_strategy_context('test-strategy', {'order_manager': 1, 'emitter': 2}) == (1, 2)
+    finally:
+        del STRATEGIES['test-strategy']
+
+
+def test_get_strategy():
+    plugin = get_strategy('levels-v1')
+    assert plugin.config_path.endswith('strategy/levels_v1/config.yml')
+
+    with pytest.raises(ValueError):
+        get_strategy('unknown')
+
+
+def test_init_strategy_context_configs():
+    configs = load_yaml('strategy/levels_v1/config.example.yml')
+    configs['emitter']['medium_window_size'] = 50
+
+    order_manager, emitter = init_strategy_context('levels-v1', configs)
+
+    assert isinstance(order_manager, DeduplicateOrderManager)
+    assert isinstance(emitter, JumpLevelEmitter)
+    assert emitter.medium_window_size == 50
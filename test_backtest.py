@@ -0,0 +1,54 @@
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+from backtest import SignalChunk, calc_signals, calc_signals_parallel
+from config import load_yaml
+from strategy.levels_v1.emitter import JumpLevelEmitter
+from test_kline import kline_factory
+from test_utils import datetime_from_str
+
+
+def random_klines(count: int, seed: int) -> list:
+    rng = random.Random(seed)
+    # klines start in the middle of an hour, so the first hourly kline is partial
+    open_time = datetime_from_str('2022-02-18 00:35')
+    timeframe = timedelta(minutes=5)
+
+    res = []
+    price = Decimal(40000)
+    for i in range(count):
+        close = price + rng.choice([-40, -20, -10, 0, 10, 20, 40])
+        res.append(kline_factory(
+            open_time=open_time + i * timeframe,
+            close_time=open_time + (i + 1) * timeframe,
+            open=price,
+            close=close,
+            high=max(price, close) + rng.choice([5, 10, 200]),
+            low=min(price, close) - 5
+        ))
+        price = close
+    return res
+
+
+def test_calc_signals_parallel_same_as_sequential():
+    configs = load_yaml('strategy/levels_v1/config.example.yml')['emitter']
+    configs.update(
+        medium_window_size=20,
+        small_window_size=10,
+        levels_window_size_min=20,
+        levels_window_size_max=60,
+        calc_trend_on=True,
+        trend_timeframe='1h'
+    )
+    klines = random_klines(1200, seed=1)
+    window_size = 80
+
+    emitter = JumpLevelEmitter(**configs)
+    expected = calc_signals(SignalChunk(emitter, klines, start=window_size, window_size=window_size))
+    assert len(expected) == len(klines) - window_size
+    assert any(order for _, order in expected)
+    assert any(emergency for emergency, _ in expected)
+
+    emitter = JumpLevelEmitter(**configs)
+    assert calc_signals_parallel(emitter, klines, window_size, workers=3) == expected
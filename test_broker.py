@@ -1,8 +1,11 @@
 from decimal import Decimal
 
+import pytest
+
 from broker import BrokerSimulator, BrokerEvent, BrokerEventType
 from order import TradeType, OrderType
 from test_kline import kline_factory
+from test_utils import datetime_from_str
 from factories import trade_factory, order_factory
 
 
@@ -149,3 +152,102 @@ class TestBrokerSimulatorEvents:
         events = broker.events(kline)
         assert events == [
         ]
+
+
+class TestBrokerSimulatorTakeProfitStopLossBothAchieved:
+    def create_order(self, price_take_profit: Decimal, price_stop_loss: Decimal):
+        trade_open = trade_factory(trade_type=TradeType.BUY, price=Decimal('4.4'))
+        return order_factory(
+            order_type=OrderType.LONG,
+            trade_open=trade_open,
+            price_take_profit=price_take_profit,
+            price_stop_loss=price_stop_loss
+        )
+
+    def create_kline(self):
+        # fine klines for this period are in test_data/test_kline_data_1m.csv
+        return kline_factory(
+            open_time=datetime_from_str('2022-01-20 00:00'),
+            close_time=datetime_from_str('2022-01-20 00:05'),
+            open=Decimal('4.4'),
+            close=Decimal('4.5'),
+            high=Decimal('4.6'),
+            low=Decimal('4.0')
+        )
+
+    def test_undefined_behaviour(self):
+        broker = BrokerSimulator(klines_csv_path='/tmp/klines.csv')  # path is not used
+        broker.add_order(self.create_order(Decimal('4.6'), Decimal('4.0')))
+
+        with pytest.raises(Exception):
+            broker.events(self.create_kline())
+
+    def test_close_by_stop_loss(self):
+        broker = BrokerSimulator(
+            klines_csv_path='/tmp/klines.csv',  # path is not used
+            config={'take_profit_stop_loss_both_achieved': 'close_by_stop_loss'}
+        )
+        event = broker.add_order(self.create_order(Decimal('4.6'), Decimal('4.0')))
+        kline = self.create_kline()
+
+        assert broker.events(kline) == [
+            BrokerEvent(
+                order_id=event.order_id,
+                type=BrokerEventType.order_close_by_stop_loss,
+                created_at=kline.open_time,
+                price=Decimal('4.0')
+            )
+        ]
+
+    def test_resolve_by_fine_klines_stop_loss(self):
+        broker = BrokerSimulator(
+            klines_csv_path='/tmp/klines.csv',  # path is not used
+            config={'fine_klines_path_template': 'test_data/test_kline_data_1m.csv'}
+        )
+        event = broker.add_order(self.create_order(Decimal('4.6'), Decimal('4.0')))
+
+        assert broker.events(self.create_kline()) == [
+            BrokerEvent(
+                order_id=event.order_id,
+                type=BrokerEventType.order_close_by_stop_loss,
+                created_at=datetime_from_str('2022-01-20 00:01'),
+                price=Decimal('4.0')
+            )
+        ]
+
+    def test_resolve_by_fine_klines_take_profit(self):
+        broker = BrokerSimulator(
+            klines_csv_path='/tmp/klines.csv',  # path is not used
+            config={'fine_klines_path_template': 'test_data/test_kline_data_1m.csv'}
+        )
+        event = broker.add_order(self.create_order(Decimal('4.5'), Decimal('4.0')))
+
+        assert broker.events(self.create_kline()) == [
+            BrokerEvent(
+                order_id=event.order_id,
+                type=BrokerEventType.order_close_by_take_profit,
+                created_at=datetime_from_str('2022-01-20 00:00'),
+                price=Decimal('4.5')
+            )
+        ]
+
+    def test_fine_klines_not_resolved(self):
+        # the first fine kline achieves both prices, fallback to configured behaviour
+        broker = BrokerSimulator(
+            klines_csv_path='/tmp/klines.csv',  # path is not used
+            config={
+                'fine_klines_path_template': 'test_data/test_kline_data_1m.csv',
+                'take_profit_stop_loss_both_achieved': 'close_by_stop_loss',
+            }
+        )
+        event = broker.add_order(self.create_order(Decimal('4.5'), Decimal('4.3')))
+        kline = self.create_kline()
+
+        assert broker.events(kline) == [
+            BrokerEvent(
+                order_id=event.order_id,
+                type=BrokerEventType.order_close_by_stop_loss,
+                created_at=kline.open_time,
+                price=Decimal('4.3')
+            )
+        ]
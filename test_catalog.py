@@ -0,0 +1,137 @@
+import os
+from datetime import date, timedelta
+
+from broker import BrokerSimulator
+from catalog import MarketDataCatalog, CatalogDataRange, index_file, repair_file
+from resample import write_klines_to_csv
+from test_backtest import random_klines
+from test_utils import datetime_from_str
+
+
+def write_days(data_dir: str, klines: list, skip_days: tuple = ()) -> list:
+    """
+    :return: written klines
+    """
+    res = []
+    days = sorted({k.open_time.date() for k in klines})
+    for day in days:
+        if day in skip_days:
+            continue
+        day_klines = [k for k in klines if k.open_time.date() == day]
+        write_klines_to_csv(os.path.join(data_dir, day.strftime('BTCBUSD-5m-%Y-%m-%d.csv')), day_klines)
+        res += day_klines
+    return res
+
+
+def test_index_file(tmp_path):
+    klines = random_klines(10, seed=1)
+    path = str(tmp_path / 'BTCBUSD-5m-2022-02-18.csv')
+    write_klines_to_csv(path, klines[:3] + klines[5:])
+
+    file, report = index_file(path, '5m')
+    assert file.symbol == 'BTCBUSD'
+    assert not file.has_header
+    assert file.rows == 8
+    assert file.gaps == 2
+    assert report.issues() == {'gaps': 2}
+    assert file.first_open_time == int(klines[0].open_time.timestamp() * 1000)
+    assert file.last_open_time == int(klines[-1].open_time.timestamp() * 1000)
+
+    with open(path) as f:
+        data = f.read()
+    with open(path, 'w') as f:
+        f.write('open_time,open,high,low,close,volume\n' + data)
+
+    file_with_header, _ = index_file(path, '5m')
+    assert file_with_header.has_header
+    assert file_with_header.rows == 8
+    assert file_with_header.checksum != file.checksum
+
+
+def test_repair_file(tmp_path):
+    path = tmp_path / 'BTCBUSD-5m-2022-02-18.csv'
+    path.write_bytes(
+        b'\nopen_time,open,high,low,close,volume\n'
+        b'1645142700000,2,2,2,2,1\n'
+        b'1645142400000,1,1,1,1,1\n'
+        b'1645142400000,1,1,1,1,1\n'
+    )
+
+    repair_file(str(path), '5m')
+    assert path.read_bytes() == (
+        b'open_time,open,high,low,close,volume\n'
+        b'1645142400000,1,1,1,1,1\n'
+        b'1645142700000,2,2,2,2,1\n'
+    )
+    assert index_file(str(path), '5m')[1].valid
+
+
+def test_scan(tmp_path):
+    data_dir = str(tmp_path / 'data')
+    os.mkdir(data_dir)
+    write_days(data_dir, random_klines(600, seed=1))
+    (tmp_path / 'data' / 'README.txt').write_text('not market data')
+
+    catalog = MarketDataCatalog(str(tmp_path / 'catalog.db'))
+    assert len(catalog.scan(data_dir)) == 3
+    assert catalog.scan(data_dir) == []
+
+    assert catalog.get_invalid_files() == []
+    path = os.path.join(data_dir, 'BTCBUSD-5m-2022-02-20.csv')
+    # the first kline of the day is appended once again
+    with open(path, 'a') as f:
+        f.write('1645315200000,1,1,1,1,1\n')
+    assert len(catalog.scan(data_dir)) == 1
+    assert [(p, report.issues()) for p, report in catalog.get_invalid_files()] == [(path, {'duplicates': 1, 'unordered': 1})]
+
+    os.remove(os.path.join(data_dir, 'BTCBUSD-5m-2022-02-19.csv'))
+    catalog.scan(data_dir + '/')
+    assert catalog.get_file(os.path.join(data_dir, 'BTCBUSD-5m-2022-02-19.csv')) is None
+    assert catalog.get_file(os.path.join(data_dir, 'BTCBUSD-5m-2022-02-20.csv')).rows > 0
+
+
+def test_catalog_data_range(tmp_path):
+    data_dir = str(tmp_path)
+    klines = write_days(data_dir, random_klines(600, seed=1), skip_days=(date(2022, 2, 19),))
+
+    catalog = MarketDataCatalog(str(tmp_path / 'catalog.db'))
+    catalog.scan(data_dir)
+
+    def read(dt_from: str, dt_to: str) -> list:
+        data_range = CatalogDataRange(
+            catalog, 'BTCBUSD', '5m', datetime_from_str(dt_from), datetime_from_str(dt_to)
+        )
+        return list(BrokerSimulator(kline_data_range=data_range, config={'skip_header': True}).klines())
+
+    # missing day is skipped
+    assert read('2022-02-18 00:00', '2022-02-21 00:00') == klines
+
+    dt_from = datetime_from_str('2022-02-18 12:00')
+    dt_to = datetime_from_str('2022-02-20 01:00')
+    assert read('2022-02-18 12:00', '2022-02-20 01:00') == [k for k in klines if dt_from <= k.open_time < dt_to]
+
+    assert read('2022-02-19 00:00', '2022-02-20 00:00') == []
+
+
+def test_catalog_data_range_changed_files(tmp_path):
+    data_dir = str(tmp_path)
+    klines = write_days(data_dir, random_klines(600, seed=1))
+    catalog = MarketDataCatalog(str(tmp_path / 'catalog.db'))
+    catalog.scan(data_dir)
+
+    data_range = CatalogDataRange(
+        catalog, 'BTCBUSD', '5m', datetime_from_str('2022-02-18 00:00'), datetime_from_str('2022-02-21 00:00')
+    )
+    checksums = [file.checksum for file in data_range.files()]
+
+    # files are downloaded again and removed without catalog scan
+    klines_19 = [k for k in klines if k.open_time.date() == date(2022, 2, 19)]
+    write_klines_to_csv(os.path.join(data_dir, 'BTCBUSD-5m-2022-02-19.csv'), klines_19[:100])
+    os.remove(os.path.join(data_dir, 'BTCBUSD-5m-2022-02-20.csv'))
+
+    files = data_range.files()
+    assert [file.checksum for file in files] == [checksums[0], index_file(files[1].path, '5m')[0].checksum]
+    assert files[1].checksum != checksums[1]
+    assert files[1].rows == 100
+    assert list(data_range.klines_iter(timeframe=timedelta(minutes=5))) == [k for k in klines if k.open_time.date() == date(2022, 2, 18)] + \
+        klines_19[:100]
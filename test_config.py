@@ -0,0 +1,22 @@
+import os
+
+from config import load_yaml
+
+
+def test_load_yaml(tmp_path):
+    path = str(tmp_path / 'config.yml')
+    with open(path, 'w') as f:
+        f.write('emitter:\n  a: 1\n')
+
+    config = load_yaml(path)
+    assert config == {'emitter': {'a': 1}}
+
+    # cached config is not changed by callers
+    config['emitter']['a'] = 2
+    assert load_yaml(path) == {'emitter': {'a': 1}}
+
+    # modified file is parsed again
+    with open(path, 'w') as f:
+        f.write('emitter:\n  a: 3\n')
+    os.utime(path, (0, os.path.getmtime(path) + 1))
+    assert load_yaml(path) == {'emitter': {'a': 3}}
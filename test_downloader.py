@@ -0,0 +1,155 @@
+import hashlib
+import io
+import os
+import threading
+import zipfile
+from datetime import date
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+from downloader import download_klines, DownloadTask, DownloadError
+
+
+def create_archive(name: str, data: bytes) -> bytes:
+    f = io.BytesIO()
+    with zipfile.ZipFile(f, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr(f'{name}.csv', data)
+    return f.getvalue()
+
+
+class ArchiveServer:
+    """
+    Serves files in Binance archive layout from memory, supports range requests and keep-alive.
+    """
+    def __init__(self):
+        self.files: dict[str, bytes] = {}
+        self.requests: list[tuple[str, str, int]] = []
+        # paths which responses are cut in the middle once
+        self.broken: set[str] = set()
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                server.requests.append((self.path, self.headers.get('Range'), self.client_address[1]))
+                data = server.files.get(self.path)
+                if data is None:
+                    self.send_response(404)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+
+                start = 0
+                if range_header := self.headers.get('Range'):
+                    start = int(range_header.split('=')[1].rstrip('-'))
+                    if start >= len(data):
+                        self.send_response(416)
+                        self.send_header('Content-Length', '0')
+                        self.end_headers()
+                        return
+                    self.send_response(206)
+                else:
+                    self.send_response(200)
+
+                body = data[start:]
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+
+                if self.path in server.broken:
+                    server.broken.remove(self.path)
+                    self.wfile.write(body[:len(body) // 2])
+                    self.close_connection = True
+                    return
+
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, args=(0.01,), daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f'http://127.0.0.1:{self.httpd.server_address[1]}'
+
+    def add_day(self, day: date, data: bytes, checksum: str = None) -> DownloadTask:
+        task = DownloadTask('BTCBUSD', '5m', day)
+        archive = create_archive(task.name, data)
+        checksum = checksum or hashlib.sha256(archive).hexdigest()
+        self.files[task.archive_path] = archive
+        self.files[f'{task.archive_path}.CHECKSUM'] = f'{checksum}  {task.name}.zip\n'.encode()
+        return task
+
+    def archive_requests(self) -> list[tuple[str, str, int]]:
+        return [r for r in self.requests if r[0].endswith('.zip')]
+
+
+@pytest.fixture
+def server():
+    res = ArchiveServer()
+    res.thread.start()
+    yield res
+    res.httpd.shutdown()
+    res.httpd.server_close()
+
+
+def download(server: ArchiveServer, data_dir: str, date_from: date, date_to: date, **kwargs) -> list[str]:
+    return download_klines('BTCBUSD', '5m', date_from, date_to, data_dir, base_url=server.base_url,
+                           retry_delay=0, **kwargs)
+
+
+def test_download_klines(server, tmp_path):
+    for day in (1, 2, 3, 5):
+        server.add_day(date(2022, 2, day), f'1645142400000,{day}\n'.encode() * 1000)
+
+    res = download(server, str(tmp_path), date(2022, 2, 1), date(2022, 2, 5), workers=2)
+
+    # missing day 4 is skipped
+    assert sorted(os.listdir(tmp_path)) == [f'BTCBUSD-5m-2022-02-0{day}.csv' for day in (1, 2, 3, 5)]
+    assert sorted(res) == sorted(str(tmp_path / name) for name in os.listdir(tmp_path))
+    assert (tmp_path / 'BTCBUSD-5m-2022-02-02.csv').read_bytes() == b'1645142400000,2\n' * 1000
+
+    # 2 threads make 10 requests over 2 connections
+    assert len({port for _, _, port in server.requests}) <= 2
+
+    server.requests.clear()
+    assert download(server, str(tmp_path), date(2022, 2, 1), date(2022, 2, 5)) == []
+    assert [path for path, _, _ in server.requests] == \
+        [DownloadTask('BTCBUSD', '5m', date(2022, 2, 4)).archive_path + '.CHECKSUM']
+
+
+def test_resume_partial_download(server, tmp_path):
+    task = server.add_day(date(2022, 2, 1), os.urandom(10000))
+    archive = server.files[task.archive_path]
+    (tmp_path / f'{task.name}.zip.part').write_bytes(archive[:1000])
+
+    download(server, str(tmp_path), date(2022, 2, 1), date(2022, 2, 1))
+
+    assert server.archive_requests() == [(task.archive_path, 'bytes=1000-', server.requests[-1][2])]
+    assert os.listdir(tmp_path) == [f'{task.name}.csv']
+
+
+def test_retry_interrupted_download(server, tmp_path):
+    task = server.add_day(date(2022, 2, 1), os.urandom(10000))
+    server.broken.add(task.archive_path)
+
+    download(server, str(tmp_path), date(2022, 2, 1), date(2022, 2, 1))
+
+    ranges = [range_header for _, range_header, _ in server.archive_requests()]
+    assert ranges[0] is None
+    assert ranges[1] == f'bytes={len(server.files[task.archive_path]) // 2}-'
+    assert os.listdir(tmp_path) == [f'{task.name}.csv']
+
+
+def test_checksum_mismatch(server, tmp_path):
+    server.add_day(date(2022, 2, 1), b'1645142400000,1\n', checksum='0' * 64)
+
+    with pytest.raises(DownloadError):
+        download(server, str(tmp_path), date(2022, 2, 1), date(2022, 2, 1), retries=1)
+
+    assert os.listdir(tmp_path) == []
+    assert len(server.archive_requests()) == 2
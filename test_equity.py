@@ -0,0 +1,123 @@
+from datetime import timedelta
+from decimal import Decimal
+
+import numpy as np
+import pytest
+
+from equity import EquityCurve, calc_drawdowns, calc_equity_metrics, calc_exposure_time, calc_trade_metrics
+from factories import order_factory, trade_factory
+from order import OrderType, TradeType
+from test_kline import kline_factory
+
+
+def close_order(order, price: Decimal):
+    order.trade_close = trade_factory(trade_type=TradeType.SELL, price=price)
+
+
+class TestEquityCurve:
+    def test_long(self):
+        curve = EquityCurve()
+        curve.record(kline_factory(close=Decimal(100)))
+
+        order = order_factory(order_type=OrderType.LONG, trade_open=trade_factory(price=Decimal(100)))
+        curve.on_order_opened(order)
+
+        curve.record(kline_factory(close=Decimal(110)))
+        curve.record(kline_factory(close=Decimal(90)))
+
+        close_order(order, Decimal(95))
+        curve.on_order_closed(order)
+        curve.record(kline_factory(close=Decimal(80)))
+
+        assert list(curve.equity[:curve.size]) == [0, 10, -10, -5]
+        assert list(curve.orders_open[:curve.size]) == [0, 1, 1, 0]
+
+    def test_short(self):
+        curve = EquityCurve()
+        order = order_factory(
+            order_type=OrderType.SHORT,
+            trade_open=trade_factory(trade_type=TradeType.SELL, price=Decimal(100), amount=Decimal(2))
+        )
+        curve.on_order_opened(order)
+
+        curve.record(kline_factory(close=Decimal(90)))
+        curve.record(kline_factory(close=Decimal(105)))
+
+        assert list(curve.equity[:curve.size]) == [20, -10]
+
+    def test_symbols(self):
+        curve = EquityCurve()
+
+        btc_order = order_factory(trade_open=trade_factory(price=Decimal(100)))
+        btc_order.symbol = 'BTCBUSD'
+        eth_order = order_factory(trade_open=trade_factory(price=Decimal(10)))
+        eth_order.symbol = 'ETHBUSD'
+
+        curve.on_order_opened(btc_order)
+        curve.on_order_opened(eth_order)
+
+        btc_kline = kline_factory(close=Decimal(101))
+        btc_kline.symbol = 'BTCBUSD'
+        eth_kline = kline_factory(close=Decimal(13))
+        eth_kline.symbol = 'ETHBUSD'
+
+        curve.record(btc_kline)
+        curve.record(eth_kline)
+
+        assert list(curve.equity[:curve.size]) == [1, 4]
+
+    def test_grow(self):
+        curve = EquityCurve(capacity=2)
+        for i in range(5):
+            curve.record(kline_factory(close=Decimal(i)))
+
+        assert curve.size == 5
+        assert len(curve.equity) == 8
+
+    def test_metrics(self):
+        curve = EquityCurve()
+        order = order_factory(trade_open=trade_factory(price=Decimal(100)))
+        curve.on_order_opened(order)
+        curve.record(kline_factory(close=Decimal(110)))
+        close_order(order, Decimal(110))
+        curve.on_order_closed(order)
+        curve.record(kline_factory(close=Decimal(120)))
+
+        metrics = curve.metrics(timedelta(minutes=5))
+        assert metrics['trades'] == 1
+        assert metrics['win_rate'] == 1
+        assert metrics['exposure_time'] == 0.5
+        assert metrics['max_drawdown'] == 0
+
+
+def test_calc_drawdowns():
+    equity = np.array([-5.0, 10.0, 4.0, 12.0, 2.0])
+    assert list(calc_drawdowns(equity)) == [5, 0, 6, 0, 10]
+
+
+def test_calc_equity_metrics():
+    metrics = calc_equity_metrics(np.array([1.0, 2.0, 1.0, 3.0]), periods_per_year=4)
+
+    changes = np.array([1.0, 1.0, -1.0, 2.0])
+    assert metrics['sharpe'] == pytest.approx(changes.mean() / changes.std() * 2)
+    assert metrics['sortino'] == pytest.approx(changes.mean() / np.sqrt(1 / 4) * 2)
+    assert metrics['max_drawdown'] == 1
+
+    assert calc_equity_metrics(np.array([]), periods_per_year=4)['sharpe'] == 0
+
+
+def test_calc_exposure_time():
+    assert calc_exposure_time(np.array([0, 1, 2, 0])) == 0.5
+    assert calc_exposure_time(np.array([])) == 0
+
+
+def test_calc_trade_metrics():
+    metrics = calc_trade_metrics(np.array([10.0, -5.0, 20.0, -5.0]))
+    assert metrics == {
+        'trades': 4,
+        'win_rate': 0.5,
+        'avg_win': 15,
+        'avg_loss': -5,
+        'profit_factor': 3,
+        'expectancy': 5,
+    }
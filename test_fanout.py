@@ -0,0 +1,46 @@
+from backtest import backtest_strategy
+from broker import BrokerSimulator
+from fanout import backtest_fanout
+from resample import write_klines_to_csv
+from config import load_yaml
+from strategy.context import init_strategy_context
+from test_backtest import random_klines
+
+
+def test_backtest_fanout_same_as_single_runs(tmp_path):
+    path = str(tmp_path / 'klines.csv')
+    write_klines_to_csv(path, random_klines(1200, seed=1))
+    broker_config = {'timeframe': '5m', 'skip_header': False}
+    window_size = 80
+
+    base = load_yaml('strategy/levels_v1/config.example.yml')['emitter']
+    base.update(medium_window_size=20, small_window_size=10, levels_window_size_min=20, levels_window_size_max=60)
+    # the first two configs differ by order params only and share features
+    emitter_configs = [
+        dict(base, profit_loss_ratio=2),
+        dict(base, profit_loss_ratio=3),
+        dict(base, levels_window_size_max=40),
+    ]
+
+    def create_context():
+        return [
+            init_strategy_context('levels-v1', {'order_manager': {'trend': 'down'}, 'emitter': config})
+            for config in emitter_configs
+        ]
+
+    expected = [
+        backtest_strategy(order_manager, emitter, BrokerSimulator(path, config=broker_config), window_size).metrics()
+        for order_manager, emitter in create_context()
+    ]
+    assert any(metrics['orders_closed'] for metrics in expected)
+
+    contexts = create_context()
+    results = backtest_fanout(
+        contexts,
+        [BrokerSimulator(path, config=broker_config) for _ in contexts],
+        BrokerSimulator(path, config=broker_config).klines(),
+        window_size
+    )
+    assert [result.metrics() for result in results] == expected
+    assert contexts[0][1].features is contexts[1][1].features
+    assert contexts[2][1].features is None
@@ -0,0 +1,49 @@
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pytz
+
+from featurestore import FeatureStore, to_timestamp_ms, get_warm_up_days
+
+
+def utc(s: str) -> datetime:
+    return pytz.UTC.localize(datetime.fromisoformat(s))
+
+
+def calc_day_features(day: date) -> dict[str, np.ndarray]:
+    open_times = [utc(f'{day.isoformat()} {hour:02}:00') for hour in range(3)]
+    return {
+        'open_time': np.array([to_timestamp_ms(dt) for dt in open_times], dtype=np.int64),
+        'value': np.array([day.day * 10 + i for i in range(3)], dtype=np.int32),
+    }
+
+
+def test_update_and_lookup(tmp_path):
+    store = FeatureStore(str(tmp_path))
+    # day 21 has no market data yet, day 20 is partial
+    versions = {date(2022, 2, 18): 'a', date(2022, 2, 19): 'a', date(2022, 2, 20): 'partial'}
+
+    def update(date_to: date) -> list[date]:
+        return store.update('BTCBUSD-5m', 'key', date(2022, 2, 18), date_to, calc_day_features, versions.get)
+
+    assert update(date(2022, 2, 19)) == [date(2022, 2, 18), date(2022, 2, 19)]
+    # new days only are calculated, days without data are skipped
+    assert update(date(2022, 2, 21)) == [date(2022, 2, 20)]
+    assert store.get_day_version('BTCBUSD-5m', 'key', date(2022, 2, 20)) == 'partial'
+    assert store.get_day_version('BTCBUSD-5m', 'key', date(2022, 2, 21)) is None
+
+    # days which data changed are calculated again
+    versions[date(2022, 2, 20)] = 'a'
+    assert update(date(2022, 2, 21)) == [date(2022, 2, 20)]
+
+    lookup = store.lookup('BTCBUSD-5m', 'key')
+    assert lookup.get(utc('2022-02-19 01:00')) == {'open_time': to_timestamp_ms(utc('2022-02-19 01:00')), 'value': 191}
+    assert lookup.get(utc('2022-02-19 01:05')) is None
+    assert lookup.get(utc('2022-02-21 00:00')) is None
+    assert store.lookup('BTCBUSD-5m', 'other').get(utc('2022-02-19 01:00')) is None
+
+
+def test_get_warm_up_days():
+    assert get_warm_up_days(timedelta(hours=20)) == 1
+    assert get_warm_up_days(timedelta(days=1)) == 1
+    assert get_warm_up_days(timedelta(days=1, minutes=5)) == 2
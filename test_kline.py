@@ -3,7 +3,7 @@ from decimal import Decimal
 
 import pytz
 
-from broker import KlineDataRange, read_klines_from_csv
+from broker import KlineDataRange, read_klines_from_csv, seek_klines_csv
 from kline import Kline, get_moving_window_iterator
 from test_utils import datetime_from_str
 
@@ -64,6 +64,43 @@ def test_read_klines_from_csv_skip_header():
     ]
 
 
+def test_seek_klines_csv():
+    def seek(dt_from: str, dt_to: str) -> list[str]:
+        klines = seek_klines_csv(
+            'test_data/test_kline_data_1m.csv',
+            datetime_from_str(dt_from),
+            datetime_from_str(dt_to),
+            skip_header=True,
+            timeframe=timedelta(minutes=1)
+        )
+        return [k.open_time.strftime('%H:%M') for k in klines]
+
+    assert seek('2022-01-20 00:00', '2022-01-20 00:03') == ['00:00', '00:01', '00:02']
+    assert seek('2022-01-20 00:05', '2022-01-20 00:10') == ['00:05', '00:06', '00:07', '00:08', '00:09']
+    assert seek('2022-01-20 00:09', '2022-01-20 00:10') == ['00:09']
+    assert seek('2022-01-19 23:00', '2022-01-20 00:01') == ['00:00']
+    assert seek('2022-01-20 00:10', '2022-01-20 00:15') == []
+
+    klines = seek_klines_csv(
+        'test_data/test_kline_data_1m.csv',
+        datetime_from_str('2022-01-20 00:01'),
+        datetime_from_str('2022-01-20 00:02'),
+        skip_header=True,
+        timeframe=timedelta(minutes=1)
+    )
+    assert klines == [
+        Kline(
+            open_time=datetime_from_str('2022-01-20 00:01'),
+            close_time=datetime_from_str('2022-01-20 00:02'),
+            open=Decimal('4.4'),
+            high=Decimal('4.4'),
+            low=Decimal('4.0'),
+            close=Decimal('4.1'),
+            volume=Decimal('10.5')
+        ),
+    ]
+
+
 def test_get_moving_window_iterator():
     values = [4, 5, 6, 7]
     windows = list(get_moving_window_iterator(values, 1))
@@ -134,3 +171,18 @@ class TestKlineDataRange:
             'BTCBUSD-5m-2022-02-19.csv',
             'BTCBUSD-5m-2022-02-20.csv',
         ]
+
+
+def test_seek_klines_csv_blank_lines(tmp_path):
+    path = tmp_path / 'klines.csv'
+    with open('test_data/test_kline_data_1m.csv') as f:
+        path.write_text(f.read() + '\n\n')
+
+    klines = seek_klines_csv(
+        str(path),
+        datetime_from_str('2022-01-20 00:08'),
+        datetime_from_str('2022-01-20 00:15'),
+        skip_header=True,
+        timeframe=timedelta(minutes=1)
+    )
+    assert [k.open_time.strftime('%H:%M') for k in klines] == ['00:08', '00:09']
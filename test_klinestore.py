@@ -0,0 +1,70 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from broker import BrokerSimulator, read_klines_from_csv
+from kline import Kline
+from klinestore import write_klines_compressed, read_klines_compressed, seek_klines_compressed, \
+    CompressedKlinesFile, get_compressed_path
+from test_backtest import random_klines
+from test_utils import datetime_from_str
+
+
+def test_read_klines_compressed(tmp_path):
+    path = str(tmp_path / 'klines.klz')
+    klines = random_klines(100, seed=1)
+    write_klines_compressed(path, klines, block_size=16)
+
+    assert len(CompressedKlinesFile(path).blocks) == 7
+    assert read_klines_compressed(path, timeframe=timedelta(minutes=5)) == klines
+
+
+def test_seek_klines_compressed(tmp_path):
+    path = str(tmp_path / 'klines.klz')
+    klines = random_klines(100, seed=1)
+    write_klines_compressed(path, klines, block_size=16)
+
+    def seek(i: int, j: int) -> list:
+        return seek_klines_compressed(path, klines[i].open_time, klines[j].open_time, timeframe=timedelta(minutes=5))
+
+    assert seek(20, 40) == klines[20:40]
+    assert seek(16, 32) == klines[16:32]
+    assert seek(50, 50) == []
+    assert seek_klines_compressed(path, klines[-1].close_time, klines[-1].close_time + timedelta(days=1)) == []
+
+
+def test_trailing_zeros_are_kept(tmp_path):
+    path = str(tmp_path / 'klines.klz')
+
+    def create_kline(open_time: str, open_price: str, close: str, volume: str) -> Kline:
+        return Kline(
+            open_time=datetime_from_str(open_time),
+            close_time=datetime_from_str(open_time) + timedelta(minutes=5),
+            open=Decimal(open_price),
+            high=Decimal(open_price),
+            low=Decimal(close),
+            close=Decimal(close),
+            volume=Decimal(volume)
+        )
+
+    klines = [
+        create_kline('2022-01-20 00:00', '40000.0', '40038.6', '54.589'),
+        create_kline('2022-01-20 00:05', '40038.6', '40000.0', '80.5'),
+    ]
+    write_klines_compressed(path, klines)
+
+    res = read_klines_compressed(path, timeframe=timedelta(minutes=5))
+    assert [str(k.open) for k in res] == ['40000.0', '40038.6']
+    assert [str(k.volume) for k in res] == ['54.589', '80.500']
+    assert res == klines
+
+
+def test_broker_reads_compressed_files(tmp_path):
+    csv_path = 'test_data/test_kline_data_1m.csv'
+    path = get_compressed_path(csv_path, str(tmp_path))
+    assert path == str(tmp_path / 'test_kline_data_1m.klz')
+
+    expected = read_klines_from_csv(csv_path, skip_header=True, timeframe=timedelta(minutes=1))
+    write_klines_compressed(path, expected)
+
+    broker = BrokerSimulator(path, config={'timeframe': '1m', 'skip_header': True})
+    assert list(broker.klines()) == expected
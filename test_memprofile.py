@@ -0,0 +1,49 @@
+import tracemalloc
+
+import broker
+from broker import read_klines_from_csv
+from memprofile import MemoryProfiler, get_module, get_stage, get_stage_sizes, OTHER_STAGE
+from test_backtest import random_klines
+
+
+def test_get_stage():
+    assert get_module(broker.__file__) == 'broker'
+    assert get_module(tracemalloc.__file__) is None
+
+    assert get_stage('broker') == 'load klines'
+    assert get_stage('strategy.levels_v1.emitter') == 'signals'
+    assert get_stage('orderlist') == 'orders'
+    assert get_stage('strategy.ordermanager') == 'orders'
+    assert get_stage('strategy.levels_v1.ordermanager') == 'orders'
+    assert get_stage('lib.levels') == 'signals'
+    assert get_stage('test_memprofile') == OTHER_STAGE
+    assert get_stage(None) == OTHER_STAGE
+
+
+def test_get_stage_sizes():
+    tracemalloc.start()
+    try:
+        klines = read_klines_from_csv('test_data/test_kline_data_1m.csv', skip_header=True)
+        sizes = get_stage_sizes(tracemalloc.take_snapshot())
+    finally:
+        tracemalloc.stop()
+
+    assert klines
+    assert sizes['load klines'] > 0
+
+
+def test_memory_profiler():
+    profiler = MemoryProfiler(interval=40, top=3)
+    profiler.start()
+
+    kept = []
+    for kline in profiler.track(random_klines(100, seed=1)):
+        kept.append(kline)
+
+    report = profiler.stop()
+    assert not tracemalloc.is_tracing()
+
+    assert [sample.kline_count for sample in report.samples] == [40, 80, 100]
+    assert report.traced_peak > 0
+    assert len(report.top_growth) == 3
+    report.log()
@@ -0,0 +1,84 @@
+from decimal import Decimal
+
+import numpy as np
+import pytest
+
+from factories import order_factory, trade_factory
+from montecarlo import get_trade_arrays, get_trade_arrays_from_rows, simulate_paths, simulate_chunk, Chunk, summarize
+from order import TradeType
+
+
+def test_get_trade_arrays():
+    order_closed = order_factory(trade_open=trade_factory(price=Decimal(10), amount=Decimal(2)))
+    order_closed.trade_close = trade_factory(trade_type=TradeType.SELL, price=Decimal(12), amount=Decimal(2))
+    order_open = order_factory(trade_open=trade_factory(price=Decimal(11)))
+
+    profits, turnovers = get_trade_arrays([order_closed, order_open])
+    assert list(profits) == [4]
+    assert list(turnovers) == [44]
+
+    rows = [
+        {'profit': '4', 'amount': '2', 'price_open': '10', 'price_close': '12'},
+        {'profit': None, 'amount': '1', 'price_open': '11', 'price_close': None},
+    ]
+    profits, turnovers = get_trade_arrays_from_rows(rows)
+    assert list(profits) == [4]
+    assert list(turnovers) == [44]
+
+
+class TestSimulateChunk:
+    profits = np.array([10.0, -5.0, 20.0, -15.0])
+    turnovers = np.array([100.0, 100.0, 100.0, 100.0])
+
+    def test_permutation(self):
+        chunk = Chunk(self.profits, self.turnovers, 50, 'permutation', 0.0, np.random.SeedSequence(1))
+        final_profits, drawdowns = simulate_chunk(chunk)
+
+        # permutation keeps trades, so final profit is the same on every path
+        assert final_profits == pytest.approx(np.full(50, 10.0))
+        # the worst path takes both losses first, the best one takes both wins first
+        assert drawdowns.max() <= 20
+        assert drawdowns.min() >= 15
+
+    def test_bootstrap(self):
+        chunk = Chunk(self.profits, self.turnovers, 200, 'bootstrap', 0.0, np.random.SeedSequence(1))
+        final_profits, drawdowns = simulate_chunk(chunk)
+
+        assert final_profits.min() >= -60
+        assert final_profits.max() <= 80
+        assert len(set(final_profits)) > 1
+        assert (drawdowns >= 0).all()
+
+    def test_slippage(self):
+        chunk = Chunk(self.profits, self.turnovers, 50, 'permutation', 0.01, np.random.SeedSequence(1))
+        final_profits, _ = simulate_chunk(chunk)
+
+        # every trade loses up to 1% of turnover
+        assert (final_profits < 10).all()
+        assert (final_profits >= 6).all()
+
+
+def test_simulate_paths():
+    profits = np.array([10.0, -5.0, 20.0, -15.0])
+    turnovers = np.full(4, 100.0)
+
+    final_profits, drawdowns = simulate_paths(profits, turnovers, 25, seed=1, chunk_size=10, workers=1)
+    assert len(final_profits) == 25
+    assert len(drawdowns) == 25
+
+    # the same seed gives the same paths
+    final_profits_2, _ = simulate_paths(profits, turnovers, 25, seed=1, chunk_size=10, workers=1)
+    assert list(final_profits) == list(final_profits_2)
+
+    final_profits, drawdowns = simulate_paths(np.array([]), np.array([]), 5)
+    assert list(final_profits) == [0] * 5
+
+    with pytest.raises(ValueError):
+        simulate_paths(profits, turnovers, 0)
+    with pytest.raises(ValueError):
+        simulate_paths(profits, turnovers, 25, chunk_size=0)
+
+
+def test_summarize():
+    res = summarize(np.arange(101, dtype=np.float64), percentiles=(5, 50))
+    assert res == {'mean': 50, 'p5': 5, 'p50': 50}
@@ -0,0 +1,146 @@
+from decimal import Decimal
+
+from backtest import backtest_portfolio
+from broker import BrokerSimulator, BrokerEvent, BrokerEventType
+from factories import trade_factory, order_factory
+from order import TradeType, OrderType
+from orderlist import OrderList
+from portfolio import merge_klines_iters, PortfolioBrokerSimulator, PortfolioOrderManager
+from resample import write_klines_to_csv
+from strategy.buy_and_hold.emitter import ConstantEmitter
+from strategy.buy_and_hold.ordermanager import HoldOrderManager
+from strategy.ordermanager import OrderManager
+from test_backtest import random_klines
+from test_kline import kline_factory
+from test_utils import datetime_from_str
+
+
+def test_merge_klines_iters():
+    btc = [
+        kline_factory(open_time=datetime_from_str('2022-01-01 18:00')),
+        kline_factory(open_time=datetime_from_str('2022-01-01 18:10')),
+    ]
+    eth = [
+        kline_factory(open_time=datetime_from_str('2022-01-01 18:00')),
+        kline_factory(open_time=datetime_from_str('2022-01-01 18:05')),
+        kline_factory(open_time=datetime_from_str('2022-01-01 18:15')),
+    ]
+
+    klines = list(merge_klines_iters({'BTCBUSD': iter(btc), 'ETHBUSD': iter(eth)}))
+
+    assert [(k.symbol, k.open_time) for k in klines] == [
+        ('BTCBUSD', datetime_from_str('2022-01-01 18:00')),
+        ('ETHBUSD', datetime_from_str('2022-01-01 18:00')),
+        ('ETHBUSD', datetime_from_str('2022-01-01 18:05')),
+        ('BTCBUSD', datetime_from_str('2022-01-01 18:10')),
+        ('ETHBUSD', datetime_from_str('2022-01-01 18:15')),
+    ]
+
+
+class TestPortfolioBrokerSimulator:
+    def test_events_routed_by_symbol(self):
+        broker = PortfolioBrokerSimulator({
+            'BTCBUSD': BrokerSimulator(klines_csv_path='/tmp/klines.csv'),  # path is not used
+            'ETHBUSD': BrokerSimulator(klines_csv_path='/tmp/klines.csv'),
+        })
+
+        trade_open = trade_factory(trade_type=TradeType.BUY, price=Decimal(30))
+        order = order_factory(
+            order_type=OrderType.LONG,
+            trade_open=trade_open,
+            price_take_profit=Decimal(55),
+            price_stop_loss=Decimal(20)
+        )
+        order.symbol = 'BTCBUSD'
+
+        event = broker.add_order(order)
+        assert event.order_id == 'BTCBUSD:1'
+
+        kline = kline_factory(open=Decimal(40), close=Decimal(50), high=Decimal(60), low=Decimal(30))
+
+        kline.symbol = 'ETHBUSD'
+        assert broker.events(kline) == []
+
+        kline.symbol = 'BTCBUSD'
+        assert broker.events(kline) == [
+            BrokerEvent(
+                order_id='BTCBUSD:1',
+                type=BrokerEventType.order_close_by_take_profit,
+                created_at=kline.open_time,
+                price=Decimal(55)
+            )
+        ]
+
+    def test_close_order(self):
+        broker = PortfolioBrokerSimulator({
+            'BTCBUSD': BrokerSimulator(klines_csv_path='/tmp/klines.csv'),  # path is not used
+        })
+        order = order_factory()
+        order.symbol = 'BTCBUSD'
+        order_id = broker.add_order(order).order_id
+
+        kline = kline_factory(open=Decimal(40))
+        kline.symbol = 'BTCBUSD'
+        event = broker.close_order(order_id, kline)
+
+        assert event.order_id == order_id
+        assert event.type == BrokerEventType.order_close
+        assert event.price == Decimal(40)
+        assert broker.brokers['BTCBUSD'].orders == {}
+
+
+class AcceptAllOrderManager(OrderManager):
+    def is_order_acceptable(self, order):
+        return True
+
+
+class TestPortfolioOrderManager:
+    def test_max_orders_open_per_symbol(self):
+        order_list = OrderList()
+        order_list.add_order(1, order_factory())
+        order_list.last_order.symbol = 'BTCBUSD'
+
+        order_manager = PortfolioOrderManager(AcceptAllOrderManager(order_list), max_orders_open_per_symbol=1)
+
+        order = order_factory()
+        order.symbol = 'BTCBUSD'
+        assert not order_manager.is_order_acceptable(order)
+
+        order.symbol = 'ETHBUSD'
+        assert order_manager.is_order_acceptable(order)
+
+    def test_max_orders_open(self):
+        order_list = OrderList()
+        order_list.add_order(1, order_factory())
+
+        order_manager = PortfolioOrderManager(HoldOrderManager(order_list), max_orders_open=1)
+        assert not order_manager.is_order_acceptable(order_factory())
+
+    def test_delegates_to_order_manager(self):
+        order_manager = PortfolioOrderManager(HoldOrderManager(), max_orders_open=10)
+        assert order_manager.is_order_acceptable(order_factory())
+
+
+def test_backtest_portfolio_equity_sample_per_open_time(tmp_path):
+    btc = random_klines(100, seed=1)
+    # ETH klines start later, so some open times have klines of one symbol only
+    eth = random_klines(120, seed=2)[20:]
+    brokers = {}
+    for symbol, klines in (('BTCBUSD', btc), ('ETHBUSD', eth)):
+        path = str(tmp_path / f'{symbol}.csv')
+        write_klines_to_csv(path, klines)
+        brokers[symbol] = BrokerSimulator(path, config={'timeframe': '5m', 'skip_header': False})
+
+    window_size = 10
+    result = backtest_portfolio(
+        PortfolioOrderManager(HoldOrderManager()),
+        {symbol: ConstantEmitter(OrderType.LONG) for symbol in brokers},
+        PortfolioBrokerSimulator(brokers),
+        window_size
+    )
+
+    # samples start when the first symbol has a full window
+    open_times = sorted({k.open_time for k in btc[window_size:] + eth[window_size:]})
+    curve = result.equity_curve
+    assert curve.size == len(open_times)
+    assert list(curve.times[:curve.size]) == [int(dt.timestamp()) for dt in open_times]
@@ -0,0 +1,149 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from broker import get_resampled_klines_iter, read_klines_from_csv
+from kline import Kline
+from resample import KlineResampler, resample_klines_iter, TimeframeWindows, format_timeframe, \
+    write_klines_to_csv
+from test_utils import datetime_from_str
+
+
+def kline_5m(open_time: str, open, high, low, close, volume=1) -> Kline:
+    dt = datetime_from_str(open_time)
+    return Kline(
+        open_time=dt,
+        close_time=dt + timedelta(minutes=5),
+        open=Decimal(open),
+        high=Decimal(high),
+        low=Decimal(low),
+        close=Decimal(close),
+        volume=Decimal(volume)
+    )
+
+
+def test_resample_klines_iter():
+    klines = [
+        kline_5m('2022-01-20 00:00', 4, 5, 3, 4),
+        kline_5m('2022-01-20 00:05', 4, 7, 4, 6),
+        kline_5m('2022-01-20 00:10', 6, 6, 2, 3),
+        kline_5m('2022-01-20 00:15', 3, 4, 3, 4),
+    ]
+    assert list(resample_klines_iter(klines, timedelta(minutes=15))) == [
+        Kline(
+            open_time=datetime_from_str('2022-01-20 00:00'),
+            close_time=datetime_from_str('2022-01-20 00:15'),
+            open=Decimal(4),
+            high=Decimal(7),
+            low=Decimal(2),
+            close=Decimal(3),
+            volume=Decimal(3)
+        ),
+        # incomplete kline is flushed at the end of stream
+        Kline(
+            open_time=datetime_from_str('2022-01-20 00:15'),
+            close_time=datetime_from_str('2022-01-20 00:30'),
+            open=Decimal(3),
+            high=Decimal(4),
+            low=Decimal(3),
+            close=Decimal(4),
+            volume=Decimal(1)
+        ),
+    ]
+
+
+class TestKlineResampler:
+    def test_completed_by_last_base_kline(self):
+        resampler = KlineResampler(timedelta(minutes=10))
+        assert resampler.update(kline_5m('2022-01-20 00:00', 4, 5, 3, 4)) == []
+
+        klines = resampler.update(kline_5m('2022-01-20 00:05', 4, 7, 4, 6))
+        assert [(k.open_time, k.close) for k in klines] == [(datetime_from_str('2022-01-20 00:00'), Decimal(6))]
+
+    def test_gap(self):
+        resampler = KlineResampler(timedelta(minutes=10))
+        assert resampler.update(kline_5m('2022-01-20 00:00', 4, 5, 3, 4)) == []
+
+        klines = resampler.update(kline_5m('2022-01-20 00:10', 4, 7, 4, 6))
+        assert [k.open_time for k in klines] == [datetime_from_str('2022-01-20 00:00')]
+        assert resampler.current.open_time == datetime_from_str('2022-01-20 00:10')
+
+    def test_aligned_to_timeframe(self):
+        resampler = KlineResampler(timedelta(hours=1))
+        resampler.update(kline_5m('2022-01-20 00:35', 4, 5, 3, 4))
+        assert resampler.current.open_time == datetime_from_str('2022-01-20 00:00')
+        assert resampler.current.close_time == datetime_from_str('2022-01-20 01:00')
+
+
+class TestTimeframeWindows:
+    def test_update_until(self):
+        windows = TimeframeWindows({timedelta(minutes=10): 2})
+        klines = [
+            kline_5m('2022-01-20 00:00', 1, 1, 1, 1),
+            kline_5m('2022-01-20 00:05', 2, 2, 2, 2),
+            kline_5m('2022-01-20 00:10', 3, 3, 3, 3),
+        ]
+        windows.update_until(klines)
+        assert [k.close for k in windows.windows()[timedelta(minutes=10)]] == [Decimal(2)]
+
+        # moving window, only the last kline is new
+        klines = klines[1:] + [kline_5m('2022-01-20 00:15', 4, 4, 4, 4)]
+        windows.update_until(klines)
+        assert [k.close for k in windows.windows()[timedelta(minutes=10)]] == [Decimal(2), Decimal(4)]
+
+        klines = klines[1:] + [
+            kline_5m('2022-01-20 00:20', 5, 5, 5, 5),
+            kline_5m('2022-01-20 00:25', 6, 6, 6, 6),
+        ]
+        windows.update_until(klines)
+        assert [k.close for k in windows.windows()[timedelta(minutes=10)]] == [Decimal(4), Decimal(6)]
+
+    def test_windows_not_copied(self):
+        windows = TimeframeWindows({timedelta(minutes=10): 2})
+        windows.update_until([
+            kline_5m('2022-01-20 00:00', 1, 1, 1, 1),
+            kline_5m('2022-01-20 00:05', 2, 2, 2, 2),
+            kline_5m('2022-01-20 00:10', 3, 3, 3, 3),
+        ])
+        assert windows.windows()[timedelta(minutes=10)] is windows.windows()[timedelta(minutes=10)]
+
+
+def test_format_timeframe():
+    assert format_timeframe(timedelta(minutes=15)) == '15m'
+    assert format_timeframe(timedelta(hours=1)) == '1h'
+    assert format_timeframe(timedelta(hours=4)) == '4h'
+
+
+def test_write_klines_to_csv(tmp_path):
+    path = str(tmp_path / 'klines.csv')
+    klines = [kline_5m('2022-01-20 00:00', '4.4', '4.6', '3.9', '4.5', '110.6')]
+    write_klines_to_csv(path, klines)
+    assert read_klines_from_csv(path, timeframe=timedelta(minutes=5)) == klines
+
+
+def test_get_resampled_klines_iter(tmp_path):
+    cache_dir = str(tmp_path)
+    path_iter = ['test_data/test_kline_data_header.csv']
+
+    klines = list(get_resampled_klines_iter(
+        iter(path_iter), timedelta(minutes=10), cache_dir,
+        skip_header=True, base_timeframe=timedelta(minutes=5)
+    ))
+    assert klines == [
+        Kline(
+            open_time=datetime_from_str('2022-01-20 00:00'),
+            close_time=datetime_from_str('2022-01-20 00:10'),
+            open=Decimal('4.4'),
+            high=Decimal('4.8'),
+            low=Decimal('3.9'),
+            close=Decimal('4.3'),
+            volume=Decimal('159.1')
+        ),
+    ]
+    assert (tmp_path / 'test_kline_data_header-10m.csv').exists()
+
+    # second run reads cached file
+    klines_cached = list(get_resampled_klines_iter(
+        iter(path_iter), timedelta(minutes=10), cache_dir,
+        skip_header=True, base_timeframe=timedelta(minutes=5)
+    ))
+    assert klines_cached == klines
@@ -0,0 +1,82 @@
+from datetime import date, datetime
+from decimal import Decimal
+
+from factories import order_factory, trade_factory
+from order import TradeType
+from results import ResultsStore, RunRecord, flatten_config, hash_config
+
+
+def run_record_factory(config=None, metrics=None, strategy=None, date_from=None, date_to=None, orders=None):
+    return RunRecord(
+        strategy=strategy or 'levels-v1',
+        symbol='BTCBUSD',
+        date_from=date_from or date(2022, 2, 18),
+        date_to=date_to or date(2022, 2, 26),
+        config=config or {},
+        metrics=metrics or {},
+        orders=orders or []
+    )
+
+
+def test_flatten_config():
+    assert flatten_config({}) == {}
+    assert flatten_config({'window_size': 200}) == {'window_size': '200'}
+    assert flatten_config({'emitter': {'medium_window_size': 100, 'auto_close_in': '8h'}}) == {
+        'emitter.medium_window_size': '100',
+        'emitter.auto_close_in': '8h',
+    }
+
+
+def test_hash_config():
+    assert hash_config({'a': 1, 'b': 2}) == hash_config({'b': 2, 'a': 1})
+    assert hash_config({'a': 1}) != hash_config({'a': 2})
+
+
+class TestResultsStore:
+    def test_query_runs_order_by(self):
+        store = ResultsStore(':memory:')
+        store.save_run(run_record_factory(metrics={'profit': 10, 'orders_closed': 3}))
+        store.save_run(run_record_factory(metrics={'profit': 30, 'orders_closed': 1}))
+        store.save_run(run_record_factory(metrics={'profit': 20, 'orders_closed': 2}))
+
+        runs = store.query_runs()
+        assert [run['metrics']['profit'] for run in runs] == [30, 20, 10]
+
+        runs = store.query_runs(order_by='orders_closed', limit=2)
+        assert [run['metrics']['profit'] for run in runs] == [10, 20]
+
+    def test_query_runs_filters(self):
+        store = ResultsStore(':memory:')
+        run_id_1 = store.save_run(run_record_factory(config={'emitter': {'medium_window_size': 100}}))
+        run_id_2 = store.save_run(run_record_factory(config={'emitter': {'medium_window_size': 200}}))
+        run_id_3 = store.save_run(run_record_factory(strategy='buy-and-hold'))
+        run_id_4 = store.save_run(run_record_factory(date_from=date(2022, 3, 1), date_to=date(2022, 3, 10)))
+
+        def query_run_ids(**kwargs):
+            return sorted(run['id'] for run in store.query_runs(**kwargs))
+
+        assert query_run_ids(params={'emitter.medium_window_size': '100'}) == [run_id_1]
+        assert query_run_ids(strategy='buy-and-hold') == [run_id_3]
+        assert query_run_ids(date_from=date(2022, 3, 1)) == [run_id_4]
+        assert query_run_ids(date_to=date(2022, 2, 28)) == [run_id_1, run_id_2, run_id_3]
+
+        run = store.query_runs(params={'emitter.medium_window_size': '200'})[0]
+        assert run['id'] == run_id_2
+        assert run['config'] == {'emitter': {'medium_window_size': 200}}
+
+    def test_get_trades(self):
+        store = ResultsStore(':memory:')
+
+        order_closed = order_factory(trade_open=trade_factory(price=Decimal(10)))
+        order_closed.trade_close = trade_factory(
+            trade_type=TradeType.SELL, price=Decimal(12), created_at=datetime(2022, 1, 2)
+        )
+        order_open = order_factory(trade_open=trade_factory(price=Decimal(11), created_at=datetime(2022, 1, 3)))
+
+        run_id = store.save_run(run_record_factory(orders=[(1, order_closed), (2, order_open)]))
+        trades = store.get_trades(run_id)
+
+        assert [trade['order_id'] for trade in trades] == ['1', '2']
+        assert trades[0]['profit'] == '2'
+        assert trades[0]['closed_at'] == '2022-01-02T00:00:00'
+        assert trades[1]['profit'] is None
@@ -0,0 +1,76 @@
+import os
+from datetime import timedelta
+
+from backtest import backtest_strategy
+from broker import BrokerSimulator
+from order import OrderType
+from resample import write_klines_to_csv
+from runcache import RunCache, get_run_key, hash_files, get_source_version
+from strategy.buy_and_hold.emitter import ConstantEmitter
+from strategy.buy_and_hold.ordermanager import HoldOrderManager
+from test_backtest import random_klines
+
+
+def test_get_run_key(tmp_path):
+    path = str(tmp_path / 'klines.csv')
+    write_klines_to_csv(path, random_klines(10, seed=1))
+    missing = str(tmp_path / 'missing.csv')
+
+    def get_key(configs: dict, paths: list[str], source_version: str = 'v1') -> str:
+        return get_run_key('levels-v1', configs, hash_files(paths), {'timeframe': '5m'}, 100, source_version)
+
+    key = get_key({'emitter': {'small_window_size': 30}}, [path, missing])
+    assert key == get_key({'emitter': {'small_window_size': 30}}, [path, missing])
+    assert key != get_key({'emitter': {'small_window_size': 20}}, [path, missing])
+    assert key != get_key({'emitter': {'small_window_size': 30}}, [path, missing], source_version='v2')
+
+    write_klines_to_csv(path, random_klines(10, seed=2))
+    assert key != get_key({'emitter': {'small_window_size': 30}}, [path, missing])
+
+
+def test_get_source_version(tmp_path):
+    (tmp_path / 'module.py').write_text('x = 1\n')
+    version = get_source_version(str(tmp_path))
+
+    (tmp_path / 'test_module.py').write_text('def test(): pass\n')
+    (tmp_path / '__pycache__').mkdir()
+    (tmp_path / '__pycache__' / 'module.py').write_text('')
+    assert get_source_version(str(tmp_path)) == version
+
+    (tmp_path / 'module.py').write_text('x = 2\n')
+    assert get_source_version(str(tmp_path)) != version
+
+
+def test_run_cache(tmp_path):
+    path = str(tmp_path / 'klines.csv')
+    write_klines_to_csv(path, random_klines(100, seed=1))
+    result = backtest_strategy(
+        HoldOrderManager(), ConstantEmitter(OrderType.LONG),
+        BrokerSimulator(path, config={'timeframe': '5m', 'skip_header': False}), 10
+    )
+
+    cache = RunCache(str(tmp_path / 'runs'))
+    assert cache.get('key') is None
+
+    cache.set('key', result)
+    assert cache.get('key').metrics() == result.metrics()
+    assert cache.get('key').timeframe == timedelta(minutes=5)
+
+
+def test_run_cache_evicts_least_recently_used(tmp_path):
+    cache = RunCache(str(tmp_path / 'runs'))
+    for i, key in enumerate(['a', 'b', 'c']):
+        cache.set(key, b'x' * 1000)
+        os.utime(cache.path(key), (i, i))
+
+    # a is used after b
+    cache.get('a')
+
+    size = os.path.getsize(cache.path('a'))
+    cache.max_size = size * 2
+    assert cache.evict() == ['b']
+    assert cache.get('a') is not None
+    assert cache.get('c') is not None
+
+    cache.max_size = 0
+    assert sorted(cache.evict()) == ['a', 'c']
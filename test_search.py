@@ -0,0 +1,69 @@
+import random
+from datetime import date, timedelta
+from decimal import Decimal
+
+from search import sample_value, sample_params, get_rung_days, successive_halving, Candidate
+from walkforward import EvaluationCache, Evaluation, apply_params
+
+
+def test_sample_value():
+    rng = random.Random(1)
+
+    assert sample_value(5, rng) == 5
+    assert sample_value([1, 2, 3], rng) in [1, 2, 3]
+
+    for _ in range(20):
+        assert 50 <= sample_value({'min': 50, 'max': 200}, rng) <= 200
+
+        value = sample_value({'min': '0.002', 'max': '0.01'}, rng)
+        assert isinstance(value, str)
+        assert Decimal('0.002') <= Decimal(value) <= Decimal('0.01')
+        assert Decimal(value).as_tuple().exponent >= -3
+
+
+def test_sample_params():
+    space = {
+        'emitter': {'a': {'min': 1, 'max': 1}, 'b': ['x']},
+        'order_manager': {'c': 3},
+    }
+    assert sample_params(space, random.Random(1)) == {
+        ('emitter', 'a'): 1,
+        ('emitter', 'b'): 'x',
+        ('order_manager', 'c'): 3,
+    }
+
+
+def test_get_rung_days():
+    assert get_rung_days(2, 20, 3) == [2, 6, 18]
+    assert get_rung_days(2, 18, 3) == [2, 6, 18]
+    assert get_rung_days(2, 5, 3) == [2]
+
+
+def test_successive_halving(tmp_path):
+    cache = EvaluationCache(str(tmp_path))
+    config = {'emitter': {'a': 0}}
+    date_from = date(2022, 2, 1)
+    kwargs = dict(broker_config={}, path_template='market_data/BTCBUSD-5m-%Y-%m-%d.csv', window_size=200)
+
+    # the greater a the better on 1 day, the less a the better on 3 days
+    def profit(a: int, days: int) -> float:
+        return -a if days == 3 else a
+
+    for a in range(9):
+        for days in [1, 3, 9]:
+            evaluation = Evaluation(
+                strategy='levels-v1',
+                config=apply_params(config, {('emitter', 'a'): a}),
+                date_from=date_from,
+                date_to=date_from + timedelta(days=days - 1),
+                **kwargs
+            )
+            cache.set(evaluation.key(), {'metrics': {'profit': profit(a, days)}})
+
+    candidates = [Candidate(params={('emitter', 'a'): a}) for a in range(9)]
+    res = successive_halving('levels-v1', config, candidates, [1, 3, 9], date_from, cache=cache, eta=3, **kwargs)
+
+    # 9 -> 3 -> 1 candidates, survivors of the first rung are 8, 7, 6
+    assert [c.params[('emitter', 'a')] for c in res] == [6]
+    assert res[0].days == 9
+    assert res[0].score == 6
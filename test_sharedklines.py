@@ -0,0 +1,61 @@
+from datetime import timedelta, date
+from decimal import Decimal
+
+import pytest
+
+from broker import read_klines_from_csv, BrokerSimulator, KlineDataRange
+from sharedklines import SharedKlines, encode_decimal, decode_decimal
+from test_utils import datetime_from_str
+
+PATH = 'test_data/test_kline_data_1m.csv'
+TIMEFRAME = timedelta(minutes=1)
+
+
+def test_encode_decimal():
+    assert encode_decimal(Decimal('4.4')) == 440000000
+    assert decode_decimal(440000000) == Decimal('4.4')
+    assert decode_decimal(encode_decimal(Decimal('40123.12345678'))) == Decimal('40123.12345678')
+
+    with pytest.raises(ValueError):
+        encode_decimal(Decimal('0.123456789'))
+
+
+class TestSharedKlines:
+    def test_attach(self):
+        klines = read_klines_from_csv(PATH, skip_header=True, timeframe=TIMEFRAME)
+
+        with SharedKlines.create(klines, TIMEFRAME) as shared_klines:
+            attached = SharedKlines.attach(shared_klines.handle)
+            assert list(attached.klines()) == klines
+
+            # attached klines are not copied
+            shared_klines.array[0, 1] = encode_decimal(Decimal('5.5'))
+            assert next(attached.klines()).open == Decimal('5.5')
+            attached.close()
+
+    def test_klines_range(self):
+        klines = read_klines_from_csv(PATH, skip_header=True, timeframe=TIMEFRAME)
+
+        with SharedKlines.create(klines, TIMEFRAME) as shared_klines:
+            dt_from = datetime_from_str('2022-01-20 00:02')
+            dt_to = datetime_from_str('2022-01-20 00:05')
+            assert list(shared_klines.klines(dt_from, dt_to)) == klines[2:5]
+
+    def test_empty(self):
+        with SharedKlines.create([], TIMEFRAME) as shared_klines:
+            assert list(shared_klines.klines()) == []
+
+
+def test_broker_simulator_shared_klines():
+    kline_data_range = KlineDataRange(PATH, date(2022, 1, 20), date(2022, 1, 20))
+    config = {'timeframe': '1m'}
+    klines = list(BrokerSimulator(kline_data_range=kline_data_range, config=config).klines())
+
+    with SharedKlines.create(klines, TIMEFRAME) as shared_klines:
+        broker = BrokerSimulator(kline_data_range=kline_data_range, config=config, shared_klines=shared_klines)
+        assert list(broker.klines()) == klines
+
+        # klines out of the data range are skipped
+        kline_data_range = KlineDataRange(PATH, date(2022, 1, 21), date(2022, 1, 21))
+        broker = BrokerSimulator(kline_data_range=kline_data_range, config=config, shared_klines=shared_klines)
+        assert list(broker.klines()) == []
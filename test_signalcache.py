@@ -0,0 +1,72 @@
+import pytest
+
+from backtest import backtest_strategy
+from broker import BrokerSimulator
+from order import OrderType
+from resample import write_klines_to_csv
+from signalcache import SignalCache, get_signals_key, backtest_with_signal_cache
+from strategy.buy_and_hold.emitter import ConstantEmitter
+from strategy.buy_and_hold.ordermanager import HoldOrderManager
+from test_backtest import random_klines
+
+
+class FailingEmitter(ConstantEmitter):
+    def get_order_request(self, klines, timeframe_windows=None):
+        raise AssertionError('signals must be taken from cache')
+
+
+def test_get_signals_key():
+    def get_key(emitter_config: dict, broker_config: dict, checksum: str = 'a', source_version: str = 'v1') -> str:
+        return get_signals_key('levels-v1', emitter_config, {'BTCBUSD-5m-2022-02-18.csv': checksum}, broker_config,
+                               100, source_version)
+
+    key = get_key({'small_window_size': 30}, {'timeframe': '5m'})
+    assert key == get_key({'small_window_size': 30}, {'timeframe': '5m', 'fine_klines_timeframe': '1m'})
+    assert key != get_key({'small_window_size': 20}, {'timeframe': '5m'})
+    assert key != get_key({'small_window_size': 30}, {'timeframe': '5m', 'resample_timeframe': '1h'})
+    # market data repaired or downloaded again
+    assert key != get_key({'small_window_size': 30}, {'timeframe': '5m'}, checksum='b')
+    assert key != get_key({'small_window_size': 30}, {'timeframe': '5m'}, source_version='v2')
+
+
+def test_backtest_with_signal_cache(tmp_path):
+    path = str(tmp_path / 'klines.csv')
+    write_klines_to_csv(path, random_klines(300, seed=1))
+    broker_config = {'timeframe': '5m', 'skip_header': False}
+    cache = SignalCache(str(tmp_path / 'signals'))
+
+    expected = backtest_strategy(
+        HoldOrderManager(), ConstantEmitter(OrderType.LONG), BrokerSimulator(path, config=broker_config), 60
+    ).metrics()
+
+    result = backtest_with_signal_cache(
+        cache, 'key', HoldOrderManager(), ConstantEmitter(OrderType.LONG), BrokerSimulator(path, config=broker_config),
+        60
+    )
+    assert result.metrics() == expected
+    assert len(cache.get('key')) == 300 - 60
+
+    result = backtest_with_signal_cache(
+        cache, 'key', HoldOrderManager(), FailingEmitter(OrderType.LONG), BrokerSimulator(path, config=broker_config),
+        60
+    )
+    assert result.metrics() == expected
+
+
+def test_signals_do_not_match_klines(tmp_path):
+    path = str(tmp_path / 'klines.csv')
+    write_klines_to_csv(path, random_klines(300, seed=1))
+    broker_config = {'timeframe': '5m', 'skip_header': False}
+    cache = SignalCache(str(tmp_path / 'signals'))
+    signals = backtest_with_signal_cache(
+        cache, 'key', HoldOrderManager(), ConstantEmitter(OrderType.LONG), BrokerSimulator(path, config=broker_config),
+        60
+    ).signals
+
+    for wrong_signals in (signals[:-1], signals + signals[-1:]):
+        cache.set('key', wrong_signals)
+        with pytest.raises(AssertionError, match='signals than kline windows'):
+            backtest_with_signal_cache(
+                cache, 'key', HoldOrderManager(), FailingEmitter(OrderType.LONG),
+                BrokerSimulator(path, config=broker_config), 60
+            )
@@ -0,0 +1,42 @@
+from validation import parse_rows, validate_rows, repair_lines, ValidationReport
+
+STEP = 300000
+
+
+def test_validate_rows():
+    lines = [
+        b'0,10,12,9,11,1',
+        b'300000,11,12,10,10,1',
+        b'300000,11,12,10,10,1',
+        b'1200000,10,9,11,10,1',
+        b'900000,10,11,9,0,1',
+        b'1500000,10,11,9,10,-1',
+    ]
+    report = validate_rows(parse_rows(lines), STEP)
+    # zero close is below low too
+    assert report == ValidationReport(rows=6, duplicates=1, unordered=1, gaps=1, invalid_ohlc=2, non_positive=2)
+    assert not report.valid
+
+    assert validate_rows(parse_rows(lines[:2]), STEP).valid
+    assert validate_rows(parse_rows([]), STEP) == ValidationReport()
+
+
+def test_repair_lines():
+    lines = [
+        b'600000,11,12,10,10.50,1',
+        b'0,10,12,9,11.0,1',
+        b'600000,11,12,10,10,2',
+        b'1500000,10,9,11,10,1',
+        b'1200000,10,11,9,10,1',
+    ]
+    assert repair_lines(lines, STEP) == [lines[1], lines[0], lines[4]]
+
+    repaired = repair_lines(lines, STEP, fill_gaps=True)
+    assert repaired == [
+        lines[1],
+        b'300000,11.0,11.0,11.0,11.0,0',
+        lines[0],
+        b'900000,10.50,10.50,10.50,10.50,0',
+        lines[4],
+    ]
+    assert validate_rows(parse_rows(repaired), STEP).valid
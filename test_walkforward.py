@@ -0,0 +1,118 @@
+from datetime import date
+
+import numpy as np
+
+from walkforward import split_folds, Fold, iter_param_grid, apply_params, EvaluationCache, Evaluation, \
+    evaluate_all, stitch_equity, FoldResult
+
+
+def test_split_folds():
+    folds = split_folds(date(2022, 2, 1), date(2022, 2, 10), in_sample_days=4, out_of_sample_days=2)
+    assert folds == [
+        Fold(date(2022, 2, 1), date(2022, 2, 4), date(2022, 2, 5), date(2022, 2, 6)),
+        Fold(date(2022, 2, 3), date(2022, 2, 6), date(2022, 2, 7), date(2022, 2, 8)),
+        Fold(date(2022, 2, 5), date(2022, 2, 8), date(2022, 2, 9), date(2022, 2, 10)),
+    ]
+
+    # the last out-of-sample period is cut by date_to
+    folds = split_folds(date(2022, 2, 1), date(2022, 2, 6), in_sample_days=4, out_of_sample_days=3)
+    assert folds == [
+        Fold(date(2022, 2, 1), date(2022, 2, 4), date(2022, 2, 5), date(2022, 2, 6)),
+    ]
+
+    assert split_folds(date(2022, 2, 1), date(2022, 2, 4), in_sample_days=4, out_of_sample_days=3) == []
+
+
+def test_iter_param_grid():
+    grid = {
+        'emitter': {'a': [1, 2], 'b': 'x'},
+        'order_manager': {'c': [3]},
+    }
+    assert iter_param_grid(grid) == [
+        {('emitter', 'a'): 1, ('emitter', 'b'): 'x', ('order_manager', 'c'): 3},
+        {('emitter', 'a'): 2, ('emitter', 'b'): 'x', ('order_manager', 'c'): 3},
+    ]
+
+
+def test_apply_params():
+    config = {'emitter': {'a': 1, 'b': 2}}
+    assert apply_params(config, {('emitter', 'a'): 5, ('order_manager', 'c'): 3}) == {
+        'emitter': {'a': 5, 'b': 2},
+        'order_manager': {'c': 3},
+    }
+    # source config is not mutated
+    assert config == {'emitter': {'a': 1, 'b': 2}}
+
+
+def evaluation_factory(**kwargs) -> Evaluation:
+    defaults = dict(
+        strategy='levels-v1',
+        config={'emitter': {'a': 1}},
+        broker_config={},
+        path_template='market_data/BTCBUSD-5m-%Y-%m-%d.csv',
+        date_from=date(2022, 2, 1),
+        date_to=date(2022, 2, 4),
+        window_size=200
+    )
+    return Evaluation(**{**defaults, **kwargs})
+
+
+class TestEvaluation:
+    def test_key(self):
+        assert evaluation_factory().key() == evaluation_factory().key()
+        assert evaluation_factory().key() != evaluation_factory(config={'emitter': {'a': 2}}).key()
+        assert evaluation_factory().key() != evaluation_factory(date_to=date(2022, 2, 5)).key()
+
+    def test_key_input_files(self, tmp_path):
+        path_template = str(tmp_path / 'BTCBUSD-5m-%Y-%m-%d.csv')
+        key = evaluation_factory(path_template=path_template).key()
+
+        (tmp_path / 'BTCBUSD-5m-2022-02-02.csv').write_text('1643760000000,1,1,1,1,1\n')
+        key_downloaded = evaluation_factory(path_template=path_template).key()
+        assert key_downloaded != key
+
+        (tmp_path / 'BTCBUSD-5m-2022-02-02.csv').write_text('1643760000000,10,10,10,10,10\n')
+        assert evaluation_factory(path_template=path_template).key() != key_downloaded
+
+
+class TestEvaluationCache:
+    def test_get_set(self, tmp_path):
+        cache = EvaluationCache(str(tmp_path))
+        assert cache.get('key') is None
+
+        cache.set('key', {'metrics': {'profit': 1.5}})
+        assert cache.get('key') == {'metrics': {'profit': 1.5}}
+
+    def test_evaluate_all_cached(self, tmp_path):
+        cache = EvaluationCache(str(tmp_path))
+        evaluation_1 = evaluation_factory()
+        evaluation_2 = evaluation_factory(config={'emitter': {'a': 2}})
+        cache.set(evaluation_1.key(), {'metrics': {'profit': 1}})
+        cache.set(evaluation_2.key(), {'metrics': {'profit': 2}})
+
+        # nothing is evaluated, market data files do not exist
+        results = evaluate_all([evaluation_2, evaluation_1, evaluation_2], cache)
+        assert [r['metrics']['profit'] for r in results] == [2, 1, 2]
+
+    def test_evaluate_all_error_not_cached(self, tmp_path):
+        cache = EvaluationCache(str(tmp_path / 'cache'))
+        # market data is not downloaded yet, resampled klines are read by worker
+        evaluation = evaluation_factory(
+            path_template=str(tmp_path / 'BTCBUSD-5m-%Y-%m-%d.csv'),
+            broker_config={'resample_timeframe': '15m', 'resample_cache_dir': str(tmp_path / 'resampled')}
+        )
+
+        results = evaluate_all([evaluation], cache, workers=1)
+        assert 'error' in results[0]
+        assert cache.get(evaluation.key()) is None
+
+
+def test_stitch_equity():
+    fold = Fold(date(2022, 2, 1), date(2022, 2, 4), date(2022, 2, 5), date(2022, 2, 6))
+    fold_results = [
+        FoldResult(fold, {}, {}, {}, out_of_sample_equity=[1.0, 3.0]),
+        FoldResult(fold, {}, {}, {}, out_of_sample_equity=[]),
+        FoldResult(fold, {}, {}, {}, out_of_sample_equity=[-1.0, 2.0]),
+    ]
+    assert list(stitch_equity(fold_results)) == [1, 3, 2, 5]
+    assert list(stitch_equity([])) == []
@@ -2,9 +2,9 @@ from datetime import datetime
 
 import pytz
 
-from config import configs
+from config import get_configs
 
 
 def format_datetime(dt: datetime) -> str:
-    tz = pytz.timezone(configs['tz'])
+    tz = pytz.timezone(get_configs()['tz'])
     return dt.astimezone(tz).strftime('%Y-%m-%d %H:%M')
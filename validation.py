@@ -0,0 +1,116 @@
+import logging
+from dataclasses import dataclass, asdict
+from typing import Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# columns of market data files used by validation, the rest of them are ignored
+OPEN_TIME, OPEN, HIGH, LOW, CLOSE, VOLUME = range(6)
+
+
+@dataclass
+class ValidationReport:
+    rows: int = 0
+    # rows with open time equal to open time of a previous row
+    duplicates: int = 0
+    # rows with open time less than open time of the previous row
+    unordered: int = 0
+    # missing klines between the first and the last one
+    gaps: int = 0
+    # high below low, open or close, or low above open or close
+    invalid_ohlc: int = 0
+    # zero or negative prices, negative volume
+    non_positive: int = 0
+
+    @property
+    def valid(self) -> bool:
+        return not (self.duplicates or self.unordered or self.gaps or self.invalid_ohlc or self.non_positive)
+
+    def issues(self) -> dict[str, int]:
+        return {name: value for name, value in asdict(self).items() if name != 'rows' and value}
+
+
+def parse_rows(lines: list[bytes]) -> np.ndarray:
+    """
+    Parses all rows at once, prices are floats, which is enough to compare them.
+    """
+    if not lines:
+        return np.zeros((0, 6), dtype=np.float64)
+    return np.loadtxt(lines, delimiter=',', usecols=range(6), dtype=np.float64, ndmin=2)
+
+
+def get_invalid_rows(rows: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    :return: masks of rows with inconsistent OHLC and rows with non-positive values
+    """
+    high, low = rows[:, HIGH], rows[:, LOW]
+    body_high = np.maximum(rows[:, OPEN], rows[:, CLOSE])
+    body_low = np.minimum(rows[:, OPEN], rows[:, CLOSE])
+
+    invalid_ohlc = (high < low) | (high < body_high) | (low > body_low)
+    non_positive = (rows[:, OPEN:VOLUME] <= 0).any(axis=1) | (rows[:, VOLUME] < 0)
+    return invalid_ohlc, non_positive
+
+
+def validate_rows(rows: np.ndarray, step_ms: int) -> ValidationReport:
+    """
+    :param step_ms: timeframe in milliseconds
+    """
+    if not len(rows):
+        return ValidationReport()
+
+    open_times = rows[:, OPEN_TIME].astype(np.int64)
+    diffs = np.diff(open_times)
+    unique_open_times = np.unique(open_times)
+    unique_diffs = np.diff(unique_open_times)
+
+    invalid_ohlc, non_positive = get_invalid_rows(rows)
+
+    return ValidationReport(
+        rows=len(rows),
+        duplicates=len(open_times) - len(unique_open_times),
+        unordered=int((diffs < 0).sum()),
+        gaps=int((unique_diffs[unique_diffs > step_ms] // step_ms - 1).sum()),
+        invalid_ohlc=int(invalid_ohlc.sum()),
+        non_positive=int(non_positive.sum())
+    )
+
+
+def repair_lines(lines: list[bytes], step_ms: int, fill_gaps: bool = False, rows: Optional[np.ndarray] = None) -> \
+        list[bytes]:
+    """
+    Sorts rows by open time, drops duplicates and invalid rows. Source lines are kept as they are.
+
+    :param fill_gaps: add flat klines with previous close price and zero volume for missing open times
+    :param rows: parsed lines, if they are parsed already
+    """
+    rows = parse_rows(lines) if rows is None else rows
+    if not len(rows):
+        return []
+
+    invalid_ohlc, non_positive = get_invalid_rows(rows)
+    valid = np.flatnonzero(~(invalid_ohlc | non_positive))
+
+    open_times = rows[valid, OPEN_TIME].astype(np.int64)
+    # the first of duplicate rows is kept, stable sort keeps source order of them
+    order = np.argsort(open_times, kind='stable')
+    _, first = np.unique(open_times[order], return_index=True)
+    indexes = valid[order[first]]
+
+    if not fill_gaps:
+        return [lines[i] for i in indexes]
+
+    res = []
+    prev = None
+    for i in indexes:
+        open_time = int(rows[i, OPEN_TIME])
+        if prev is not None:
+            close = lines[prev].split(b',')[CLOSE]
+            for missing in range(int(rows[prev, OPEN_TIME]) + step_ms, open_time, step_ms):
+                res.append(b','.join([str(missing).encode(), close, close, close, close, b'0']))
+        res.append(lines[i])
+        prev = i
+
+    return res
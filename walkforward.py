@@ -0,0 +1,451 @@
+import contextlib
+import copy
+import functools
+import itertools
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, asdict, field
+from datetime import date, timedelta
+from typing import Optional, Any, Iterable, Iterator
+
+import numpy as np
+
+from backtest import backtest_strategy
+from broker import KlineDataRange, BrokerSimulator, get_klines_iter, date_iter
+from equity import calc_equity_metrics
+from results import hash_config
+from runcache import hash_files, get_source_version
+from sharedklines import SharedKlines, SharedKlinesHandle
+from signalcache import SignalCache, get_signals_key, backtest_with_signal_cache
+from strategy.context import init_strategy_context, discover_strategies
+from strategy.utils import parse_timedelta
+
+logger = logging.getLogger(__name__)
+
+# klines attached by worker process once, by path template, with date range they cover
+worker_shared_klines: dict[str, tuple[date, date, SharedKlines]] = {}
+# signals shared by evaluations which differ by order manager configs only
+worker_signal_cache: Optional[SignalCache] = None
+
+
+@dataclass(frozen=True)
+class Fold:
+    in_sample_from: date
+    in_sample_to: date
+    out_of_sample_from: date
+    out_of_sample_to: date
+
+
+def split_folds(date_from: date, date_to: date, in_sample_days: int, out_of_sample_days: int) -> list[Fold]:
+    """
+    Splits date range into rolling folds. Out-of-sample periods of folds follow each other without gaps.
+    The last out-of-sample period may be shorter.
+    """
+    res = []
+    start = date_from
+
+    while True:
+        out_of_sample_from = start + timedelta(days=in_sample_days)
+        if out_of_sample_from > date_to:
+            break
+
+        res.append(Fold(
+            in_sample_from=start,
+            in_sample_to=out_of_sample_from - timedelta(days=1),
+            out_of_sample_from=out_of_sample_from,
+            out_of_sample_to=min(out_of_sample_from + timedelta(days=out_of_sample_days - 1), date_to)
+        ))
+        start += timedelta(days=out_of_sample_days)
+
+    return res
+
+
+def iter_param_grid(grid: dict, prefix: tuple = ()) -> list[dict]:
+    """
+    iter_param_grid({'emitter': {'a': [1, 2]}}) == [{('emitter', 'a'): 1}, {('emitter', 'a'): 2}]
+    """
+    paths = []
+    values = []
+
+    def collect(node: dict, path: tuple):
+        for key, value in node.items():
+            if isinstance(value, dict):
+                collect(value, path + (key,))
+            else:
+                paths.append(path + (key,))
+                values.append(value if isinstance(value, list) else [value])
+
+    collect(grid, prefix)
+    return [dict(zip(paths, combination)) for combination in itertools.product(*values)]
+
+
+def apply_params(config: dict, params: dict[tuple, Any]) -> dict:
+    res = copy.deepcopy(config)
+    for path, value in params.items():
+        node = res
+        for key in path[:-1]:
+            node = node.setdefault(key, {})
+        node[path[-1]] = value
+    return res
+
+
+def format_params(params: dict[tuple, Any]) -> str:
+    return ' '.join(f'{".".join(path)}={value}' for path, value in params.items())
+
+
+@functools.lru_cache(maxsize=None)
+def get_loaded_source_version() -> str:
+    # code of a running process does not change
+    return get_source_version()
+
+
+@dataclass
+class Evaluation:
+    """
+    Evaluation is a backtest run described by plain data, so it can be sent to worker process and hashed.
+    Its key covers content of market data files and source code, so changing them invalidates cached results.
+    """
+    strategy: str
+    config: dict
+    broker_config: dict
+    path_template: str
+    date_from: date
+    date_to: date
+    window_size: int
+    with_equity: bool = False
+
+    def input_paths(self) -> list[str]:
+        res = list(KlineDataRange(self.path_template, self.date_from, self.date_to).path_iter())
+        if self.broker_config.get('fine_klines_path_template'):
+            fine_path_template = self.broker_config['fine_klines_path_template']
+            res += [d.strftime(fine_path_template) for d in date_iter(self.date_from, self.date_to)]
+        return res
+
+    def key(self) -> str:
+        return hash_config({
+            **asdict(self),
+            'input_files': hash_files(self.input_paths()),
+            'source_version': get_loaded_source_version(),
+        })
+
+    def signals_key(self) -> str:
+        kline_paths = KlineDataRange(self.path_template, self.date_from, self.date_to).path_iter()
+        return get_signals_key(
+            self.strategy, self.config.get('emitter'), hash_files(kline_paths), self.broker_config,
+            self.window_size, get_loaded_source_version()
+        )
+
+
+def evaluate(evaluation: Evaluation) -> dict:
+    """
+    :return: run metrics, or error if strategy failed with given params
+    """
+    try:
+        return run_evaluation(evaluation)
+    except Exception as e:
+        logger.exception('Evaluation failed')
+        return {'error': repr(e)}
+
+
+def get_metric(result: dict, metric: str) -> float:
+    if 'error' in result:
+        return float('-inf')
+    return result['metrics'][metric]
+
+
+def run_evaluation(evaluation: Evaluation) -> dict:
+    kline_data_range = KlineDataRange(
+        path_template=evaluation.path_template,
+        date_from=evaluation.date_from,
+        date_to=evaluation.date_to
+    )
+    broker = BrokerSimulator(
+        kline_data_range=kline_data_range,
+        config=evaluation.broker_config,
+        shared_klines=get_worker_shared_klines(evaluation)
+    )
+    order_manager, emitter = init_strategy_context(evaluation.strategy, copy.deepcopy(evaluation.config))
+
+    if worker_signal_cache:
+        result = backtest_with_signal_cache(
+            worker_signal_cache, evaluation.signals_key(), order_manager, emitter, broker, evaluation.window_size
+        )
+    else:
+        result = backtest_strategy(order_manager, emitter, broker, evaluation.window_size)
+
+    res = {'metrics': result.metrics()}
+    if evaluation.with_equity:
+        res['equity'] = result.equity_curve.equity[:result.equity_curve.size].tolist()
+    return res
+
+
+def init_worker(
+        shared_klines: Optional[dict[str, tuple[date, date, SharedKlinesHandle]]] = None,
+        signal_cache_dir: Optional[str] = None
+):
+    global worker_signal_cache
+
+    # thousands of backtests would flood the output with order logs
+    logging.disable(logging.WARNING)
+
+    # strategies are imported once, every evaluation only builds its context from in-memory config
+    discover_strategies()
+
+    for path_template, (date_from, date_to, handle) in (shared_klines or {}).items():
+        worker_shared_klines[path_template] = (date_from, date_to, SharedKlines.attach(handle))
+
+    if signal_cache_dir:
+        worker_signal_cache = SignalCache(signal_cache_dir)
+
+
+def get_worker_shared_klines(evaluation: Evaluation) -> Optional[SharedKlines]:
+    if evaluation.broker_config.get('resample_timeframe'):
+        return None
+
+    date_from, date_to, klines = worker_shared_klines.get(evaluation.path_template, (None, None, None))
+    if klines and date_from <= evaluation.date_from and evaluation.date_to <= date_to:
+        return klines
+    return None
+
+
+def load_shared_klines(evaluations: list[Evaluation]) -> dict[str, tuple[date, date, SharedKlines]]:
+    """
+    Loads klines of all evaluations to shared memory, one block per path template covering all date ranges.
+    Evaluations with resampled klines read files themselves.
+    """
+    ranges = {}
+    for evaluation in evaluations:
+        if evaluation.broker_config.get('resample_timeframe'):
+            continue
+
+        key = evaluation.path_template
+        date_from, date_to, broker_config = ranges.get(key, (evaluation.date_from, evaluation.date_to, None))
+        ranges[key] = (
+            min(date_from, evaluation.date_from),
+            max(date_to, evaluation.date_to),
+            broker_config or evaluation.broker_config
+        )
+
+    res = {}
+    for path_template, (date_from, date_to, broker_config) in ranges.items():
+        timeframe = parse_timedelta(broker_config.get('timeframe', '5m'))
+        klines = get_klines_iter(
+            KlineDataRange(path_template, date_from, date_to).path_iter(),
+            skip_header=broker_config.get('skip_header', True),
+            timeframe=timeframe
+        )
+        res[path_template] = (date_from, date_to, SharedKlines.create(klines, timeframe))
+
+    return res
+
+
+class EvaluationPool:
+    """
+    Process pool reused by several `evaluate_all` calls, e.g. by rungs of a search.
+
+    Workers are started on the first use. Klines of `evaluations` are loaded to shared memory once,
+    every worker attaches to them and imports strategies once for its lifetime.
+    """
+    def __init__(
+            self, evaluations: list[Evaluation], workers: Optional[int] = None, signal_cache_dir: Optional[str] = None
+    ):
+        """
+        :param evaluations: evaluations covering date ranges of all evaluations run in the pool
+        :param signal_cache_dir: dir for emitter signals reused by evaluations with the same emitter configs
+        """
+        self.evaluations = evaluations
+        self.workers = workers
+        self.signal_cache_dir = signal_cache_dir
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self.shared_klines: dict[str, tuple[date, date, SharedKlines]] = {}
+
+    def map(self, evaluations: Iterable[Evaluation]) -> Iterator[dict]:
+        if self.executor is None:
+            # workers attach to klines parsed once instead of parsing files for every evaluation
+            self.shared_klines = load_shared_klines(self.evaluations)
+            handles = {
+                path_template: (date_from, date_to, klines.handle)
+                for path_template, (date_from, date_to, klines) in self.shared_klines.items()
+            }
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.workers, initializer=init_worker, initargs=(handles, self.signal_cache_dir)
+            )
+
+        return self.executor.map(evaluate, evaluations)
+
+    def close(self):
+        if self.executor:
+            self.executor.shutdown()
+        for _, _, klines in self.shared_klines.values():
+            klines.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class EvaluationCache:
+    """
+    Stores evaluation results on disk, one JSON file per evaluation key.
+    """
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f'{key}.json')
+
+    def get(self, key: str) -> Optional[dict]:
+        try:
+            with open(self.path(key)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def set(self, key: str, value: dict):
+        path = self.path(key)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(value, f)
+        os.replace(path + '.tmp', path)
+
+
+def evaluate_all(
+        evaluations: list[Evaluation],
+        cache: EvaluationCache,
+        workers: Optional[int] = None,
+        pool: Optional[EvaluationPool] = None
+) -> list[dict]:
+    """
+    Evaluates in parallel, skips evaluations found in cache.
+
+    :param pool: pool to evaluate in, by default a pool is started for this call only
+    """
+    results = {}
+    missing = {}
+    keys = [evaluation.key() for evaluation in evaluations]
+
+    for evaluation, key in zip(evaluations, keys):
+        if key in results or key in missing:
+            continue
+        if (result := cache.get(key)) is not None:
+            results[key] = result
+        else:
+            missing[key] = evaluation
+
+    logger.info('%s evaluations, %s found in cache', len(evaluations), len(evaluations) - len(missing))
+
+    if missing:
+        with contextlib.ExitStack() as stack:
+            if pool is None:
+                pool = stack.enter_context(EvaluationPool(list(missing.values()), workers=workers))
+
+            for key, result in zip(missing, pool.map(missing.values())):
+                # failures may be temporary, e.g. market data is not downloaded yet, they are evaluated again
+                if 'error' not in result:
+                    cache.set(key, result)
+                results[key] = result
+
+    return [results[key] for key in keys]
+
+
+@dataclass
+class FoldResult:
+    fold: Fold
+    params: dict[tuple, Any]
+    in_sample_metrics: dict[str, float]
+    out_of_sample_metrics: dict[str, float]
+    out_of_sample_equity: list[float] = field(default_factory=list)
+
+
+def walk_forward(
+        strategy: str,
+        config: dict,
+        grid: dict,
+        folds: list[Fold],
+        broker_config: dict,
+        path_template: str,
+        window_size: int,
+        cache: EvaluationCache,
+        metric: str = 'profit',
+        workers: Optional[int] = None,
+        signal_cache_dir: Optional[str] = None
+) -> list[FoldResult]:
+    """
+    For every fold picks params with the best in-sample `metric`, then evaluates them out of sample.
+    """
+    params_list = iter_param_grid(grid)
+
+    def create_evaluation(params: dict, date_from: date, date_to: date, with_equity: bool = False):
+        return Evaluation(
+            strategy=strategy,
+            config=apply_params(config, params),
+            broker_config=broker_config,
+            path_template=path_template,
+            date_from=date_from,
+            date_to=date_to,
+            window_size=window_size,
+            with_equity=with_equity
+        )
+
+    # in-sample evaluations of all folds run in one pool
+    in_sample_evaluations = [
+        create_evaluation(params, fold.in_sample_from, fold.in_sample_to)
+        for fold in folds for params in params_list
+    ]
+    # out-of-sample params are not known yet, date ranges are enough to load klines
+    all_evaluations = in_sample_evaluations + [
+        create_evaluation({}, fold.out_of_sample_from, fold.out_of_sample_to) for fold in folds
+    ]
+
+    with EvaluationPool(all_evaluations, workers=workers, signal_cache_dir=signal_cache_dir) as pool:
+        in_sample_results = evaluate_all(in_sample_evaluations, cache, pool=pool)
+
+        best = []
+        for i, fold in enumerate(folds):
+            fold_results = in_sample_results[i * len(params_list):(i + 1) * len(params_list)]
+            best_index = max(range(len(params_list)), key=lambda j: get_metric(fold_results[j], metric))
+            best.append((params_list[best_index], fold_results[best_index].get('metrics', {})))
+
+        out_of_sample_evaluations = [
+            create_evaluation(params, fold.out_of_sample_from, fold.out_of_sample_to, with_equity=True)
+            for fold, (params, _) in zip(folds, best)
+        ]
+        out_of_sample_results = evaluate_all(out_of_sample_evaluations, cache, pool=pool)
+
+    return [
+        FoldResult(
+            fold=fold,
+            params=params,
+            in_sample_metrics=in_sample_metrics,
+            out_of_sample_metrics=result.get('metrics', {}),
+            out_of_sample_equity=result.get('equity', [])
+        )
+        for fold, (params, in_sample_metrics), result in zip(folds, best, out_of_sample_results)
+    ]
+
+
+def stitch_equity(fold_results: list[FoldResult]) -> np.ndarray:
+    """
+    Joins out-of-sample equity curves, every curve continues from the final value of previous one.
+    """
+    res = []
+    offset = 0.0
+    for fold_result in fold_results:
+        equity = np.array(fold_result.out_of_sample_equity, dtype=np.float64) + offset
+        if len(equity):
+            offset = equity[-1]
+        res.append(equity)
+
+    return np.concatenate(res) if res else np.array([], dtype=np.float64)
+
+
+def calc_stitched_metrics(fold_results: list[FoldResult], timeframe: timedelta) -> dict[str, float]:
+    equity = stitch_equity(fold_results)
+    res = calc_equity_metrics(equity, timedelta(days=365) / timeframe)
+    res['profit'] = float(equity[-1]) if len(equity) else 0.0
+    res['trades'] = sum(r.out_of_sample_metrics.get('trades', 0) for r in fold_results)
+    return res